@@ -0,0 +1,423 @@
+"""Sync throughput on synthetic cards of every SourceType
+
+Generates a card tree laid out as each camera writes it, then measures:
+
+- enumerate: listing the card into FileSets
+- plan: planning operations against an empty destination (all copies)
+- copy: syncing the card for real with run_syncs
+- replan: planning again once copied (all identical, checked by size)
+- match: matching disks to syncs, once for all source types
+
+Files are empty unless --file-size is given, which makes sparse files of that
+size so large cards don't need the disk space to generate. Generated cards are
+kept in --work-dir and reused by later runs with the same settings. Results
+can be saved with --output and compared with an earlier run with --compare.
+
+    python -m benchmarks.bench_cards [--files 10000] [--file-size 0]
+        [--source-type gopro_10] [--no-copy] [--output results.json]
+        [--compare previous.json]
+"""
+
+import argparse
+import collections
+import datetime
+import importlib.metadata
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from sync_camera_disk import source
+from sync_camera_disk.config import Config, Destination, Source, SourceType, Sync
+from sync_camera_disk.disks import DiskMount
+from sync_camera_disk.filter_disks import SyncIndex, filter_disks_to_syncs
+from sync_camera_disk.logs import configure_logging
+from sync_camera_disk.metrics import PREFIX, Metrics
+from sync_camera_disk.syncing import plan_syncs, run_syncs
+
+# Bump when the layouts change so old cards in --work-dir aren't reused
+LAYOUT_VERSION = 1
+
+# Files are dated from here on, files_per_day to a day
+START = datetime.datetime(2024, 9, 1, 9, 0)
+
+
+def dji_mini_3_pro() -> Iterator[str]:
+    for i in itertools.count(1):
+        for extension in ("MP4", "JPG", "DNG", "SRT"):
+            yield f"DCIM/100MEDIA/DJI_{i:04}.{extension}"
+
+
+def dji_osmo_pocket() -> Iterator[str]:
+    for i in itertools.count(1):
+        if i % 10:
+            yield f"DCIM/100MEDIA/DJI_{i:04}.{'JPG' if i % 2 else 'MOV'}"
+        else:
+            # Every tenth shot is a panorama, a folder of frames
+            for frame in range(1, 10):
+                yield f"DCIM/PANORAMA/100_{i:04}/DJI_{frame:04}.JPG"
+
+
+def sony_a7_iv() -> Iterator[str]:
+    for i in itertools.count(1):
+        if i % 20:
+            folder = f"{100 + i // 9999}MSDCF"
+            for extension in ("ARW", "HIF"):
+                yield f"DCIM/{folder}/DSC{i % 10000:05}.{extension}"
+        else:
+            yield f"private/M4ROOT/CLIP/C{i:04}.MP4"
+            yield f"private/M4ROOT/CLIP/C{i:04}M01.XML"
+
+
+def insta360_go_2() -> Iterator[str]:
+    for i in itertools.count(1):
+        clip = f"20210320_{i // 3600 % 24:02}{i // 60 % 60:02}{i % 60:02}"
+        yield f"DCIM/Camera01/VID_{clip}_00_{i:03}.mp4"
+        yield f"DCIM/Camera01/LRV_{clip}_01_{i:03}.mp4"
+
+
+def insta360_one() -> Iterator[str]:
+    for i in itertools.count(1):
+        clip = f"20171217_{i // 3600 % 24:02}{i // 60 % 60:02}{i % 60:02}_{i:03}"
+        name = f"VID_{clip}.insv" if i % 3 else f"IMG_{clip}.insp"
+        yield f"DCIM/Camera01/{name}"
+        # macOS metadata files, ignored
+        yield f"DCIM/Camera01/._{name}"
+
+
+def gopro_10() -> Iterator[str]:
+    for i in itertools.count(0):
+        # Long recordings are split into chapters sharing a file number
+        number = i // 3 % 9999 + 1
+        chapter = i // 3 // 9999 * 3 + i % 3 + 1
+        yield f"DCIM/100GOPRO/GX{chapter:02}{number:04}.MP4"
+        yield f"DCIM/100GOPRO/GL{chapter:02}{number:04}.LRV"
+        yield f"DCIM/100GOPRO/GX{chapter:02}{number:04}.THM"
+
+
+def fujifilm_x100() -> Iterator[str]:
+    for i in itertools.count(1):
+        yield f"DCIM/100_FUJI/DSCF{i:04}.JPG"
+        yield f"DCIM/100_FUJI/DSCF{i:04}.RAF"
+
+
+def fujifilm_xe5() -> Iterator[str]:
+    yield "FFDB/FFDB_X_E5_5C029362.db"
+    for i in itertools.count(1):
+        if i % 100 == 0:
+            yield f"ACTIVITY/2508{i // 100:04}.LOG"
+        for extension in ("JPG", "HIF", "RAF"):
+            yield f"DCIM/100_FUJI/DSCF{i:04}.{extension}"
+
+
+def atomos() -> Iterator[str]:
+    for i in itertools.count(1):
+        yield f"SHOGUNU_S001_S001_T{i:03}.MOV"
+
+
+def atem_iso() -> Iterator[str]:
+    for i in itertools.count(1):
+        project = f"Project {i}"
+        yield f"{project}/{project}.drp"
+        yield f"{project}/._{project}.drp"
+        yield f"{project}/{project} 01.mp4"
+        for camera in range(1, 5):
+            yield f"{project}/Video ISO Files/{project} CAM {camera} 01.mp4"
+            yield f"{project}/Audio Source Files/{project} CAM {camera} 01.wav"
+
+
+LAYOUTS: dict[SourceType, Callable[[], Iterator[str]]] = {
+    SourceType.dji_mini_3_pro: dji_mini_3_pro,
+    SourceType.dji_osmo_pocket: dji_osmo_pocket,
+    SourceType.sony_a7_iv: sony_a7_iv,
+    SourceType.insta360_go_2: insta360_go_2,
+    SourceType.insta360_one: insta360_one,
+    SourceType.gopro_10: gopro_10,
+    SourceType.fujifilm_x100: fujifilm_x100,
+    SourceType.fujifilm_xe5: fujifilm_xe5,
+    SourceType.atomos: atomos,
+    SourceType.atem_iso: atem_iso,
+}
+
+
+def generate_card(
+    path: Path,
+    source_type: SourceType,
+    files: int,
+    file_size: int,
+    files_per_day: int,
+) -> None:
+    """Write a card of files files to path, unless a complete one is already there"""
+    complete = path / ".complete"
+    if complete.exists():
+        return
+    if path.exists():
+        shutil.rmtree(path)
+    directories: set[Path] = set()
+    start = START.timestamp()
+    for i, relative_path in enumerate(itertools.islice(LAYOUTS[source_type](), files)):
+        file_path = path / relative_path
+        if file_path.parent not in directories:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            directories.add(file_path.parent)
+        with file_path.open("wb") as fp:
+            if file_size:
+                # Sparse, takes no space on disk
+                fp.truncate(file_size)
+        mtime = start + i // files_per_day * 86400 + i % files_per_day
+        os.utime(file_path, (mtime, mtime))
+    complete.touch()
+
+
+def phase_sum(metrics: Metrics, phase: str) -> float:
+    for histogram in metrics.to_json().get(f"{PREFIX}phase_seconds", []):
+        if histogram["labels"] == {"phase": phase}:
+            return float(histogram["sum"])
+    return 0.0
+
+
+def result(
+    phase: str,
+    seconds: float,
+    files: int,
+    source_type: SourceType | None = None,
+    bytes_copied: int | None = None,
+    **extra: Any,
+) -> dict[str, Any]:
+    measured: dict[str, Any] = {
+        "source_type": source_type,
+        "phase": phase,
+        "files": files,
+        "seconds": seconds,
+        "files_per_second": files / seconds if seconds else None,
+        **extra,
+    }
+    if bytes_copied is not None:
+        measured["bytes"] = bytes_copied
+        measured["bytes_per_second"] = bytes_copied / seconds if seconds else None
+    return measured
+
+
+def bench_card(
+    source_type: SourceType,
+    card_path: Path,
+    destination_path: Path,
+    args: argparse.Namespace,
+) -> list[dict[str, Any]]:
+    disk = DiskMount(path=card_path, unique_identifier=f"bench-{source_type}")
+    sync = Sync(
+        source=Source(identifier=disk.unique_identifier, type=source_type),
+        destination=Destination(path=destination_path),
+    )
+    results = []
+
+    start = time.perf_counter()
+    file_sets = list(source.enumerate_source_files(disk, source_type))
+    elapsed = time.perf_counter() - start
+    files = sum(len(file_set.files) for file_set in file_sets)
+    if not files:
+        raise RuntimeError(f"No files found on {card_path}, check its layout")
+    results.append(
+        result("enumerate", elapsed, files, source_type, file_sets=len(file_sets))
+    )
+    del file_sets
+
+    def plan(phase: str) -> None:
+        metrics = Metrics()
+        counters: collections.Counter[str] = collections.Counter()
+        planned = sum(
+            1
+            for _ in plan_syncs(
+                [(sync, disk)],
+                hash_cache=None,
+                manifest=None,
+                counters=counters,
+                metrics=metrics,
+            )
+        )
+        results.append(
+            result(
+                phase,
+                phase_sum(metrics, "plan"),
+                planned,
+                source_type,
+                operations={
+                    operation: counters[operation]
+                    for operation in ("copy", "identical", "conflict")
+                    if counters[operation]
+                },
+            )
+        )
+
+    plan("plan")
+    if not args.copy:
+        return results
+
+    start = time.perf_counter()
+    counters, failures = run_syncs(
+        [(sync, disk)],
+        hash_cache=None,
+        manifest=None,
+        dry_run=False,
+        workers=args.workers,
+    )
+    elapsed = time.perf_counter() - start
+    if failures:
+        raise RuntimeError(f"{len(failures)} copies failed, first {failures[0]}")
+    results.append(
+        result(
+            "copy",
+            elapsed,
+            counters["copy"],
+            source_type,
+            bytes_copied=counters["copy"] * args.file_size,
+        )
+    )
+    plan("replan")
+    return results
+
+
+def bench_match(syncs: int) -> dict[str, Any]:
+    """Match as many disks as there are syncs, half of them known"""
+    config = Config(
+        syncs=[
+            Sync(
+                source=Source(identifier=f"disk-{i}", type=SourceType.gopro_10),
+                destination=Destination(path=Path("/nas")),
+            )
+            for i in range(syncs)
+        ]
+    )
+    disks = [
+        DiskMount(path=Path(f"/Volumes/{i}"), unique_identifier=f"disk-{i * 2}")
+        for i in range(syncs)
+    ]
+    start = time.perf_counter()
+    matched = list(filter_disks_to_syncs(config, disks, SyncIndex(config)))
+    elapsed = time.perf_counter() - start
+    assert len(matched) == (syncs + 1) // 2
+    return result("match", elapsed, len(disks), syncs=syncs)
+
+
+def version() -> dict[str, str | None]:
+    try:
+        package_version: str | None = importlib.metadata.version("sync-camera-disk")
+    except importlib.metadata.PackageNotFoundError:
+        package_version = None
+    git = subprocess.run(
+        ["git", "describe", "--always", "--dirty"],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).parent,
+    )
+    return {
+        "version": package_version,
+        "git": git.stdout.strip() if git.returncode == 0 else None,
+    }
+
+
+def print_results(
+    results: list[dict[str, Any]], previous: list[dict[str, Any]] | None
+) -> None:
+    previous_by_key = {
+        (measured["source_type"], measured["phase"]): measured
+        for measured in previous or []
+    }
+    for measured in results:
+        rate = measured["files_per_second"] or 0.0
+        line = (
+            f"{measured['source_type'] or '':>16} {measured['phase']:>9}:"
+            f" {measured['files']:>9} files {measured['seconds']:8.3f}s"
+            f" {rate:>12,.0f} files/s"
+        )
+        if measured.get("bytes_per_second"):
+            line += f" {measured['bytes_per_second'] / 1024 / 1024:8.1f} MiB/s"
+        before = previous_by_key.get((measured["source_type"], measured["phase"]))
+        if before is not None and before["files_per_second"] and rate:
+            line += f" ({rate / before['files_per_second'] - 1:+.0%})"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--files", type=int, default=10_000, help="Files per card")
+    parser.add_argument(
+        "--file-size", type=int, default=0, help="Bytes per file, sparse"
+    )
+    parser.add_argument("--files-per-day", type=int, default=1000)
+    parser.add_argument(
+        "--source-type",
+        type=SourceType,
+        action="append",
+        choices=list(LAYOUTS),
+        help="Only these source types, defaults to all",
+    )
+    parser.add_argument("--copy", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--syncs", type=int, default=1000, help="Syncs to match")
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "sync-camera-disk-bench",
+        help="Where cards are generated and kept",
+    )
+    parser.add_argument("--output", type=Path, help="Save results as JSON")
+    parser.add_argument("--compare", type=Path, help="Results saved by an earlier run")
+    args = parser.parse_args()
+
+    missing = set(source.SOURCE_RULES) - set(LAYOUTS)
+    if missing:
+        parser.error(f"No layout for {', '.join(sorted(missing))}")
+    # Per file logging would swamp the measurements
+    configure_logging(logging.WARNING)
+    previous = json.loads(args.compare.read_text())["results"] if args.compare else None
+
+    results = [bench_match(args.syncs)]
+    print_results(results, previous)
+    for source_type in args.source_type or list(LAYOUTS):
+        card_path = args.work_dir / (
+            f"{source_type}-{args.files}-{args.file_size}"
+            f"-{args.files_per_day}-v{LAYOUT_VERSION}"
+        )
+        start = time.perf_counter()
+        generate_card(
+            card_path, source_type, args.files, args.file_size, args.files_per_day
+        )
+        print(f"{source_type:>16}  generate: {time.perf_counter() - start:8.3f}s")
+        with tempfile.TemporaryDirectory(dir=args.work_dir) as destination:
+            card_results = bench_card(source_type, card_path, Path(destination), args)
+        print_results(card_results, previous)
+        results.extend(card_results)
+
+    if args.output is not None:
+        args.output.write_text(
+            json.dumps(
+                {
+                    **version(),
+                    "python": sys.version,
+                    "platform": platform.platform(),
+                    "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    "args": {
+                        name: str(value) if isinstance(value, Path) else value
+                        for name, value in vars(args).items()
+                    },
+                    "results": results,
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Per file cost of the File, FileSet, Operation and OperationResult records
+
+Compares the slotted dataclasses used on the sync path against the equivalent
+pydantic models they replaced.
+
+    python -m benchmarks.bench_models [--files 100000]
+"""
+
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+import pydantic
+
+from sync_camera_disk.file import File, FileSet
+from sync_camera_disk.operation import Operation, OperationResult, OperationType
+
+
+class PydanticFile(pydantic.BaseModel):
+    path: Path
+
+
+class PydanticFileSet(pydantic.BaseModel):
+    files: list[PydanticFile]
+    stem: str
+    prefix: Path
+    volume_path: Path
+    volume_identifier: str
+
+
+class PydanticOperation(pydantic.BaseModel):
+    operation: OperationType
+    source: Path
+    destination: Path
+
+
+class PydanticOperationResult(pydantic.BaseModel):
+    operation: PydanticOperation
+    success: bool
+    exception: str | None
+    error: str | None
+    dry_run: bool
+
+
+def build(
+    paths: list[Path],
+    file: Callable[..., Any],
+    file_set: Callable[..., Any],
+    operation: Callable[..., Any],
+    result: Callable[..., Any],
+) -> list[Any]:
+    """Build one of each record per path, as a sync of a card would"""
+    results = []
+    volume_path = Path("/Volumes/Untitled")
+    destination = Path("/nas/2024-09-16")
+    for path in paths:
+        f = file(path=volume_path / path)
+        fs = file_set(
+            files=[f],
+            stem=path.stem,
+            prefix=path.parent,
+            volume_path=volume_path,
+            volume_identifier="abc",
+        )
+        op = operation(
+            operation=OperationType.copy,
+            source=f.path,
+            destination=destination / path,
+        )
+        results.append((fs, result(operation=op, success=True, dry_run=False)))
+    return results
+
+
+def measure(name: str, paths: list[Path], *records: Callable[..., Any]) -> None:
+    start = time.perf_counter()
+    build(paths, *records)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    kept = build(paths, *records)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    print(
+        f"{name:>10}: {elapsed / len(paths) * 1e6:6.2f} µs/file"
+        f" {memory / len(paths):8.0f} bytes/file"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=100_000)
+    args = parser.parse_args()
+
+    paths = [
+        Path(f"DCIM/{100 + i // 9999}MSDCF/DSC{i:05}.ARW") for i in range(args.files)
+    ]
+    measure("dataclass", paths, File, FileSet, Operation, OperationResult)
+    measure(
+        "pydantic",
+        paths,
+        PydanticFile,
+        PydanticFileSet,
+        PydanticOperation,
+        PydanticOperationResult,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Cold start time of the command line interface
+
+Runs each command in a fresh interpreter, as the watcher and scripts do, and
+reports the median wall time along with the modules it imported.
+
+    python -m benchmarks.bench_startup [--runs 15]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = [
+    ["--help"],
+    ["list-disks", "--help"],
+    ["sync", "--help"],
+]
+
+RUN = "import sys; from sync_camera_disk.main import app; app()"
+COUNT_MODULES = (
+    "import sys, sync_camera_disk.main; print(len(sys.modules));"
+    " import sync_camera_disk.syncing; print(len(sys.modules))"
+)
+
+
+def median_time(args: list[str], runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", RUN, *args], capture_output=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=15)
+    args = parser.parse_args()
+
+    for command in COMMANDS:
+        elapsed = median_time(command, args.runs)
+        print(f"{' '.join(command):>20}: {elapsed * 1000:6.1f} ms")
+
+    result = subprocess.run(
+        [sys.executable, "-c", COUNT_MODULES],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    main_modules, sync_modules = result.stdout.split()
+    print(f"{'modules':>20}: {main_modules} at startup, {sync_modules} for sync")
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,17 @@ class MatchType(enum.StrEnum):
     volume_file_system = "volume_file_system"
 
 
+class IdentityCheck(enum.StrEnum):
+    """How hard to look when deciding an existing destination file is identical
+
+    Each level includes the cheaper ones before it.
+    """
+
+    size = "size"  # name and size
+    sample = "sample"  # hash of the first and last few MB
+    full = "full"  # hash of the whole file
+
+
 class Source(pydantic.BaseModel):
     type: SourceType
     identifier: str | None
@@ -40,10 +51,16 @@ class Source(pydantic.BaseModel):
         MatchType.volume_size,
         MatchType.volume_file_system,
     ]
+    # How many files can be read from the disk at once, SD cards tend to slow
+    # down with more than a couple of concurrent readers.
+    max_readers: int = pydantic.Field(default=2, ge=1)
 
 
 class Destination(pydantic.BaseModel):
     path: Path
+    # How many files can be written to the destination at once
+    max_writers: int = pydantic.Field(default=4, ge=1)
+    identity_check: IdentityCheck = IdentityCheck.size
 
 
 class Sync(pydantic.BaseModel):
@@ -0,0 +1,108 @@
+"""Cache of parsed and validated configs
+
+Parsing the YAML and validating it with pydantic takes longer than anything
+else a quick command does, so the resulting Config and its SyncIndex are
+pickled to the cache dir. The cache is keyed on the config file's path, size
+and mtime, any edit to the config misses the cache and it is parsed again.
+
+The key also includes a hash of Config's JSON schema, so caches written before
+the models changed are ignored. Bump CACHE_VERSION whenever SyncIndex changes
+shape, it isn't covered by the schema.
+"""
+
+import dataclasses
+import functools
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import structlog
+
+from .config import Config
+from .filter_disks import SyncIndex
+
+LOG: structlog.stdlib.BoundLogger = structlog.get_logger()
+
+CACHE_VERSION = 1
+
+
+@dataclasses.dataclass(slots=True)
+class CompiledConfig:
+    config: Config
+    index: SyncIndex
+
+
+@functools.cache
+def schema_hash() -> str:
+    """Changes whenever the config models do
+
+    Cheaper than looking up the installed package's version, and also catches
+    model changes in a development checkout.
+    """
+    return hashlib.sha256(Config.schema_json().encode()).hexdigest()[:16]
+
+
+def cache_file_path(cache_dir: Path, config_path: Path) -> Path:
+    """One cache file per config path"""
+    name = hashlib.sha256(str(config_path.resolve()).encode()).hexdigest()[:16]
+    return cache_dir / f"{name}.pickle"
+
+
+def _read_cache(cache_path: Path, key: tuple[object, ...]) -> CompiledConfig | None:
+    try:
+        with cache_path.open("rb") as fp:
+            cached_key, compiled = pickle.load(fp)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Truncated, or written by a version with different models
+        LOG.debug("Ignoring unreadable config cache", path=cache_path, error=e)
+        return None
+    if cached_key != key or not isinstance(compiled, CompiledConfig):
+        return None
+    return compiled
+
+
+def _write_cache(
+    cache_path: Path, key: tuple[object, ...], compiled: CompiledConfig
+) -> None:
+    # Write then rename so concurrent runs never see a partial cache
+    temporary_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with temporary_path.open("wb") as fp:
+            pickle.dump((key, compiled), fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, cache_path)
+    except OSError as e:
+        LOG.warning("Couldn't write config cache", path=cache_path, error=e)
+        temporary_path.unlink(missing_ok=True)
+
+
+def load_config(config_path: Path, cache_dir: Path | None = None) -> CompiledConfig:
+    """Load config_path, from the cache in cache_dir if it is up to date
+
+    The cache isn't used if cache_dir is None.
+    """
+    stat = config_path.stat()
+    key = (
+        CACHE_VERSION,
+        schema_hash(),
+        str(config_path.resolve()),
+        stat.st_size,
+        stat.st_mtime_ns,
+    )
+    if cache_dir is not None:
+        cache_path = cache_file_path(cache_dir, config_path)
+        compiled = _read_cache(cache_path, key)
+        if compiled is not None:
+            LOG.debug("Using cached config", config_path=config_path)
+            return compiled
+
+    from pydantic_yaml import parse_yaml_file_as
+
+    config = parse_yaml_file_as(Config, config_path)
+    compiled = CompiledConfig(config=config, index=SyncIndex(config))
+    if cache_dir is not None:
+        _write_cache(cache_path, key, compiled)
+    return compiled
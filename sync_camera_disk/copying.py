@@ -0,0 +1,374 @@
+"""Copy file contents using the cheapest mechanism the OS supports
+
+Backends are tried in order, falling back to the next when the kernel or
+filesystem says no (e.g. copy_file_range across filesystems on older kernels,
+FICLONE on anything but btrfs/xfs). Every backend continues from the current
+file offsets so a backend failing part way through hands over cleanly.
+
+Files are written to a .partial file next to the destination and renamed into
+place once complete and the same size as the source, so an interrupted copy
+never looks like a finished one.
+The .partial is locked while it is written so two copies to the same
+destination can't interleave.
+
+When a digest is asked for the bytes have to pass through userspace anyway, so
+only the stream backend is used and the hash is computed as the data goes by.
+"""
+
+import dataclasses
+import enum
+import errno
+import fcntl
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Callable, Sequence
+
+from .hashing import HashAlgorithm, Hasher, hash_fd, new_hasher
+
+# From linux/fs.h, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# Big enough to keep SD card readers streaming, small enough not to matter
+STREAM_BUFFER_SIZE = 8 * 1024 * 1024
+
+# copy_file_range and sendfile copy at most this much per call, small enough
+# that progress is reported every second or so even from an SD card
+KERNEL_CHUNK_SIZE = 64 * 1024 * 1024
+
+PARTIAL_SUFFIX = ".partial"
+
+# How much of the start and end of a partial file to compare with the source
+# before trusting it enough to resume
+RESUME_VERIFY_SIZE = 4 * 1024 * 1024
+
+# Errors which mean "this backend doesn't work here" rather than "the copy failed"
+UNSUPPORTED_ERRNOS = frozenset(
+    {
+        errno.EXDEV,
+        errno.EINVAL,
+        errno.ENOSYS,
+        errno.ENOTSUP,
+        errno.EOPNOTSUPP,
+        errno.EBADF,
+        errno.ENOTTY,
+        errno.ETXTBSY,
+    }
+)
+
+# Errors from os.link meaning the filesystem has no hard links (e.g. exFAT or
+# some network shares)
+LINK_UNSUPPORTED_ERRNOS = frozenset(
+    {
+        errno.EPERM,
+        errno.EXDEV,
+        errno.EMLINK,
+        errno.ENOSYS,
+        errno.ENOTSUP,
+        errno.EOPNOTSUPP,
+    }
+)
+
+
+class CopyBackend(enum.StrEnum):
+    reflink = "reflink"
+    copy_file_range = "copy_file_range"
+    sendfile = "sendfile"
+    stream = "stream"
+
+
+@dataclasses.dataclass(slots=True)
+class CopyResult:
+    backend: CopyBackend
+    bytes_copied: int
+    resumed_from: int = 0
+    digest_algorithm: HashAlgorithm | None = None
+    digest: str | None = None
+
+
+# Called with the number of bytes copied each time a chunk is written
+ProgressCallback = Callable[[int], None]
+
+
+def _no_progress(n: int) -> None:
+    pass
+
+
+class UnsupportedBackend(Exception):
+    """Backend can't be used for this pair of files"""
+
+
+def _unsupported(e: OSError) -> bool:
+    return e.errno in UNSUPPORTED_ERRNOS
+
+
+def _copy_reflink(
+    src_fd: int, dst_fd: int, progress: ProgressCallback = _no_progress
+) -> int:
+    # Clones replace the whole file so can't pick up part way through
+    if sys.platform != "linux" or os.lseek(dst_fd, 0, os.SEEK_CUR) != 0:
+        raise UnsupportedBackend()
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError as e:
+        if _unsupported(e):
+            raise UnsupportedBackend() from e
+        raise
+    size = os.fstat(src_fd).st_size
+    os.lseek(src_fd, size, os.SEEK_SET)
+    os.lseek(dst_fd, size, os.SEEK_SET)
+    progress(size)
+    return size
+
+
+def _copy_file_range(
+    src_fd: int, dst_fd: int, progress: ProgressCallback = _no_progress
+) -> int:
+    if not hasattr(os, "copy_file_range"):
+        raise UnsupportedBackend()
+    total = 0
+    while True:
+        try:
+            n = os.copy_file_range(src_fd, dst_fd, KERNEL_CHUNK_SIZE)
+        except OSError as e:
+            if _unsupported(e):
+                raise UnsupportedBackend(total) from e
+            raise
+        if n == 0:
+            return total
+        total += n
+        progress(n)
+
+
+def _copy_sendfile(
+    src_fd: int, dst_fd: int, progress: ProgressCallback = _no_progress
+) -> int:
+    # Only Linux supports sendfile between regular files
+    if sys.platform != "linux":
+        raise UnsupportedBackend()
+    total = 0
+    while True:
+        try:
+            n = os.sendfile(dst_fd, src_fd, None, KERNEL_CHUNK_SIZE)
+        except OSError as e:
+            if _unsupported(e):
+                raise UnsupportedBackend(total) from e
+            raise
+        if n == 0:
+            return total
+        total += n
+        progress(n)
+
+
+def _copy_stream(
+    src_fd: int,
+    dst_fd: int,
+    progress: ProgressCallback = _no_progress,
+    hasher: Hasher | None = None,
+) -> int:
+    total = 0
+    buffer = bytearray(STREAM_BUFFER_SIZE)
+    view = memoryview(buffer)
+    while n := os.readv(src_fd, [buffer]):
+        if hasher is not None:
+            hasher.update(view[:n])
+        written = 0
+        while written < n:
+            written += os.write(dst_fd, view[written:n])
+        total += n
+        progress(n)
+    return total
+
+
+BACKENDS: dict[CopyBackend, Callable[[int, int, ProgressCallback], int]] = {
+    CopyBackend.reflink: _copy_reflink,
+    CopyBackend.copy_file_range: _copy_file_range,
+    CopyBackend.sendfile: _copy_sendfile,
+    CopyBackend.stream: _copy_stream,
+}
+
+DEFAULT_BACKENDS: tuple[CopyBackend, ...] = (
+    CopyBackend.reflink,
+    CopyBackend.copy_file_range,
+    CopyBackend.sendfile,
+    CopyBackend.stream,
+)
+
+
+def copy_fds(
+    src_fd: int,
+    dst_fd: int,
+    backends: Sequence[CopyBackend] = DEFAULT_BACKENDS,
+    hasher: Hasher | None = None,
+    progress: ProgressCallback = _no_progress,
+) -> CopyResult:
+    """Copy from the current offset of src_fd to the current offset of dst_fd
+
+    Returns the backend which finished the copy and the number of bytes copied.
+    The stream backend always works so make sure it's last if you want a
+    guaranteed copy.
+
+    If hasher is given backends is ignored and the copy is streamed through it.
+    progress is called with the size of each chunk as it is copied.
+    """
+    if hasher is not None:
+        copied = _copy_stream(src_fd, dst_fd, progress, hasher)
+        return CopyResult(backend=CopyBackend.stream, bytes_copied=copied)
+    copied = 0
+    for backend in backends:
+        try:
+            copied += BACKENDS[backend](src_fd, dst_fd, progress)
+        except UnsupportedBackend as e:
+            # Some backends may have made progress before giving up
+            copied += e.args[0] if e.args else 0
+            continue
+        return CopyResult(backend=backend, bytes_copied=copied)
+    raise OSError(errno.ENOTSUP, f"No usable copy backend in {list(backends)}")
+
+
+def partial_path(destination: Path) -> Path:
+    return destination.with_name(destination.name + PARTIAL_SUFFIX)
+
+
+def _read_at(fd: int, offset: int, size: int) -> bytes:
+    chunks: list[bytes] = []
+    while size > 0 and (chunk := os.pread(fd, size, offset)):
+        chunks.append(chunk)
+        offset += len(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def verify_prefix(src_fd: int, partial_fd: int, length: int) -> bool:
+    """Check a partial copy looks like the start of the source
+
+    Only the first and last RESUME_VERIFY_SIZE bytes are compared, the middle of
+    a partial is trusted. Reading all of it back would cost about as much as
+    copying it again.
+    """
+    if length > os.fstat(src_fd).st_size:
+        return False
+    head = min(length, RESUME_VERIFY_SIZE)
+    if _read_at(src_fd, 0, head) != _read_at(partial_fd, 0, head):
+        return False
+    tail_start = max(head, length - RESUME_VERIFY_SIZE)
+    tail = length - tail_start
+    return _read_at(src_fd, tail_start, tail) == _read_at(partial_fd, tail_start, tail)
+
+
+def lock_partial(fd: int, partial: Path) -> None:
+    """Lock an open .partial so no other copy can write it at the same time
+
+    Raises FileExistsError if another copy holds it. Filesystems without
+    locking, some network mounts, aren't protected.
+    """
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise FileExistsError(
+            errno.EEXIST, "Another copy is writing", str(partial)
+        ) from None
+    except OSError as e:
+        if e.errno not in (errno.ENOLCK, errno.ENOTSUP, errno.EOPNOTSUPP):
+            raise
+        return
+    # The copy holding the lock may have renamed it into place since it was
+    # opened, in which case this is now the destination
+    try:
+        current = os.stat(partial).st_ino
+    except FileNotFoundError:
+        current = None
+    if current != os.fstat(fd).st_ino:
+        raise FileExistsError(errno.EEXIST, "Another copy wrote", str(partial))
+
+
+def publish_partial(partial: Path, destination: Path) -> None:
+    """Move a finished .partial to destination without replacing an existing file
+
+    Raises FileExistsError if destination exists, e.g. another card or process
+    copied there since the copy was planned.
+    """
+    try:
+        os.link(partial, destination)
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno not in LINK_UNSUPPORTED_ERRNOS:
+            raise
+        # Without hard links checking first leaves a small window for a race
+        if os.path.lexists(destination):
+            raise FileExistsError(
+                errno.EEXIST, "Destination exists", str(destination)
+            ) from None
+        os.replace(partial, destination)
+    else:
+        os.unlink(partial)
+
+
+def copy_file(
+    source: Path,
+    destination: Path,
+    backends: Sequence[CopyBackend] = DEFAULT_BACKENDS,
+    resume: bool = True,
+    digest: HashAlgorithm | None = None,
+    progress: ProgressCallback = _no_progress,
+) -> CopyResult:
+    """Copy a file and its metadata, a drop in replacement for shutil.copy2
+
+    Writes to a .partial file first. With resume on, an existing .partial which
+    matches the source is continued from its current length rather than copied
+    from scratch. Unlike shutil.copy2 an existing destination is never
+    replaced, FileExistsError is raised and the .partial kept.
+
+    With digest set the returned result includes the digest of the copied file.
+
+    progress is called with the number of bytes copied as the copy goes, a
+    resumed copy reports the part already copied first.
+    """
+    partial = partial_path(destination)
+    hasher = new_hasher(digest) if digest is not None else None
+    resumed_from = 0
+    # Only created once the source opens, and not truncated until locked as
+    # another copy may be writing it
+    with (
+        source.open("rb") as src,
+        open(os.open(partial, os.O_RDWR | os.O_CREAT, 0o666), "r+b") as dst,
+    ):
+        lock_partial(dst.fileno(), partial)
+        length = os.fstat(dst.fileno()).st_size
+        if resume and length and verify_prefix(src.fileno(), dst.fileno(), length):
+            resumed_from = length
+        else:
+            dst.truncate(0)
+        if hasher is not None and resumed_from:
+            # Cheaper to read back the already copied part from the destination
+            hash_fd(dst.fileno(), hasher, 0, resumed_from)
+        os.lseek(src.fileno(), resumed_from, os.SEEK_SET)
+        os.lseek(dst.fileno(), resumed_from, os.SEEK_SET)
+        if resumed_from:
+            progress(resumed_from)
+        result = copy_fds(
+            src.fileno(),
+            dst.fileno(),
+            backends=backends,
+            hasher=hasher,
+            progress=progress,
+        )
+        copied = os.fstat(dst.fileno()).st_size
+        expected = os.fstat(src.fileno()).st_size
+        if copied != expected:
+            # e.g. the card was pulled or the source shrank mid copy, keep the
+            # .partial so it isn't mistaken for a finished copy
+            raise OSError(
+                errno.EIO, f"Copied {copied} of {expected} bytes", str(partial)
+            )
+        # Still holding the lock, so no other copy can open the .partial and
+        # write to what is about to become the destination
+        shutil.copystat(source, partial)
+        publish_partial(partial, destination)
+    result.resumed_from = resumed_from
+    if hasher is not None:
+        result.digest_algorithm = digest
+        result.digest = hasher.hexdigest()
+    return result
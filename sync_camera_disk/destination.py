@@ -1,51 +1,268 @@
+import collections
 import datetime
+import os
+import threading
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
+from .config import IdentityCheck
 from .file import FileSet
+from .hash_cache import HashCache
+from .hashing import HashAlgorithm, hash_fd, hash_file, new_hasher
+from .manifest import Manifest
 from .operation import Operation, OperationType
 
+# How much of the start and end of a file is hashed for IdentityCheck.sample
+SAMPLE_SIZE = 4 * 1024 * 1024
+
+
+def sample_digest(
+    path: Path,
+    algorithm: HashAlgorithm = HashAlgorithm.blake2b,
+    sample_size: int = SAMPLE_SIZE,
+) -> str:
+    """Hash the first and last sample_size bytes of a file
+
+    Files up to twice sample_size are hashed completely.
+    """
+    hasher = new_hasher(algorithm)
+    with path.open("rb") as fp:
+        size = os.fstat(fp.fileno()).st_size
+        hasher.update(size.to_bytes(8, "little"))
+        if size <= sample_size * 2:
+            hash_fd(fp.fileno(), hasher)
+        else:
+            hash_fd(fp.fileno(), hasher, 0, sample_size)
+            hash_fd(fp.fileno(), hasher, size - sample_size, sample_size)
+    return hasher.hexdigest()
+
+
+def is_file_identical(
+    a: Path,
+    b: Path,
+    check: IdentityCheck = IdentityCheck.size,
+    algorithm: HashAlgorithm = HashAlgorithm.blake2b,
+    counters: collections.Counter[str] | None = None,
+    sample_size: int = SAMPLE_SIZE,
+    cache: HashCache | None = None,
+    stat_a: os.stat_result | None = None,
+    stat_b: os.stat_result | None = None,
+    found_digests: dict[Path, str] | None = None,
+) -> bool:
+    """Compare files in tiers, stopping at the first tier which gives an answer
+
+    1. name and size
+    2. hash of the first and last sample_size bytes (check=sample or full)
+    3. hash of the whole file (check=full)
+
+    counters gets an identity_<tier>_<identical|different> entry for the tier
+    which resolved the comparison.
+
+    Sample and full digests are remembered in cache so unchanged files are only
+    read once.
+
+    stat_a and stat_b can be passed in if already known to save a stat call.
+
+    found_digests gets the full digests of a and b when the full tier is reached.
+    """
+
+    stat_a = stat_a if stat_a is not None else a.stat()
+    stat_b = stat_b if stat_b is not None else b.stat()
+
+    def digest(
+        path: Path, stat: os.stat_result, kind: str, compute: Callable[[], str]
+    ) -> str:
+        if cache is None:
+            return compute()
+        return cache.get_or_compute(path, algorithm, kind, compute, stat)
+
+    def resolved(tier: str, identical: bool) -> bool:
+        if counters is not None:
+            counters[
+                f"identity_{tier}_{'identical' if identical else 'different'}"
+            ] += 1
+        return identical
 
-def is_file_identical(a: Path, b: Path) -> bool:
-    stat_a = a.stat()
-    stat_b = b.stat()
     # Can't use mtime or ctime as these don't accurately copy over.
     # ctime can't be modified easily either.
-    # For now assume size and name are enough to test equality
-    # TODO: add hash checking!
-    return (a.name == b.name) and (stat_a.st_size == stat_b.st_size)
+    if (a.name != b.name) or (stat_a.st_size != stat_b.st_size):
+        return resolved("size", False)
+    if check == IdentityCheck.size:
+        return resolved("size", True)
+
+    # A sample of a small file reads all of it, so with check=full go straight to
+    # the full digest, which can then be handed back in found_digests
+    small = stat_a.st_size <= sample_size * 2
+    if check == IdentityCheck.sample or not small:
+        sample_kind = f"sample:{sample_size}"
+        if digest(
+            a, stat_a, sample_kind, lambda: sample_digest(a, algorithm, sample_size)
+        ) != digest(
+            b, stat_b, sample_kind, lambda: sample_digest(b, algorithm, sample_size)
+        ):
+            return resolved("sample", False)
+        # Small files were completely hashed by the sample
+        if check == IdentityCheck.sample or small:
+            return resolved("sample", True)
+
+    digest_a = digest(a, stat_a, "full", lambda: hash_file(a, algorithm))
+    digest_b = digest(b, stat_b, "full", lambda: hash_file(b, algorithm))
+    if found_digests is not None:
+        found_digests[a] = digest_a
+        found_digests[b] = digest_b
+    return resolved("full", digest_a == digest_b)
+
+
+class DestinationIndex:
+    """Lazily built index of the files under each destination folder
+
+    Each folder is walked once with os.scandir on first lookup and every later
+    existence or size question is answered from memory, which matters a lot when
+    the destination is a NAS.
+    """
+
+    def __init__(self) -> None:
+        self._folders: dict[Path, dict[Path, os.stat_result]] = {}
+        self.folders_scanned = 0
+
+    def _scan(self, folder: Path) -> dict[Path, os.stat_result]:
+        entries: dict[Path, os.stat_result] = {}
+        pending = [(folder, Path())]
+        while pending:
+            directory, relative = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append((Path(entry.path), relative / entry.name))
+                        elif entry.is_file():
+                            entries[relative / entry.name] = entry.stat()
+            except FileNotFoundError:
+                pass
+        self.folders_scanned += 1
+        return entries
+
+    def lookup(self, folder: Path, relative_path: Path) -> os.stat_result | None:
+        """Return the stat of folder / relative_path, or None if it doesn't exist"""
+        if folder not in self._folders:
+            self._folders[folder] = self._scan(folder)
+        return self._folders[folder].get(relative_path)
+
+
+class DestinationClaims:
+    """Destination paths planned to be copied to, safe to share between threads
+
+    Cards synced at the same time each plan with their own DestinationIndex, so
+    two cards holding the same relative path for the same day would both plan
+    a copy to it. Planners writing to the same destination share one of these
+    and only the first to claim a path copies to it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._paths: set[Path] = set()
+
+    def claim(self, path: Path) -> bool:
+        """Claim path, False if it was already claimed"""
+        with self._lock:
+            if path in self._paths:
+                return False
+            self._paths.add(path)
+            return True
 
 
 class DatedFolderDestination(BaseModel):
     """Writes files into YYYY-MM-DD folders"""
 
     prefix: Path
+    identity_check: IdentityCheck = IdentityCheck.size
+    digest_algorithm: HashAlgorithm = HashAlgorithm.blake2b
+    hash_cache: HashCache | None = None
+    # Files recorded here as already imported are assumed identical
+    manifest: Manifest | None = None
+    # Shared with other planners writing to prefix
+    claims: DestinationClaims | None = None
+
+    _index: DestinationIndex = PrivateAttr(default_factory=DestinationIndex)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def get_destination_folder(self, when: datetime.datetime) -> Path:
+        return self.prefix / when.date().isoformat()
 
     def get_destination_path(self, path: Path, when: datetime.datetime) -> Path:
-        return self.prefix / when.date().isoformat() / path
+        return self.get_destination_folder(when) / path
 
-    def generate_operations(self, file_set: FileSet) -> Iterable[Operation]:
-        created = file_set.get_created_datetime()
+    def generate_operations(
+        self,
+        file_set: FileSet,
+        counters: collections.Counter[str] | None = None,
+    ) -> Iterable[Operation]:
+        created = file_set.get_created_datetime(counters)
+        destination_folder = self.get_destination_folder(created)
         for file in file_set.files:
             relative_path = file.path.relative_to(file_set.volume_path)
             destination_path = self.get_destination_path(
                 path=relative_path, when=created
             )
-            if not destination_path.exists():
-                operation_type = OperationType.copy
+            if self.manifest is not None:
+                source_stat = file.get_stat(counters)
+                if self.manifest.is_imported(
+                    volume_identifier=file_set.volume_identifier,
+                    relative_path=relative_path,
+                    size=source_stat.st_size,
+                    mtime_ns=source_stat.st_mtime_ns,
+                    destination=destination_path,
+                ):
+                    if counters is not None:
+                        counters["manifest_imported"] += 1
+                    yield Operation(
+                        operation=OperationType.identical,
+                        source=file.path,
+                        destination=destination_path,
+                    )
+                    continue
+            destination_stat = self._index.lookup(destination_folder, relative_path)
+            found_digests: dict[Path, str] = {}
+            if destination_stat is None:
+                if self.claims is None or self.claims.claim(destination_path):
+                    operation_type = OperationType.copy
+                else:
+                    # Another card is copying a different file here
+                    if counters is not None:
+                        counters["destination_claimed"] += 1
+                    operation_type = OperationType.unknown
             # elif (
             #     destination_path.exists()
             #     and file.path.stat().st_size == destination_path.stat().st_size
             # ):
             #     operation_type = OperationType.copy_stat
-            elif destination_path.exists() and is_file_identical(
-                file.path, destination_path
+            elif is_file_identical(
+                file.path,
+                destination_path,
+                check=self.identity_check,
+                algorithm=self.digest_algorithm,
+                counters=counters,
+                cache=self.hash_cache,
+                stat_a=file.get_stat(counters),
+                stat_b=destination_stat,
+                found_digests=found_digests,
             ):
                 operation_type = OperationType.identical
             else:
                 operation_type = OperationType.unknown
+            digest = (
+                found_digests.get(file.path)
+                if operation_type == OperationType.identical
+                else None
+            )
             yield Operation(
-                operation=operation_type, source=file.path, destination=destination_path
+                operation=operation_type,
+                source=file.path,
+                destination=destination_path,
+                digest_algorithm=self.digest_algorithm if digest is not None else None,
+                digest=digest,
             )
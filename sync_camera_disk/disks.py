@@ -4,7 +4,7 @@ from typing import Iterable
 
 import pydantic
 
-from . import macos
+from . import linux, macos
 
 
 class DiskMount(pydantic.BaseModel):
@@ -39,6 +39,35 @@ def mac_disks_to_disk_mounts(mac_disks: macos.DiskutilList) -> Iterable[DiskMoun
                 )
 
 
+def linux_disks_to_disk_mounts(
+    linux_disks: linux.LinuxDisks,
+) -> Iterable[DiskMount]:
+    """Yield mounted volumes on external disks"""
+    block_devices = {
+        block_device.device: block_device
+        for block_device in linux_disks.block_devices
+        if block_device.external
+    }
+    seen = set()
+    for mount in linux_disks.mounts:
+        block_device = block_devices.get(mount.device)
+        # The same volume can be mounted in more than one place
+        if block_device is None or block_device.device in seen:
+            continue
+        seen.add(block_device.device)
+        uuid = linux_disks.uuids.get(block_device.name)
+        yield DiskMount(
+            path=mount.mount_point,
+            unique_identifier=uuid.lower()
+            if uuid is not None
+            else f"{mount.file_system}-{block_device.disk_size}-{block_device.size}",
+            disk_size=block_device.disk_size,
+            volume_size=block_device.size,
+            volume_name=linux_disks.labels.get(block_device.name),
+            volume_file_system=mount.file_system,
+        )
+
+
 def list_disks(input: bytes | None = None) -> Iterable[DiskMount]:
     match sys.platform:
         case "darwin":
@@ -49,5 +78,12 @@ def list_disks(input: bytes | None = None) -> Iterable[DiskMount]:
             )
             mac_disks = macos.parse_diskutil_output(diskutil_disks)
             yield from mac_disks_to_disk_mounts(mac_disks)
+        case "linux":
+            linux_disks = (
+                linux.LinuxDisks.parse_raw(input)
+                if input is not None
+                else linux.read_linux_disks()
+            )
+            yield from linux_disks_to_disk_mounts(linux_disks)
         case _:
             raise NotImplementedError(sys.platform)
@@ -0,0 +1,231 @@
+"""Runs operations concurrently with per device limits
+
+Each operation is tagged with the device it reads from and the device it writes
+to. Operations wait in a queue per source device and are only handed to a
+worker once their devices have a free slot, so a slow SD card only ever sees a
+few readers while a fast destination can take many writers, and workers never
+sit blocked on a busy device while another card has work that could run.
+
+When several sources have work ready the one with the fewest bytes dispatched
+so far goes next, so cards syncing at the same time share the destination
+fairly and a card full of large clips can't starve one full of photos.
+"""
+
+import collections
+import concurrent.futures
+import dataclasses
+import functools
+import threading
+from typing import Callable, Generic, Iterable, TypeVar
+
+import structlog
+
+from .copying import ProgressCallback
+from .operation import Operation, OperationResult, OperationType, perform_operation
+
+LOG: structlog.stdlib.BoundLogger = structlog.get_logger()
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass(slots=True)
+class _Queued(Generic[T]):
+    tag: T
+    operation: Operation
+    source: tuple[str, int]
+    destination: tuple[str, int]
+    size: int
+    slots: tuple[tuple[str, int], ...]
+    progress: ProgressCallback | None
+
+
+class OperationExecutor(Generic[T]):
+    """Worker pool and scheduler for perform_operation
+
+    Operations are submitted along with a tag (returned with the result), the
+    source and destination device keys and limits, and optionally their size in
+    bytes. Copies hold both a reader and a writer slot, copy_stat only needs a
+    writer slot, everything else runs without taking any slots.
+
+    At most max_pending operations per source device are queued or running,
+    submit() blocks until there is room so callers can feed it from a generator
+    without holding everything in memory. Submitting from a thread per source
+    lets each source keep its own queue full.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_pending: int | None = None,
+        dry_run: bool = True,
+        perform: Callable[..., OperationResult] = perform_operation,
+    ) -> None:
+        self.dry_run = dry_run
+        self.max_workers = max_workers
+        self.max_pending = max_pending if max_pending is not None else max_workers * 4
+        self._perform = perform
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sync-camera-disk"
+        )
+        self._condition = threading.Condition()
+        self._closed = False
+        self._queues: dict[str, collections.deque[_Queued[T]]] = {}
+        # Queued or running per source
+        self._pending: collections.Counter[str] = collections.Counter()
+        # Slots in use per "source:<key>" or "destination:<key>"
+        self._busy: collections.Counter[str] = collections.Counter()
+        self._dispatched_bytes: collections.Counter[str] = collections.Counter()
+        self._running = 0
+        self._done: list[tuple[T, concurrent.futures.Future[OperationResult]]] = []
+        # Set by wake() to end a wait in completed() without a result
+        self._woken = False
+
+    def __enter__(self) -> "OperationExecutor[T]":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _slots(
+        self,
+        operation: Operation,
+        source: tuple[str, int],
+        destination: tuple[str, int],
+    ) -> tuple[tuple[str, int], ...]:
+        if self.dry_run:
+            return ()
+        match operation.operation:
+            case OperationType.copy:
+                return (
+                    (f"source:{source[0]}", source[1]),
+                    (f"destination:{destination[0]}", destination[1]),
+                )
+            case OperationType.copy_stat:
+                return ((f"destination:{destination[0]}", destination[1]),)
+            case _:
+                return ()
+
+    def _can_run(self, queued: _Queued[T]) -> bool:
+        return all(self._busy[key] < limit for key, limit in queued.slots)
+
+    def _dispatch(self) -> None:
+        """Start as many queued operations as workers and device slots allow
+
+        Called with the condition held.
+        """
+        while not self._closed and self._running < self.max_workers:
+            ready = [
+                source
+                for source, queue in self._queues.items()
+                if queue and self._can_run(queue[0])
+            ]
+            if not ready:
+                return
+            source = min(ready, key=self._dispatched_bytes.__getitem__)
+            queued = self._queues[source].popleft()
+            for key, _ in queued.slots:
+                self._busy[key] += 1
+            self._dispatched_bytes[source] += queued.size
+            self._running += 1
+            future = self._pool.submit(
+                self._perform,
+                queued.operation,
+                dry_run=self.dry_run,
+                progress=queued.progress,
+            )
+            future.add_done_callback(functools.partial(self._finished, queued))
+
+    def _finished(
+        self,
+        queued: _Queued[T],
+        future: concurrent.futures.Future[OperationResult],
+    ) -> None:
+        with self._condition:
+            for key, _ in queued.slots:
+                self._busy[key] -= 1
+            self._running -= 1
+            self._pending[queued.source[0]] -= 1
+            if not future.cancelled():
+                self._done.append((queued.tag, future))
+            self._dispatch()
+            self._condition.notify_all()
+
+    def submit(
+        self,
+        tag: T,
+        operation: Operation,
+        source: tuple[str, int],
+        destination: tuple[str, int],
+        size: int = 0,
+        progress: ProgressCallback | None = None,
+    ) -> None:
+        """Queue an operation
+
+        source and destination are (device key, max concurrent operations), size
+        is the number of bytes the operation will move. progress is passed on to
+        perform to report bytes as they are copied.
+        """
+        queued = _Queued(
+            tag=tag,
+            operation=operation,
+            source=source,
+            destination=destination,
+            size=size,
+            slots=self._slots(operation, source, destination),
+            progress=progress,
+        )
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._closed or self._pending[source[0]] < self.max_pending
+            )
+            if self._closed:
+                raise RuntimeError("OperationExecutor is closed")
+            self._pending[source[0]] += 1
+            self._queues.setdefault(source[0], collections.deque()).append(queued)
+            self._dispatch()
+
+    @property
+    def outstanding(self) -> int:
+        """Operations queued or running"""
+        with self._condition:
+            return self._pending.total()
+
+    def wake(self) -> None:
+        """End the current or next wait in completed(), e.g. when a producer ends"""
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def completed(
+        self, timeout: float | None = 0
+    ) -> Iterable[tuple[T, OperationResult]]:
+        """Yield results which have finished so far
+
+        Waits up to timeout seconds for at least one result or a call to wake().
+        With timeout None it waits forever, but returns straight away when
+        nothing is outstanding.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (
+                    self._done
+                    or self._woken
+                    or (timeout is None and not self._pending.total())
+                ),
+                timeout=timeout,
+            )
+            self._woken = False
+            done, self._done = self._done, []
+        for tag, future in done:
+            yield tag, future.result()
+
+    def wait(self) -> Iterable[tuple[T, OperationResult]]:
+        """Yield all remaining results as they finish"""
+        while True:
+            yield from self.completed(timeout=None)
+            with self._condition:
+                if not self._pending.total() and not self._done:
+                    return
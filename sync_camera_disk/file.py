@@ -1,22 +1,52 @@
+"""Files found on a source disk
+
+These are created for every file on a card (100k+ on timelapse cards) so are
+plain slotted dataclasses rather than pydantic models.
+"""
+
+import collections
+import dataclasses
 import datetime
+import os
 from pathlib import Path
 
-from pydantic import BaseModel
-
 
-class File(BaseModel):
+@dataclasses.dataclass(slots=True)
+class File:
     path: Path
+    # Captured from os.scandir during enumeration so the file is stat'd once
+    stat: os.stat_result | None = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    def get_stat(
+        self, counters: collections.Counter[str] | None = None
+    ) -> os.stat_result:
+        """Return the stat captured during enumeration, stat'ing only if missing
+
+        Any stat needed here is counted as source_stat_extra in counters.
+        """
+        if self.stat is None:
+            self.stat = self.path.stat()
+            if counters is not None:
+                counters["source_stat_extra"] += 1
+        return self.stat
 
-    def get_created_datetime(self) -> datetime.datetime:
-        return datetime.datetime.fromtimestamp(self.path.stat().st_ctime)
+    def get_created_datetime(
+        self, counters: collections.Counter[str] | None = None
+    ) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.get_stat(counters).st_ctime)
 
 
-class FileSet(BaseModel):
+@dataclasses.dataclass(slots=True)
+class FileSet:
     files: list[File]
     stem: str
     prefix: Path
     volume_path: Path  # volume_path / prefix / stem
     volume_identifier: str
 
-    def get_created_datetime(self) -> datetime.datetime:
-        return min(f.get_created_datetime() for f in self.files)
+    def get_created_datetime(
+        self, counters: collections.Counter[str] | None = None
+    ) -> datetime.datetime:
+        return min(f.get_created_datetime(counters) for f in self.files)
@@ -1,18 +1,72 @@
 """Filters candidate disks configs down to most likely ones"""
 
-from typing import Iterable
+import collections
+from typing import Hashable, Iterable
 
 import structlog
 
-from .config import Config, MatchType, Sync
+from .config import Config, MatchType, Source, Sync
 from .disks import DiskMount
 
 LOG: structlog.stdlib.BoundLogger = structlog.get_logger()
 
 
+def _disk_value(disk: DiskMount, match_type: MatchType) -> Hashable:
+    match match_type:
+        case MatchType.identifier:
+            return disk.unique_identifier
+        case MatchType.disk_size:
+            return disk.disk_size
+        case MatchType.volume_size:
+            return disk.volume_size
+        case MatchType.volume_file_system:
+            return disk.volume_file_system
+
+
+def _source_value(source: Source, match_type: MatchType) -> Hashable:
+    match match_type:
+        case MatchType.identifier:
+            return source.identifier
+        case MatchType.disk_size:
+            return source.disk_size
+        case MatchType.volume_size:
+            return source.volume_size
+        case MatchType.volume_file_system:
+            return source.volume_file_system
+
+
+class SyncIndex:
+    """Syncs indexed on the values of their match_on properties
+
+    Syncs are grouped by their match_on properties and each group is a dict
+    from the expected values to the syncs (by position in the config), so
+    finding the syncs for a disk is one lookup per distinct match_on.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self.syncs = config.syncs
+        # Plain dicts rather than defaultdicts so the index can be pickled
+        self._indexes: dict[
+            tuple[MatchType, ...], dict[tuple[Hashable, ...], list[int]]
+        ] = {}
+        for position, sync in enumerate(config.syncs):
+            match_on = tuple(sync.source.match_on)
+            key = tuple(_source_value(sync.source, m) for m in match_on)
+            self._indexes.setdefault(match_on, {}).setdefault(key, []).append(position)
+
+    def lookup(self, disk: DiskMount) -> list[int]:
+        """Positions of the syncs matching disk"""
+        positions: list[int] = []
+        for match_on, index in self._indexes.items():
+            key = tuple(_disk_value(disk, m) for m in match_on)
+            positions.extend(index.get(key, ()))
+        return sorted(positions)
+
+
 def filter_disks_to_syncs(
     config: Config,
     disks: Iterable[DiskMount],
+    index: SyncIndex | None = None,
 ) -> Iterable[tuple[Sync, DiskMount]]:
     """Finds the best matching sync config for each disk present
 
@@ -22,35 +76,23 @@ def filter_disks_to_syncs(
 
     Uses match_on config to determine which properties to match on.
 
+    index can be passed in to avoid building it again for the same config.
+
     In future this might also need to read some files from the disk to match it.
     """
+    if index is None:
+        index = SyncIndex(config)
+
+    matched_disks: dict[int, list[DiskMount]] = collections.defaultdict(list)
+    for disk in disks:
+        positions = index.lookup(disk)
+        LOG.debug("Matched disk", disk=disk, syncs=positions)
+        for position in positions:
+            matched_disks[position].append(disk)
 
-    disks = list(disks)  # convert to a list to ensure we can iterate over it twice
-
-    for sync in config.syncs:
-        matched_disks: list[DiskMount] = []
-        for disk in disks:
-            matches: list[bool] = []
-            LOG.debug(
-                "Attempting to match",
-                disk=disk,
-                match_on=sync.source.match_on,
-                sync=sync,
-            )
-            for expected_match in sync.source.match_on:
-                match expected_match:
-                    case MatchType.identifier:
-                        matches.append(disk.unique_identifier == sync.source.identifier)
-                    case MatchType.disk_size:
-                        matches.append(disk.disk_size == sync.source.disk_size)
-                    case MatchType.volume_size:
-                        matches.append(disk.volume_size == sync.source.volume_size)
-                    case MatchType.volume_file_system:
-                        matches.append(
-                            disk.volume_file_system == sync.source.volume_file_system
-                        )
-            if len(matches) == len(sync.source.match_on) and all(matches):
-                matched_disks.append(disk)
-        assert len(matched_disks) <= 1, (len(matched_disks), matched_disks, sync)
-        if matched_disks:
-            yield (sync, matched_disks[0])
+    # Keep config order
+    for position in sorted(matched_disks):
+        sync = index.syncs[position]
+        disks_for_sync = matched_disks[position]
+        assert len(disks_for_sync) <= 1, (len(disks_for_sync), disks_for_sync, sync)
+        yield (sync, disks_for_sync[0])
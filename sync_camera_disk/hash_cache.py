@@ -0,0 +1,165 @@
+"""Persistent cache of file digests
+
+Digests are keyed on (st_dev, st_ino, st_size, st_mtime_ns) so any change to a
+file (or it being replaced) misses the cache. Entries are evicted least
+recently used first once there are more than max_entries.
+
+Note that st_dev isn't stable for some network mounts across remounts, in which
+case the cache simply misses and the file is hashed again.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from .hashing import HashAlgorithm
+
+# Commit and check the size limit after this many writes
+COMMIT_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    algorithm TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (dev, ino, size, mtime_ns, algorithm, kind)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS digests_last_used ON digests (last_used);
+"""
+
+
+class HashCache:
+    """SQLite backed digest cache, safe to share between threads
+
+    kind distinguishes different digests of the same file, e.g. "full" or
+    "sample:4194304".
+    """
+
+    def __init__(self, path: Path, max_entries: int = 1_000_000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._evict()
+            self._db.commit()
+            self._db.close()
+
+    def _key(
+        self, stat: os.stat_result, algorithm: HashAlgorithm, kind: str
+    ) -> tuple[int, int, int, int, str, str]:
+        return (
+            stat.st_dev,
+            stat.st_ino,
+            stat.st_size,
+            stat.st_mtime_ns,
+            str(algorithm),
+            kind,
+        )
+
+    def _wrote(self) -> None:
+        self._writes += 1
+        if self._writes % COMMIT_EVERY == 0:
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        self._db.execute(
+            """
+            DELETE FROM digests WHERE last_used <= (
+                SELECT last_used FROM digests
+                ORDER BY last_used DESC LIMIT 1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def get(
+        self, stat: os.stat_result, algorithm: HashAlgorithm, kind: str
+    ) -> str | None:
+        key = self._key(stat, algorithm, kind)
+        with self._lock:
+            row = self._db.execute(
+                """
+                SELECT digest FROM digests WHERE dev = ? AND ino = ? AND size = ?
+                AND mtime_ns = ? AND algorithm = ? AND kind = ?
+                """,
+                key,
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute(
+                """
+                UPDATE digests SET last_used = ? WHERE dev = ? AND ino = ?
+                AND size = ? AND mtime_ns = ? AND algorithm = ? AND kind = ?
+                """,
+                (time.time_ns(), *key),
+            )
+            self._wrote()
+            return str(row[0])
+
+    def put(
+        self,
+        stat: os.stat_result,
+        algorithm: HashAlgorithm,
+        kind: str,
+        digest: str,
+    ) -> None:
+        key = self._key(stat, algorithm, kind)
+        with self._lock:
+            # Older versions of the same file will never be looked up again
+            self._db.execute(
+                """
+                DELETE FROM digests WHERE dev = ? AND ino = ?
+                AND (size != ? OR mtime_ns != ?)
+                """,
+                key[:4],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, digest, time.time_ns()),
+            )
+            self._wrote()
+
+    def get_or_compute(
+        self,
+        path: Path,
+        algorithm: HashAlgorithm,
+        kind: str,
+        compute: Callable[[], str],
+        stat: os.stat_result | None = None,
+    ) -> str:
+        """Cached digest of path, computed and cached on a miss
+
+        stat can be passed in if already known to save a stat call.
+        """
+        stat = stat if stat is not None else path.stat()
+        digest = self.get(stat, algorithm, kind)
+        if digest is None:
+            digest = compute()
+            self.put(stat, algorithm, kind, digest)
+        return digest
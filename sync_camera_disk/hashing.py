@@ -0,0 +1,73 @@
+"""File digests for verifying copies
+
+BLAKE2b is always available. xxHash (XXH3) is a lot cheaper per byte and used
+when the optional xxhash package is installed.
+"""
+
+import enum
+import hashlib
+import os
+from pathlib import Path
+from typing import Protocol
+
+HASH_BUFFER_SIZE = 8 * 1024 * 1024
+
+
+class HashAlgorithm(enum.StrEnum):
+    blake2b = "blake2b"
+    xxh3_128 = "xxh3_128"
+
+
+class Hasher(Protocol):
+    def update(self, data: bytes | bytearray | memoryview, /) -> None: ...
+
+    def hexdigest(self) -> str: ...
+
+
+def new_hasher(algorithm: HashAlgorithm) -> Hasher:
+    match algorithm:
+        case HashAlgorithm.blake2b:
+            return hashlib.blake2b()
+        case HashAlgorithm.xxh3_128:
+            try:
+                import xxhash
+            except ImportError as e:
+                raise RuntimeError(
+                    "xxh3_128 needs the xxhash package, pip install xxhash"
+                ) from e
+            hasher: Hasher = xxhash.xxh3_128()
+            return hasher
+        case _:
+            raise NotImplementedError(algorithm)
+
+
+def hash_fd(
+    fd: int,
+    hasher: Hasher,
+    start: int = 0,
+    length: int | None = None,
+) -> None:
+    """Feed length bytes of fd starting at start into hasher (to EOF if None)"""
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    offset = start
+    remaining = length
+    while remaining is None or remaining > 0:
+        size = len(buffer) if remaining is None else min(len(buffer), remaining)
+        n = os.preadv(fd, [view[:size]], offset)
+        if n == 0:
+            break
+        hasher.update(view[:n])
+        offset += n
+        if remaining is not None:
+            remaining -= n
+
+
+def hash_file(
+    path: Path,
+    algorithm: HashAlgorithm = HashAlgorithm.blake2b,
+) -> str:
+    hasher = new_hasher(algorithm)
+    with path.open("rb") as fp:
+        hash_fd(fp.fileno(), hasher)
+    return hasher.hexdigest()
@@ -0,0 +1,132 @@
+"""Read mounted disks on Linux from procfs and sysfs
+
+Mounts come from /proc/self/mountinfo, disk and partition sizes from /sys/block
+and volume UUIDs and names from the /dev/disk/by-uuid and /dev/disk/by-label
+symlinks. Nothing is spawned so this takes a few milliseconds.
+
+Everything is read relative to root so tests can use a fake tree.
+"""
+
+import os
+import re
+from pathlib import Path
+
+import pydantic
+
+# sysfs sizes are always in 512 byte sectors
+SECTOR_SIZE = 512
+
+
+class Mount(pydantic.BaseModel):
+    device: str  # major:minor
+    mount_point: Path
+    file_system: str
+
+
+class BlockDevice(pydantic.BaseModel):
+    name: str  # e.g. sdb1
+    device: str  # major:minor
+    size: int
+    disk: str  # e.g. sdb, same as name if the disk isn't partitioned
+    disk_size: int
+    # Removable, USB or SD card, i.e. not an internal disk
+    external: bool
+
+
+class LinuxDisks(pydantic.BaseModel):
+    mounts: list[Mount]
+    block_devices: list[BlockDevice]
+    uuids: dict[str, str]  # device name -> UUID
+    labels: dict[str, str]  # device name -> label
+
+
+def _unescape_mountinfo(value: str) -> str:
+    r"""Mount points escape spaces and friends as octal, e.g. \040"""
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m[1], 8)), value)
+
+
+def _unescape_udev(value: str) -> str:
+    r"""udev escapes spaces and friends in link names as hex, e.g. \x20"""
+    return re.sub(r"\\x([0-9a-fA-F]{2})", lambda m: chr(int(m[1], 16)), value)
+
+
+def parse_mountinfo(mountinfo: str) -> list[Mount]:
+    """Parse /proc/self/mountinfo, skipping bind mounts of sub folders
+
+    36 35 98:0 / /mnt/card rw,noatime master:1 - exfat /dev/sdb1 rw
+    """
+    mounts = []
+    for line in mountinfo.splitlines():
+        fields, _, super_fields = line.partition(" - ")
+        fields_parts = fields.split()
+        super_parts = super_fields.split()
+        if len(fields_parts) < 5 or not super_parts:
+            continue
+        _, _, device, root, mount_point = fields_parts[:5]
+        if root != "/":
+            continue
+        mounts.append(
+            Mount(
+                device=device,
+                mount_point=Path(_unescape_mountinfo(mount_point)),
+                file_system=super_parts[0],
+            )
+        )
+    return mounts
+
+
+def _read(path: Path) -> str:
+    return path.read_text().strip()
+
+
+def read_block_devices(sys_block: Path) -> list[BlockDevice]:
+    """Read disks and their partitions from /sys/block"""
+    block_devices = []
+    for disk_path in sorted(sys_block.iterdir()):
+        try:
+            disk_size = int(_read(disk_path / "size")) * SECTOR_SIZE
+            removable = _read(disk_path / "removable") == "1"
+        except FileNotFoundError:
+            continue
+        # e.g. /sys/devices/pci0000:00/0000:00:14.0/usb2/2-1/.../block/sdb
+        device_parts = Path(os.path.realpath(disk_path)).parts
+        external = removable or any(
+            part.startswith(("usb", "mmc")) for part in device_parts
+        )
+        partitions = [
+            path
+            for path in sorted(disk_path.iterdir())
+            if (path / "partition").exists()
+        ]
+        for path in partitions or [disk_path]:
+            block_devices.append(
+                BlockDevice(
+                    name=path.name,
+                    device=_read(path / "dev"),
+                    size=int(_read(path / "size")) * SECTOR_SIZE,
+                    disk=disk_path.name,
+                    disk_size=disk_size,
+                    external=external,
+                )
+            )
+    return block_devices
+
+
+def read_device_links(directory: Path) -> dict[str, str]:
+    """Map device names to link names, e.g. sdb1 -> ABCD-1234 from by-uuid"""
+    try:
+        return {
+            Path(os.readlink(link)).name: _unescape_udev(link.name)
+            for link in directory.iterdir()
+        }
+    except FileNotFoundError:
+        return {}
+
+
+def read_linux_disks(root: Path = Path("/")) -> LinuxDisks:
+    return LinuxDisks(
+        mounts=parse_mountinfo((root / "proc/self/mountinfo").read_text()),
+        block_devices=read_block_devices(root / "sys/block"),
+        uuids=read_device_links(root / "dev/disk/by-uuid"),
+        labels=read_device_links(root / "dev/disk/by-label"),
+    )
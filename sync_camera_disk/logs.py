@@ -0,0 +1,205 @@
+"""structlog setup
+
+By default structlog renders and prints each log line in the thread which
+logged it, so on the per file hot path every planner and worker thread spends
+time building reprs and writing to the terminal. With buffered logging the
+calling thread only adds the level, timestamp and context and puts the event on
+a queue, a background thread renders and prints it.
+
+Events are rendered a little later than they are logged so anything logged
+should not be changed afterwards.
+"""
+
+import atexit
+import datetime
+import logging
+import queue
+import sys
+import threading
+import time
+from typing import Any, Sequence
+
+import structlog
+from structlog.typing import EventDict, Processor, WrappedLogger
+
+# Blocks logging threads if the renderer falls this far behind
+MAX_QUEUED = 10_000
+# Most events rendered per write
+MAX_BATCH = 1000
+
+_DONE = object()
+
+
+class QueueLogger:
+    """structlog logger which queues event dicts rather than printing them"""
+
+    def __init__(self, events: "queue.Queue[object]") -> None:
+        self._events = events
+
+    def msg(self, **event_dict: Any) -> None:
+        self._events.put(event_dict)
+
+    log = debug = info = warn = warning = msg
+    fatal = failure = err = error = critical = exception = msg
+
+
+class LogRenderer:
+    """Renders and prints queued events in a background thread
+
+    processors are run on each event, the last should render it to a string.
+    """
+
+    def __init__(
+        self, processors: Sequence[Processor], maxsize: int = MAX_QUEUED
+    ) -> None:
+        self.events: queue.Queue[object] = queue.Queue(maxsize=maxsize)
+        self._processors = processors
+        self._thread = threading.Thread(
+            target=self._run, name="sync-camera-disk-log", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Print everything queued so far and stop"""
+        if self._thread.is_alive():
+            self.events.put(_DONE)
+            self._thread.join()
+
+    def logger_factory(self, *args: Any) -> QueueLogger:
+        return QueueLogger(self.events)
+
+    def _render(self, event_dict: EventDict) -> str:
+        result: Any = event_dict
+        try:
+            for processor in self._processors:
+                result = processor(None, event_dict.get("level", ""), result)
+        except Exception as e:
+            # Don't lose the event or stop rendering
+            return f"Couldn't render log event {event_dict!r}: {e!r}"
+        return result.decode() if isinstance(result, bytes) else str(result)
+
+    def _run(self) -> None:
+        while True:
+            # Take everything queued so far and write it in one go
+            batch = [self.events.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self.events.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [
+                self._render(event_dict)
+                for event_dict in batch
+                if isinstance(event_dict, dict)
+            ]
+            if lines:
+                try:
+                    sys.stdout.write("".join(f"{line}\n" for line in lines))
+                    sys.stdout.flush()
+                except (OSError, ValueError):
+                    # stdout closed, keep draining so logging never blocks
+                    pass
+            if batch[-1] is _DONE:
+                return
+
+
+def _add_timestamp(
+    logger: WrappedLogger, name: str, event_dict: EventDict
+) -> EventDict:
+    """Raw timestamp, much cheaper than formatting it"""
+    event_dict["timestamp"] = time.time()
+    return event_dict
+
+
+def _format_timestamp_local(
+    logger: WrappedLogger, name: str, event_dict: EventDict
+) -> EventDict:
+    """Same format as structlog's default TimeStamper"""
+    timestamp = datetime.datetime.fromtimestamp(event_dict["timestamp"])
+    event_dict["timestamp"] = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+    return event_dict
+
+
+def _format_timestamp_utc(
+    logger: WrappedLogger, name: str, event_dict: EventDict
+) -> EventDict:
+    """Same format as TimeStamper(fmt="iso", utc=True)"""
+    timestamp = datetime.datetime.fromtimestamp(
+        event_dict["timestamp"], datetime.timezone.utc
+    )
+    event_dict["timestamp"] = timestamp.isoformat().replace("+00:00", "Z")
+    return event_dict
+
+
+def _capture_exc_info(
+    logger: WrappedLogger, name: str, event_dict: EventDict
+) -> EventDict:
+    """Look up the exception now, the renderer runs in another thread"""
+    if event_dict.get("exc_info") is True:
+        event_dict["exc_info"] = sys.exc_info()
+    return event_dict
+
+
+_log_renderer: LogRenderer | None = None
+
+
+def _stop_log_renderer() -> None:
+    global _log_renderer
+    if _log_renderer is not None:
+        _log_renderer.stop()
+        _log_renderer = None
+
+
+atexit.register(_stop_log_renderer)
+
+
+def configure_logging(
+    level: int = logging.INFO, use_json: bool = False, buffered: bool = True
+) -> None:
+    """Configure structlog, rendering in a background thread if buffered"""
+    _stop_log_renderer()
+    # Same processor stack as the default, minus dev bits for JSON
+    processors: list[Processor] = [
+        structlog.contextvars.merge_contextvars,
+        structlog.processors.add_log_level,
+        structlog.processors.StackInfoRenderer(),
+    ]
+    if not use_json:
+        processors.append(structlog.dev.set_exc_info)
+    renderer: Processor = (
+        structlog.processors.JSONRenderer()
+        if use_json
+        else structlog.dev.ConsoleRenderer()
+    )
+
+    if not buffered:
+        structlog.configure(
+            processors=[
+                *processors,
+                structlog.processors.TimeStamper(fmt="iso", utc=True)
+                if use_json
+                else structlog.processors.TimeStamper(
+                    fmt="%Y-%m-%d %H:%M:%S", utc=False
+                ),
+                renderer,
+            ],
+            wrapper_class=structlog.make_filtering_bound_logger(level),
+            logger_factory=structlog.PrintLoggerFactory(),
+        )
+        return
+
+    global _log_renderer
+    _log_renderer = LogRenderer(
+        [
+            _format_timestamp_utc if use_json else _format_timestamp_local,
+            renderer,
+        ]
+    )
+    _log_renderer.start()
+    structlog.configure(
+        processors=[*processors, _add_timestamp, _capture_exc_info],
+        wrapper_class=structlog.make_filtering_bound_logger(level),
+        logger_factory=_log_renderer.logger_factory,
+    )
@@ -1,28 +1,42 @@
+"""Command line interface
+
+Commands import what they need when run rather than up front, so quick commands
+like list-disks don't pay for YAML parsing, SQLite or the sync machinery.
+"""
+
 import collections
+import contextlib
+import datetime
 import json
 import logging
+import os
 import sys
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Optional
 
 import rich
-import rich.traceback
 import structlog
 import typer
 import xdg_base_dirs
-from pydantic_yaml import parse_yaml_file_as, to_yaml_str
-from rich.progress import Progress
 
 import sync_camera_disk.disks
-from sync_camera_disk import macos
-from sync_camera_disk.config import Config, Destination, Source, SourceType, Sync
+from sync_camera_disk import linux, macos, profiling
+from sync_camera_disk.config import (
+    Config,
+    Destination,
+    IdentityCheck,
+    Source,
+    SourceType,
+    Sync,
+)
 
-from . import source
-from .destination import DatedFolderDestination
-from .filter_disks import filter_disks_to_syncs
-from .operation import OperationResult, OperationType, perform_operation
+from .copying import CopyBackend
+from .hashing import HashAlgorithm
+from .logs import configure_logging
+from .operation import OperationResult, OperationType
 
-app = typer.Typer()
+# Locals are only shown in tracebacks with --debug, see main()
+app = typer.Typer(pretty_exceptions_show_locals=False)
 
 LOG: structlog.stdlib.BoundLogger = structlog.get_logger()
 
@@ -31,6 +45,31 @@ LOG: structlog.stdlib.BoundLogger = structlog.get_logger()
 DEFAULT_CONFIG_PATH = (
     xdg_base_dirs.xdg_config_home() / "sync-camera-disk" / "config.yaml"
 )
+DEFAULT_HASH_CACHE_PATH = (
+    xdg_base_dirs.xdg_cache_home() / "sync-camera-disk" / "hashes.sqlite"
+)
+DEFAULT_MANIFEST_PATH = (
+    xdg_base_dirs.xdg_state_home() / "sync-camera-disk" / "manifest.sqlite"
+)
+DEFAULT_CONFIG_CACHE_PATH = (
+    xdg_base_dirs.xdg_cache_home() / "sync-camera-disk" / "config"
+)
+DEFAULT_RESULTS_PATH = (
+    xdg_base_dirs.xdg_state_home() / "sync-camera-disk" / "results.jsonl"
+)
+DEFAULT_PROFILE_PATH = xdg_base_dirs.xdg_state_home() / "sync-camera-disk" / "profiles"
+
+# Options shared by show-syncs, sync and watch
+ConfigCachePathOption = Annotated[
+    Path, typer.Option(help="Where to keep parsed configs")
+]
+UseConfigCacheOption = Annotated[
+    bool,
+    typer.Option(
+        "--config-cache/--no-config-cache",
+        help="Reuse the parsed config until the config file changes",
+    ),
+]
 
 
 @app.command()
@@ -39,6 +78,12 @@ def diskutil_list_physical_external_disks() -> None:
     rich.print_json(json.dumps(macos.diskutil_list_physical_external_disks()))
 
 
+@app.command()
+def linux_read_disks() -> None:
+    """Read procfs and sysfs to list disks and print them as JSON. Linux only."""
+    rich.print_json(linux.read_linux_disks().json())
+
+
 @app.command()
 def list_disks(
     input: Annotated[typer.FileBinaryRead, typer.Option()] | None = None,
@@ -65,6 +110,8 @@ def generate_config(
     Note that you still have to fill in details such as the disk type and
     destination paths.
     """
+    from pydantic_yaml import to_yaml_str
+
     sample_config = Config(syncs=[])
 
     raw_input = input.read() if input is not None else None
@@ -104,116 +151,521 @@ def show_syncs(
     config_path: Annotated[
         Path, typer.Argument(help="Path to probes.yml config")
     ] = DEFAULT_CONFIG_PATH,
+    config_cache_path: ConfigCachePathOption = DEFAULT_CONFIG_CACHE_PATH,
+    use_config_cache: UseConfigCacheOption = True,
 ) -> None:
     """Show which sync configurations will be used for detected disks"""
-    config = parse_yaml_file_as(Config, config_path)
-    LOG.debug("config", config=config)
+    from pydantic_yaml import to_yaml_str
+
+    from .config_cache import load_config
+    from .filter_disks import filter_disks_to_syncs
+
+    compiled = load_config(config_path, config_cache_path if use_config_cache else None)
+    LOG.debug("config", config=compiled.config)
 
     syncs = list(
-        filter_disks_to_syncs(config=config, disks=sync_camera_disk.disks.list_disks())
+        filter_disks_to_syncs(
+            config=compiled.config,
+            disks=sync_camera_disk.disks.list_disks(),
+            index=compiled.index,
+        )
     )
     for sync, source_disk in syncs:
         rich.print("\n".join(("---", to_yaml_str(source_disk), to_yaml_str(sync))))
 
 
+# Options shared by sync and watch
+ConfigPathArgument = Annotated[Path, typer.Argument(help="Path to config.yml config")]
+WorkersOption = Annotated[
+    int, typer.Option(min=1, help="Number of operations to run at once")
+]
+# typer doesn't understand X | None inside Annotated yet
+CopyBackendsOption = Annotated[
+    Optional[list[CopyBackend]],
+    typer.Option(
+        "--copy-backend",
+        help="Copy backends to try in order, defaults to all of them",
+    ),
+]
+ResumeOption = Annotated[
+    bool, typer.Option(help="Continue interrupted copies from .partial files")
+]
+DigestOption = Annotated[
+    Optional[HashAlgorithm],
+    typer.Option(help="Hash files while copying, disables kernel copy backends"),
+]
+IdentityCheckOption = Annotated[
+    Optional[IdentityCheck],
+    typer.Option(
+        help="Override how existing files are compared, see identity_check config"
+    ),
+]
+HashCachePathOption = Annotated[
+    Path, typer.Option(help="Where to remember file digests")
+]
+UseHashCacheOption = Annotated[bool, typer.Option("--hash-cache/--no-hash-cache")]
+ManifestPathOption = Annotated[
+    Path, typer.Option(help="Where to record imported files")
+]
+UseManifestOption = Annotated[
+    bool,
+    typer.Option(
+        "--manifest/--no-manifest",
+        help="Skip files already recorded as imported from the disk",
+    ),
+]
+StreamOption = Annotated[
+    bool,
+    typer.Option(
+        help="Start copying while the disk is still being listed, the progress"
+        " total grows as files are found"
+    ),
+]
+MetricsJsonOption = Annotated[
+    Optional[Path],
+    typer.Option(help="Write timing metrics as JSON here after each run"),
+]
+MetricsTextfileOption = Annotated[
+    Optional[Path],
+    typer.Option(
+        help="Write timing metrics here after each run in the Prometheus text"
+        " format, e.g. a .prom file in node-exporter's textfile directory"
+    ),
+]
+ResultsPathOption = Annotated[
+    Path,
+    typer.Option(
+        help="Where to log every operation result as JSON lines, see the report command"
+    ),
+]
+UseResultsOption = Annotated[bool, typer.Option("--results/--no-results")]
+
+
+def _log_failures(
+    counters: collections.Counter[str], failures: list[OperationResult]
+) -> None:
+    for failure in failures:
+        LOG.error("Failure", failure=failure)
+    if counters["failure"] > len(failures):
+        LOG.error(
+            "More failures not shown, see the report command",
+            count=counters["failure"] - len(failures),
+        )
+
+
 @app.command()
 def sync(
-    config_path: Annotated[
-        Path, typer.Argument(help="Path to config.yml config")
-    ] = DEFAULT_CONFIG_PATH,
+    config_path: ConfigPathArgument = DEFAULT_CONFIG_PATH,
     dry_run: bool = True,
     log_identical_operations: bool = True,
+    workers: WorkersOption = 4,
+    copy_backends: CopyBackendsOption = None,
+    resume: ResumeOption = True,
+    digest: DigestOption = None,
+    identity_check: IdentityCheckOption = None,
+    hash_cache_path: HashCachePathOption = DEFAULT_HASH_CACHE_PATH,
+    use_hash_cache: UseHashCacheOption = True,
+    manifest_path: ManifestPathOption = DEFAULT_MANIFEST_PATH,
+    use_manifest: UseManifestOption = True,
+    stream: StreamOption = True,
+    config_cache_path: ConfigCachePathOption = DEFAULT_CONFIG_CACHE_PATH,
+    use_config_cache: UseConfigCacheOption = True,
+    metrics_json: MetricsJsonOption = None,
+    metrics_textfile: MetricsTextfileOption = None,
+    results_path: ResultsPathOption = DEFAULT_RESULTS_PATH,
+    use_results: UseResultsOption = True,
+    plan_out: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="Only plan, writing the operations to this JSON lines file for"
+            " the apply command"
+        ),
+    ] = None,
 ) -> None:
     """Sync files from disks to configured destinations"""
-    config = parse_yaml_file_as(Config, config_path)
-    LOG.debug("config", config=config)
+    from .config_cache import load_config
+    from .filter_disks import filter_disks_to_syncs
+    from .hash_cache import HashCache
+    from .manifest import Manifest
+    from .metrics import Metrics, write_metrics
+    from .plan import write_plan
+    from .results import ResultLog
+    from .syncing import plan_syncs, run_syncs
 
-    counters: collections.Counter[str] = collections.Counter()
+    metrics = Metrics()
+    with (
+        metrics.time("phase_seconds", phase="load_config"),
+        profiling.phase("discovery"),
+    ):
+        compiled = load_config(
+            config_path, config_cache_path if use_config_cache else None
+        )
+    LOG.debug("config", config=compiled.config)
 
-    syncs = list(
-        filter_disks_to_syncs(config=config, disks=sync_camera_disk.disks.list_disks())
-    )
-    with Progress() as progress:
-        syncs_task = progress.add_task("Syncs", total=len(syncs))
-        failures: list[OperationResult] = []
-        for sync, source_disk in syncs:
-            assert sync.destination.path.is_dir()
-            destination = DatedFolderDestination(prefix=sync.destination.path)
-            file_sets = list(
-                source.enumerate_source_files(
-                    source=source_disk, source_type=sync.source.type
-                )
+    with (
+        metrics.time("phase_seconds", phase="list_disks"),
+        profiling.phase("discovery"),
+    ):
+        disks = list(sync_camera_disk.disks.list_disks())
+    with (
+        metrics.time("phase_seconds", phase="filter_disks"),
+        profiling.phase("discovery"),
+    ):
+        syncs = list(
+            filter_disks_to_syncs(
+                config=compiled.config, disks=disks, index=compiled.index
             )
-            operations_task = progress.add_task(
-                f"{source_disk.path} -> {sync.destination.path}",
-                total=sum(len(file_set.files) for file_set in file_sets),
-            )
-            for file_set in file_sets:
-                LOG.debug("file_set", file_set=file_set)
-                for operation in destination.generate_operations(file_set=file_set):
-                    counters[str(operation.operation)] += 1
-                    LOG.debug("operation", operation=operation)
-                    if (
-                        operation.operation == OperationType.identical
-                        and log_identical_operations
-                    ) or (operation.operation != OperationType.identical):
-                        LOG.info(
-                            operation.operation,
-                            type=sync.source.type,
-                            source=operation.source,
-                            destination=operation.destination,
-                        )
-                    result = perform_operation(operation, dry_run=dry_run)
-                    LOG.debug("operation result", result=result, success=result.success)
-                    if not result.success:
-                        LOG.error(
-                            "perform_operation error",
-                            result=result,
-                            success=result.success,
-                            exception=result.exception,
-                            error=result.error,
-                        )
-                        counters["failure"] += 1
-                        failures.append(result)
-                    else:
-                        counters["success"] += 1
-                    if dry_run:
-                        counters["dry_run"] += 1
-                    progress.update(operations_task, advance=1)
-            progress.update(syncs_task, advance=1)
+        )
+
+    with (
+        HashCache(hash_cache_path)
+        if use_hash_cache
+        else contextlib.nullcontext() as hash_cache,
+        Manifest(manifest_path)
+        if use_manifest
+        else contextlib.nullcontext() as manifest,
+        ResultLog(results_path) if use_results else contextlib.nullcontext() as results,
+    ):
+        if plan_out is not None:
+            counters: collections.Counter[str] = collections.Counter()
+            # Renamed once complete so apply never reads a partial plan
+            partial_plan = plan_out.with_name(f"{plan_out.name}.partial")
+            with partial_plan.open("w") as fp:
+                counters["planned"] = write_plan(
+                    plan_syncs(
+                        syncs,
+                        hash_cache=hash_cache,
+                        manifest=manifest,
+                        counters=counters,
+                        digest=digest,
+                        identity_check=identity_check,
+                        metrics=metrics,
+                    ),
+                    fp,
+                )
+            partial_plan.replace(plan_out)
+            LOG.info("Wrote plan", plan=plan_out, **counters)
+            write_metrics(metrics, metrics_json, metrics_textfile)
+            return
+        counters, failures = run_syncs(
+            syncs,
+            hash_cache=hash_cache,
+            manifest=manifest,
+            dry_run=dry_run,
+            log_identical_operations=log_identical_operations,
+            workers=workers,
+            copy_backends=copy_backends,
+            resume=resume,
+            digest=digest,
+            identity_check=identity_check,
+            stream=stream,
+            metrics=metrics,
+            results=results,
+        )
     LOG.info("counters", **counters)
+    write_metrics(metrics, metrics_json, metrics_textfile)
+
+    _log_failures(counters, failures)
+    if counters["failure"]:
+        raise typer.Exit(code=1)
 
-    for failure in failures:
-        LOG.error("Failure", failure=failure)
 
-    if failures:
+@app.command()
+def apply(
+    plan_path: Annotated[
+        typer.FileText,
+        typer.Argument(help="Plan written by sync --plan-out, - for stdin"),
+    ],
+    dry_run: bool = True,
+    workers: WorkersOption = 4,
+    copy_backends: CopyBackendsOption = None,
+    resume: ResumeOption = True,
+    digest: DigestOption = None,
+    hash_cache_path: HashCachePathOption = DEFAULT_HASH_CACHE_PATH,
+    use_hash_cache: UseHashCacheOption = True,
+    manifest_path: ManifestPathOption = DEFAULT_MANIFEST_PATH,
+    use_manifest: UseManifestOption = True,
+    operations: Annotated[
+        Optional[list[OperationType]],
+        typer.Option("--operation", help="Only apply operations of these types"),
+    ] = None,
+    volumes: Annotated[
+        Optional[list[str]],
+        typer.Option("--volume", help="Only apply operations from these volumes"),
+    ] = None,
+    shard_count: Annotated[
+        int, typer.Option(min=1, help="Split the plan between this many processes")
+    ] = 1,
+    shard_index: Annotated[
+        int, typer.Option(min=0, help="Which of the shard-count parts to apply")
+    ] = 0,
+    metrics_json: MetricsJsonOption = None,
+    metrics_textfile: MetricsTextfileOption = None,
+    results_path: ResultsPathOption = DEFAULT_RESULTS_PATH,
+    use_results: UseResultsOption = True,
+) -> None:
+    """Perform the operations in a plan written by sync --plan-out
+
+    The plan is read as it is applied. Run with a different --shard-index in
+    each of --shard-count processes to apply a plan in parallel.
+    """
+    from .hash_cache import HashCache
+    from .manifest import Manifest
+    from .metrics import Metrics, write_metrics
+    from .plan import read_plan
+    from .results import ResultLog
+    from .syncing import apply_plan
+
+    if shard_index >= shard_count:
+        raise typer.BadParameter(
+            f"must be less than --shard-count ({shard_count})",
+            param_hint="--shard-index",
+        )
+
+    metrics = Metrics()
+    with (
+        HashCache(hash_cache_path)
+        if use_hash_cache
+        else contextlib.nullcontext() as hash_cache,
+        Manifest(manifest_path)
+        if use_manifest
+        else contextlib.nullcontext() as manifest,
+        ResultLog(results_path) if use_results else contextlib.nullcontext() as results,
+    ):
+        counters, failures = apply_plan(
+            read_plan(
+                plan_path,
+                operations=operations,
+                volume_identifiers=volumes,
+                shard=(shard_index, shard_count) if shard_count > 1 else None,
+            ),
+            hash_cache=hash_cache,
+            manifest=manifest,
+            dry_run=dry_run,
+            workers=workers,
+            copy_backends=copy_backends,
+            resume=resume,
+            digest=digest,
+            metrics=metrics,
+            results=results,
+        )
+    LOG.info("counters", **counters)
+    write_metrics(metrics, metrics_json, metrics_textfile)
+
+    _log_failures(counters, failures)
+    if counters["failure"]:
         raise typer.Exit(code=1)
 
 
+@app.command()
+def watch(
+    config_path: ConfigPathArgument = DEFAULT_CONFIG_PATH,
+    dry_run: bool = True,
+    log_identical_operations: bool = True,
+    workers: WorkersOption = 4,
+    copy_backends: CopyBackendsOption = None,
+    resume: ResumeOption = True,
+    digest: DigestOption = None,
+    identity_check: IdentityCheckOption = None,
+    hash_cache_path: HashCachePathOption = DEFAULT_HASH_CACHE_PATH,
+    use_hash_cache: UseHashCacheOption = True,
+    manifest_path: ManifestPathOption = DEFAULT_MANIFEST_PATH,
+    use_manifest: UseManifestOption = True,
+    stream: StreamOption = True,
+    interval: Annotated[
+        float, typer.Option(min=0.1, help="Seconds between checks for new disks")
+    ] = 2.0,
+    config_cache_path: ConfigCachePathOption = DEFAULT_CONFIG_CACHE_PATH,
+    use_config_cache: UseConfigCacheOption = True,
+    metrics_json: MetricsJsonOption = None,
+    metrics_textfile: MetricsTextfileOption = None,
+    results_path: ResultsPathOption = DEFAULT_RESULTS_PATH,
+    use_results: UseResultsOption = True,
+) -> None:
+    """Sync disks as they are mounted, until interrupted
+
+    Disks already mounted are synced straight away. The config, hash cache and
+    manifest are kept open between syncs, the config is re-read if it changes.
+    Metrics add up over every run since starting.
+    """
+    from .config_cache import load_config
+    from .filter_disks import SyncIndex, filter_disks_to_syncs
+    from .hash_cache import HashCache
+    from .manifest import Manifest
+    from .metrics import Metrics, write_metrics
+    from .results import ResultLog
+    from .syncing import run_syncs
+    from .watch import watch_mounts
+
+    metrics = Metrics()
+    config_version: tuple[int, int] | None = None
+    config = Config(syncs=[])
+    index = SyncIndex(config)
+    # (identifier, path) of disks mounted at the last check
+    mounted: set[tuple[str, Path]] = set()
+    # (identifier, path) of disks whose sync failed, retried every interval
+    failed: set[tuple[str, Path]] = set()
+
+    with (
+        HashCache(hash_cache_path)
+        if use_hash_cache
+        else contextlib.nullcontext() as hash_cache,
+        Manifest(manifest_path)
+        if use_manifest
+        else contextlib.nullcontext() as manifest,
+        ResultLog(results_path) if use_results else contextlib.nullcontext() as results,
+    ):
+        for _ in watch_mounts(interval=interval, retry=lambda: bool(failed)):
+            config_stat = config_path.stat()
+            if (config_stat.st_size, config_stat.st_mtime_ns) != config_version:
+                with (
+                    metrics.time("phase_seconds", phase="load_config"),
+                    profiling.phase("discovery"),
+                ):
+                    compiled = load_config(
+                        config_path, config_cache_path if use_config_cache else None
+                    )
+                config, index = compiled.config, compiled.index
+                config_version = (config_stat.st_size, config_stat.st_mtime_ns)
+                LOG.info("Loaded config", config_path=config_path)
+                LOG.debug("config", config=config)
+
+            with (
+                metrics.time("phase_seconds", phase="list_disks"),
+                profiling.phase("discovery"),
+            ):
+                disks = list(sync_camera_disk.disks.list_disks())
+            new_disks = [
+                disk
+                for disk in disks
+                if (disk.unique_identifier, disk.path) not in mounted
+            ]
+            mounted = {(disk.unique_identifier, disk.path) for disk in disks}
+            failed = set()
+            with (
+                metrics.time("phase_seconds", phase="filter_disks"),
+                profiling.phase("discovery"),
+            ):
+                syncs = list(
+                    filter_disks_to_syncs(config=config, disks=new_disks, index=index)
+                )
+            if not syncs:
+                continue
+
+            LOG.info("Syncing", disks=[str(disk.path) for _, disk in syncs])
+            try:
+                counters, failures = run_syncs(
+                    syncs,
+                    hash_cache=hash_cache,
+                    manifest=manifest,
+                    dry_run=dry_run,
+                    log_identical_operations=log_identical_operations,
+                    workers=workers,
+                    copy_backends=copy_backends,
+                    resume=resume,
+                    digest=digest,
+                    identity_check=identity_check,
+                    stream=stream,
+                    metrics=metrics,
+                    results=results,
+                )
+            except Exception:
+                # e.g. the destination is offline, keep watching and retry these
+                # disks at the next check
+                LOG.exception(
+                    "Sync failed, retrying", disks=[str(disk.path) for _, disk in syncs]
+                )
+                failed = {(disk.unique_identifier, disk.path) for _, disk in syncs}
+                mounted -= failed
+                continue
+            LOG.info("counters", **counters)
+            write_metrics(metrics, metrics_json, metrics_textfile)
+            _log_failures(counters, failures)
+
+
+@app.command()
+def report(
+    paths: Annotated[
+        Optional[list[Path]],
+        typer.Argument(
+            help="Result logs to summarise, defaults to the results path and its"
+            " rotated logs"
+        ),
+    ] = None,
+    results_path: ResultsPathOption = DEFAULT_RESULTS_PATH,
+    use_json: Annotated[bool, typer.Option("--json", help="Print JSON")] = False,
+) -> None:
+    """Summarise the results logged by sync, apply and watch"""
+    from rich.table import Table
+
+    from .results import rotated_paths, summarise
+
+    summary = summarise(paths or rotated_paths(results_path))
+    if use_json:
+        rich.print_json(json.dumps(summary.to_json()))
+        return
+
+    outcomes = Table("Operation", "Outcome", "Count", title="Results")
+    for (operation, outcome), count in sorted(summary.outcomes.items()):
+        outcomes.add_row(operation, outcome, str(count))
+    rich.print(outcomes)
+
+    # Operations overlap, so this is the rate of each rather than overall
+    copied = f"Copied {summary.bytes_copied:,} bytes, operations took"
+    copied += f" {summary.seconds:.1f}s in total"
+    if summary.seconds:
+        rate = summary.bytes_copied / summary.seconds / 1024 / 1024
+        copied += f", {rate:.1f} MiB/s per operation"
+    rich.print(copied)
+    if summary.backends:
+        rich.print(
+            "Backends: "
+            + ", ".join(f"{b} {c}" for b, c in summary.backends.most_common())
+        )
+
+    if summary.errors:
+        errors = Table("Exception", "Count", "First error", title="Failures")
+        for exception, count in summary.errors.most_common():
+            errors.add_row(exception, str(count), summary.error_examples[exception])
+        rich.print(errors)
+
+
 @app.callback()
 def main(
+    ctx: typer.Context,
     verbose: bool = True,
     debug: bool = False,
     quiet: bool = False,
     use_json_logging: bool = False,
+    buffered_logging: Annotated[
+        bool,
+        typer.Option(
+            help="Render and print log lines in a background thread rather than"
+            " in the thread logging them"
+        ),
+    ] = True,
+    profile: Annotated[
+        bool,
+        typer.Option(
+            help="Profile discovery, enumeration, planning and execution, writing"
+            " pstats and collapsed stacks for flame graphs to a new folder in"
+            " --profile-path"
+        ),
+    ] = False,
+    profile_memory: Annotated[
+        bool,
+        typer.Option(help="Also write tracemalloc snapshots with --profile"),
+    ] = False,
+    profile_path: Annotated[
+        Path, typer.Option(help="Where to write --profile folders")
+    ] = DEFAULT_PROFILE_PATH,
 ) -> None:
-    rich.traceback.install(show_locals=True)
+    app.pretty_exceptions_show_locals = debug
     log_level = logging.INFO if verbose else logging.WARNING
     log_level = logging.DEBUG if debug else log_level
     log_level = logging.WARNING if quiet else log_level
-    if use_json_logging:
-        # Configure same processor stack as default, minus dev bits
-        structlog.configure(
-            processors=[
-                structlog.contextvars.merge_contextvars,
-                structlog.processors.add_log_level,
-                structlog.processors.StackInfoRenderer(),
-                structlog.processors.TimeStamper(fmt="iso", utc=True),
-                structlog.processors.JSONRenderer(),
-            ],
-            wrapper_class=structlog.make_filtering_bound_logger(log_level),
-        )
-    else:
-        structlog.configure(
-            wrapper_class=structlog.make_filtering_bound_logger(log_level),
-        )
+    configure_logging(log_level, use_json=use_json_logging, buffered=buffered_logging)
+    if profile:
+        name = f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        profiling.start(profile_path / name, memory=profile_memory)
+        ctx.call_on_close(profiling.stop)
@@ -0,0 +1,122 @@
+"""Record of files already imported from each disk
+
+Keyed on the disk's volume identifier and the file's path relative to the
+volume, along with the size and mtime it had when it was imported. A file still
+matching its entry is assumed to be safely at its destination and the
+destination isn't looked at again.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .hashing import HashAlgorithm
+
+# Commit after this many writes
+COMMIT_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS imports (
+    volume_identifier TEXT NOT NULL,
+    relative_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    destination TEXT NOT NULL,
+    digest_algorithm TEXT,
+    digest TEXT,
+    imported_at INTEGER NOT NULL,
+    PRIMARY KEY (volume_identifier, relative_path)
+) WITHOUT ROWID;
+"""
+
+
+class Manifest:
+    """SQLite backed import manifest, safe to share between threads
+
+    Entries for a volume are loaded in one query the first time the volume is
+    looked up, so checking thousands of already imported files is a dict lookup
+    each.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._volumes: dict[str, dict[str, tuple[int, int, str]]] = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self) -> "Manifest":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def _load_volume(self, volume_identifier: str) -> dict[str, tuple[int, int, str]]:
+        if volume_identifier not in self._volumes:
+            self._volumes[volume_identifier] = {
+                relative_path: (size, mtime_ns, destination)
+                for relative_path, size, mtime_ns, destination in self._db.execute(
+                    """
+                    SELECT relative_path, size, mtime_ns, destination FROM imports
+                    WHERE volume_identifier = ?
+                    """,
+                    (volume_identifier,),
+                )
+            }
+        return self._volumes[volume_identifier]
+
+    def is_imported(
+        self,
+        volume_identifier: str,
+        relative_path: Path,
+        size: int,
+        mtime_ns: int,
+        destination: Path,
+    ) -> bool:
+        """Has this version of the file already been imported to destination?"""
+        with self._lock:
+            entries = self._load_volume(volume_identifier)
+        return entries.get(str(relative_path)) == (size, mtime_ns, str(destination))
+
+    def record(
+        self,
+        volume_identifier: str,
+        relative_path: Path,
+        size: int,
+        mtime_ns: int,
+        destination: Path,
+        digest_algorithm: HashAlgorithm | None = None,
+        digest: str | None = None,
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO imports VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    volume_identifier,
+                    str(relative_path),
+                    size,
+                    mtime_ns,
+                    str(destination),
+                    digest_algorithm,
+                    digest,
+                    time.time_ns(),
+                ),
+            )
+            if volume_identifier in self._volumes:
+                self._volumes[volume_identifier][str(relative_path)] = (
+                    size,
+                    mtime_ns,
+                    str(destination),
+                )
+            self._writes += 1
+            if self._writes % COMMIT_EVERY == 0:
+                self._db.commit()
@@ -0,0 +1,170 @@
+"""Timing and size histograms for each phase of a sync
+
+Shows where the time in a slow sync went: finding disks, matching them to
+syncs, listing files, planning operations or copying. Metrics can be written
+as JSON or in the Prometheus text format for node-exporter's textfile
+collector.
+"""
+
+import bisect
+import contextlib
+import dataclasses
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Generator, Iterable, TypeVar
+
+PREFIX = "sync_camera_disk_"
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+# 1KiB to 16GiB in powers of 4
+BYTES_BUCKETS = tuple(1024 * 4**i for i in range(13))
+
+# name -> (help, buckets)
+HISTOGRAMS: dict[str, tuple[str, tuple[float, ...]]] = {
+    "phase_seconds": (
+        "Time spent in each phase, per run for load_config, list_disks and"
+        " filter_disks, per file set for enumerate and per file for plan",
+        SECONDS_BUCKETS,
+    ),
+    "operation_seconds": ("Time to perform each operation", SECONDS_BUCKETS),
+    "operation_bytes": ("Bytes copied by each operation", BYTES_BUCKETS),
+}
+
+T = TypeVar("T")
+
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclasses.dataclass(slots=True)
+class Histogram:
+    buckets: tuple[float, ...]
+    # Per bucket, the last is for values above every bucket
+    counts: list[int]
+    count: int = 0
+    sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """(le, count) pairs as Prometheus reports them"""
+        bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+        total = 0
+        result = []
+        for bound, count in zip(bounds, self.counts, strict=True):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """Histograms keyed on name and labels, safe to share between threads"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                buckets = HISTOGRAMS[name][1]
+                histogram = Histogram(buckets=buckets, counts=[0] * (len(buckets) + 1))
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def time(self, name: str, **labels: str) -> Generator[None, None, None]:
+        """Observe how long the with block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(
+        self, items: Iterable[T], name: str, **labels: str
+    ) -> Generator[T, None, None]:
+        """Yield items, observing how long each one takes to produce"""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(name, time.perf_counter() - start, **labels)
+            yield item
+
+    def _sorted(self) -> list[tuple[str, Labels, Histogram]]:
+        with self._lock:
+            return [
+                (
+                    name,
+                    labels,
+                    dataclasses.replace(histogram, counts=[*histogram.counts]),
+                )
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+
+    def to_json(self) -> dict[str, list[dict[str, Any]]]:
+        result: dict[str, list[dict[str, Any]]] = {}
+        for name, labels, histogram in self._sorted():
+            result.setdefault(PREFIX + name, []).append(
+                {
+                    "labels": dict(labels),
+                    "buckets": dict(histogram.cumulative()),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                }
+            )
+        return result
+
+    def to_prometheus(self) -> str:
+        lines = []
+        previous = None
+        for name, labels, histogram in self._sorted():
+            full_name = PREFIX + name
+            if name != previous:
+                lines.append(f"# HELP {full_name} {HISTOGRAMS[name][0]}")
+                lines.append(f"# TYPE {full_name} histogram")
+                previous = name
+            for le, count in histogram.cumulative():
+                bucket_labels = _format_labels((*labels, ("le", le)))
+                lines.append(f"{full_name}_bucket{bucket_labels} {count}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.sum!r}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+        return "".join(f"{line}\n" for line in lines)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    # node-exporter may read the file at any moment, so write then rename
+    temporary_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temporary_path.write_text(text)
+    os.replace(temporary_path, path)
+
+
+def write_metrics(
+    metrics: Metrics, json_path: Path | None = None, textfile_path: Path | None = None
+) -> None:
+    """Write metrics as JSON and/or a Prometheus textfile"""
+    if json_path is not None:
+        _write_atomic(json_path, json.dumps(metrics.to_json(), indent=2) + "\n")
+    if textfile_path is not None:
+        _write_atomic(textfile_path, metrics.to_prometheus())
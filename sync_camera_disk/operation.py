@@ -1,9 +1,12 @@
+import dataclasses
 import enum
 import shutil
+import time
 from pathlib import Path
 from typing import Callable
 
-from pydantic import BaseModel
+from .copying import CopyBackend, CopyResult, ProgressCallback, copy_file
+from .hashing import HashAlgorithm
 
 
 class OperationType(enum.StrEnum):
@@ -13,18 +16,31 @@ class OperationType(enum.StrEnum):
     unknown = "unknown"
 
 
-class Operation(BaseModel):
+# Operations and results are created for every file so are slotted dataclasses
+@dataclasses.dataclass(slots=True)
+class Operation:
     operation: OperationType
     source: Path
     destination: Path
+    # For identical operations, the full digest both files were found to have
+    digest_algorithm: HashAlgorithm | None = None
+    digest: str | None = None
 
 
-class OperationResult(BaseModel):
+@dataclasses.dataclass(slots=True)
+class OperationResult:
     operation: Operation
     success: bool
-    exception: str | None
-    error: str | None
     dry_run: bool
+    exception: str | None = None
+    error: str | None = None
+    backend: CopyBackend | None = None
+    bytes_copied: int | None = None
+    resumed_from: int | None = None
+    digest_algorithm: HashAlgorithm | None = None
+    digest: str | None = None
+    # Time taken to perform the operation
+    seconds: float | None = dataclasses.field(default=None, compare=False)
 
 
 def mkdir(path: Path) -> None:
@@ -35,15 +51,32 @@ def perform_operation(
     operation: Operation,
     dry_run: bool = True,
     mkdir: Callable[[Path], None] = mkdir,
-    copy: Callable[[str | Path, str | Path], None] = shutil.copy2,
+    copy: Callable[..., CopyResult | None] = copy_file,
     copystat: Callable[[str | Path, str | Path], None] = shutil.copystat,
+    progress: ProgressCallback | None = None,
 ) -> OperationResult:
+    """Perform an operation, catching any errors into the result
+
+    progress is passed on to copy to report bytes copied as it goes, copy
+    functions which don't support it can still be used when it isn't given.
+    """
+    copy_result: CopyResult | None = None
+    start = time.perf_counter()
     try:
         match operation.operation:
             case OperationType.copy:
                 if not dry_run:
                     mkdir(operation.destination.parent)
-                    copy(operation.source, operation.destination)
+                    copied = (
+                        copy(operation.source, operation.destination)
+                        if progress is None
+                        else copy(
+                            operation.source, operation.destination, progress=progress
+                        )
+                    )
+                    # Plain shutil style copy functions return the destination
+                    if isinstance(copied, CopyResult):
+                        copy_result = copied
             case OperationType.identical:
                 pass
             case OperationType.copy_stat:
@@ -58,5 +91,19 @@ def perform_operation(
             exception=e.__class__.__name__,
             error=str(e),
             dry_run=dry_run,
+            seconds=time.perf_counter() - start,
         )
-    return OperationResult(operation=operation, success=True, dry_run=dry_run)
+    return OperationResult(
+        operation=operation,
+        success=True,
+        dry_run=dry_run,
+        seconds=time.perf_counter() - start,
+        **(
+            dataclasses.asdict(copy_result)
+            if copy_result is not None
+            else {
+                "digest_algorithm": operation.digest_algorithm,
+                "digest": operation.digest,
+            }
+        ),
+    )
@@ -0,0 +1,69 @@
+"""Connect the stages of a sync with bounded queues
+
+Enumerating a card, planning operations and copying all overlap: the
+enumeration runs in a background thread and hands FileSets over through a
+bounded queue, so copying starts as soon as the first folder has been listed
+and memory stays flat however large the card is.
+"""
+
+import queue
+import threading
+from typing import Generator, Iterable, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, exception: BaseException) -> None:
+        self.exception = exception
+
+
+def prefetch(items: Iterable[T], maxsize: int = 64) -> Generator[T, None, None]:
+    """Iterate over items in a background thread, at most maxsize ahead
+
+    Exceptions raised by items are re-raised in the consumer. If the consumer
+    stops early the background thread is told to stop at its next item.
+    """
+    pending: queue.Queue[object] = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failed(e))
+        else:
+            put(_DONE)
+        finally:
+            # Let generators clean up (e.g. close scandir handles) straight away
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.exception
+            yield item  # type: ignore[misc]
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,121 @@
+"""Plans of operations written to and read from JSON lines files
+
+sync --plan-out writes one PlannedOperation per line as disks are planned, and
+apply reads them back one line at a time, so neither ever holds a whole plan
+in memory. Each line carries what is needed to schedule and record the
+operation without the config, so a plan made on one host can be applied on
+another with the disk mounted at the same path.
+"""
+
+import dataclasses
+import json
+import zlib
+from pathlib import Path
+from typing import Any, Collection, Generator, Iterable, TextIO
+
+from .hashing import HashAlgorithm
+from .operation import Operation, OperationType
+
+
+@dataclasses.dataclass(slots=True)
+class PlannedOperation:
+    operation: Operation
+    volume_identifier: str
+    volume_path: Path
+    # Of the source when planned
+    size: int
+    mtime_ns: int
+    max_readers: int
+    # The configured destination, operations writing under the same one share
+    # its writer slots
+    destination_root: Path
+    max_writers: int
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "operation": self.operation.operation,
+                "source": str(self.operation.source),
+                "destination": str(self.operation.destination),
+                "digest_algorithm": self.operation.digest_algorithm,
+                "digest": self.operation.digest,
+                "volume_identifier": self.volume_identifier,
+                "volume_path": str(self.volume_path),
+                "size": self.size,
+                "mtime_ns": self.mtime_ns,
+                "max_readers": self.max_readers,
+                "destination_root": str(self.destination_root),
+                "max_writers": self.max_writers,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, line: str) -> "PlannedOperation":
+        data: dict[str, Any] = json.loads(line)
+        return cls(
+            operation=Operation(
+                operation=OperationType(data["operation"]),
+                source=Path(data["source"]),
+                destination=Path(data["destination"]),
+                # Not in plans from older versions
+                digest_algorithm=(
+                    HashAlgorithm(data["digest_algorithm"])
+                    if data.get("digest_algorithm")
+                    else None
+                ),
+                digest=data.get("digest"),
+            ),
+            volume_identifier=data["volume_identifier"],
+            volume_path=Path(data["volume_path"]),
+            size=data["size"],
+            mtime_ns=data["mtime_ns"],
+            max_readers=data["max_readers"],
+            destination_root=Path(data["destination_root"]),
+            max_writers=data["max_writers"],
+        )
+
+
+def write_plan(planned: Iterable[PlannedOperation], fp: TextIO) -> int:
+    """Write planned operations as JSON lines, returning how many"""
+    count = 0
+    for planned_operation in planned:
+        fp.write(planned_operation.to_json())
+        fp.write("\n")
+        count += 1
+    return count
+
+
+def in_shard(planned_operation: PlannedOperation, index: int, count: int) -> bool:
+    """Whether the operation belongs to shard index of count
+
+    Shards by source path so the same plan always splits the same way.
+    """
+    source = str(planned_operation.operation.source).encode()
+    return zlib.crc32(source) % count == index
+
+
+def read_plan(
+    fp: TextIO,
+    operations: Collection[OperationType] | None = None,
+    volume_identifiers: Collection[str] | None = None,
+    shard: tuple[int, int] | None = None,
+) -> Generator[PlannedOperation, None, None]:
+    """Read planned operations from JSON lines, one line at a time
+
+    Only operations of the given types, from the given volumes and in shard
+    (index, count) are yielded, if given.
+    """
+    for line in fp:
+        if not line.strip():
+            continue
+        planned_operation = PlannedOperation.from_json(line)
+        if operations and planned_operation.operation.operation not in operations:
+            continue
+        if (
+            volume_identifiers
+            and planned_operation.volume_identifier not in volume_identifiers
+        ):
+            continue
+        if shard is not None and not in_shard(planned_operation, *shard):
+            continue
+        yield planned_operation
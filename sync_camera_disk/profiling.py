@@ -0,0 +1,264 @@
+"""Per phase profiling for --profile
+
+A sync is split into phases: discovery (loading the config and finding and
+matching disks), enumeration (listing cards), planning (comparing files with
+their destinations) and execution (copying). Code in each phase runs under
+phase() or profiled(), which do nothing unless start() was called.
+
+While profiling each phase gets:
+
+- <phase>.pstats: a cProfile profile, merged from every thread which ran
+  the phase. Open it with pstats or snakeviz.
+- <phase>.collapsed: stacks sampled every few milliseconds from threads in
+  the phase, in the folded format flamegraph.pl, inferno and speedscope read.
+  Samples include time spent waiting on the disk, which cProfile only shows as
+  time in the call which blocked.
+- <phase>.tracemalloc: with memory, a tracemalloc snapshot taken when the
+  phase's traced memory was highest, load it with tracemalloc.Snapshot.load.
+
+Phases run at the same time in different threads, enumeration, planning and
+execution of one card overlap, so memory snapshots include allocations from
+other phases. From Python 3.12 cProfile can only be enabled in one thread at a
+time, sections which start while another thread is profiled are skipped and
+only show up in the sampled stacks.
+"""
+
+import collections
+import contextlib
+import dataclasses
+import sys
+import threading
+from pathlib import Path
+from types import FrameType
+from typing import TYPE_CHECKING, Generator, Iterable, TypeVar
+
+import structlog
+
+if TYPE_CHECKING:
+    import cProfile
+
+LOG: structlog.stdlib.BoundLogger = structlog.get_logger()
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+# Frames kept per tracemalloc trace
+MEMORY_FRAMES = 25
+# Take a new memory snapshot once a phase's traced memory grows by this much
+MEMORY_GROWTH = 1.1
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass(slots=True)
+class _ThreadState:
+    # Phases entered in this thread, innermost last
+    phases: list[str] = dataclasses.field(default_factory=list)
+    # phase -> this thread's profile of it
+    profiles: "dict[str, cProfile.Profile]" = dataclasses.field(default_factory=dict)
+    # Profile currently enabled in this thread
+    enabled: "cProfile.Profile | None" = None
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(
+        ";", ":"
+    )
+
+
+def _fold(frame: FrameType | None) -> str:
+    """Frame and its callers as root;...;leaf"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profiler:
+    """Profiles each phase in every thread, writing the results to output_dir"""
+
+    def __init__(
+        self,
+        output_dir: Path,
+        memory: bool = False,
+        sample_interval: float = SAMPLE_INTERVAL,
+    ) -> None:
+        self.output_dir = output_dir
+        self.memory = memory
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles: list[tuple[str, cProfile.Profile]] = []
+        self._skipped: collections.Counter[str] = collections.Counter()
+        # thread ident -> phase it is in, read by the sampler
+        self._thread_phases: dict[int, str] = {}
+        self._stacks: dict[str, collections.Counter[str]] = {}
+        self._memory_peaks: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(
+            target=self._sample, name="sync-camera-disk-profile", daemon=True
+        )
+
+    def start(self) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.memory:
+            import tracemalloc
+
+            tracemalloc.start(MEMORY_FRAMES)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """Stop sampling and write out every phase"""
+        self._stop.set()
+        self._sampler.join()
+        self.write()
+        if self.memory:
+            import tracemalloc
+
+            tracemalloc.stop()
+
+    def _thread_state(self) -> _ThreadState:
+        state: _ThreadState | None = getattr(self._local, "state", None)
+        if state is None:
+            state = self._local.state = _ThreadState()
+        return state
+
+    def _enable(self, state: _ThreadState, phase: str) -> None:
+        import cProfile
+
+        profile = state.profiles.get(phase)
+        if profile is None:
+            profile = state.profiles[phase] = cProfile.Profile()
+            with self._lock:
+                self._profiles.append((phase, profile))
+        try:
+            profile.enable()
+        except ValueError:
+            # Another thread is being profiled, see the module docstring
+            with self._lock:
+                self._skipped[phase] += 1
+            return
+        state.enabled = profile
+
+    def _disable(self, state: _ThreadState) -> None:
+        if state.enabled is not None:
+            state.enabled.disable()
+            state.enabled = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Generator[None, None, None]:
+        """Profile the with block as part of phase name"""
+        state = self._thread_state()
+        ident = threading.get_ident()
+        self._disable(state)
+        state.phases.append(name)
+        self._thread_phases[ident] = name
+        self._enable(state, name)
+        try:
+            yield
+        finally:
+            self._disable(state)
+            state.phases.pop()
+            if state.phases:
+                self._thread_phases[ident] = state.phases[-1]
+                self._enable(state, state.phases[-1])
+            else:
+                del self._thread_phases[ident]
+            if self.memory:
+                self._snapshot_memory(name)
+
+    def _snapshot_memory(self, phase: str) -> None:
+        import tracemalloc
+
+        current, _ = tracemalloc.get_traced_memory()
+        with self._lock:
+            if current <= self._memory_peaks.get(phase, 0) * MEMORY_GROWTH:
+                return
+            self._memory_peaks[phase] = current
+            tracemalloc.take_snapshot().dump(
+                str(self.output_dir / f"{phase}.tracemalloc")
+            )
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.sample_interval):
+            frames = sys._current_frames()
+            for ident, phase in list(self._thread_phases.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks = self._stacks.setdefault(phase, collections.Counter())
+                    stacks[_fold(frame)] += 1
+            del frames
+
+    def write(self) -> None:
+        import pstats
+
+        with self._lock:
+            profiles = list(self._profiles)
+            skipped = dict(self._skipped)
+        by_phase: dict[str, list[cProfile.Profile]] = {}
+        for phase, profile in profiles:
+            by_phase.setdefault(phase, []).append(profile)
+        for phase, phase_profiles in by_phase.items():
+            # Profiles with no calls can't be loaded by pstats
+            for profile in phase_profiles:
+                profile.create_stats()
+            loaded = [
+                profile for profile in phase_profiles if getattr(profile, "stats", None)
+            ]
+            if loaded:
+                stats = pstats.Stats(loaded[0])
+                for profile in loaded[1:]:
+                    stats.add(profile)
+                stats.dump_stats(self.output_dir / f"{phase}.pstats")
+        for phase, stacks in self._stacks.items():
+            with (self.output_dir / f"{phase}.collapsed").open("w") as fp:
+                for stack, count in stacks.most_common():
+                    fp.write(f"{stack} {count}\n")
+        LOG.info("Wrote profiles", path=self.output_dir, skipped=skipped)
+
+
+_profiler: Profiler | None = None
+
+
+def start(output_dir: Path, memory: bool = False) -> Profiler:
+    """Start profiling phases until stop() is called"""
+    global _profiler
+    stop()
+    _profiler = Profiler(output_dir, memory=memory)
+    _profiler.start()
+    return _profiler
+
+
+def stop() -> None:
+    global _profiler
+    if _profiler is not None:
+        _profiler.stop()
+        _profiler = None
+
+
+def phase(name: str) -> contextlib.AbstractContextManager[None]:
+    """Profile the with block as part of phase name, if profiling"""
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.phase(name)
+
+
+def profiled(items: Iterable[T], name: str) -> Iterable[T]:
+    """Yield items, profiling producing each one as part of phase name"""
+    if _profiler is None:
+        return items
+    return _profiled(_profiler, items, name)
+
+
+def _profiled(
+    profiler: Profiler, items: Iterable[T], name: str
+) -> Generator[T, None, None]:
+    iterator = iter(items)
+    while True:
+        with profiler.phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,72 @@
+"""Byte based progress bars with throughput and time remaining
+
+Copies report every chunk they write, across several workers, so updates are
+batched per operation and only passed on to rich every so often. rich itself
+redraws at a fixed rate however often tasks are updated.
+"""
+
+import time
+from typing import Callable, Sequence
+
+from rich.progress import (
+    BarColumn,
+    DownloadColumn,
+    Progress,
+    TaskID,
+    TextColumn,
+    TimeRemainingColumn,
+    TransferSpeedColumn,
+)
+
+REFRESH_PER_SECOND = 4
+
+# Minimum seconds between updates from one operation
+UPDATE_INTERVAL = 0.25
+
+
+def byte_progress() -> Progress:
+    """Progress display for tasks counted in bytes"""
+    return Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+        TimeRemainingColumn(),
+        refresh_per_second=REFRESH_PER_SECOND,
+    )
+
+
+class ByteProgress:
+    """Advances progress tasks by bytes copied, in batches
+
+    Use one per operation, it isn't thread safe. Call flush once the operation
+    is done to pass on anything held back.
+    """
+
+    __slots__ = ("progress", "tasks", "interval", "clock", "_pending", "_last")
+
+    def __init__(
+        self,
+        progress: Progress,
+        tasks: Sequence[TaskID],
+        interval: float = UPDATE_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.progress = progress
+        self.tasks = tasks
+        self.interval = interval
+        self.clock = clock
+        self._pending = 0
+        self._last = clock()
+
+    def __call__(self, n: int) -> None:
+        self._pending += n
+        if self.clock() - self._last >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            for task in self.tasks:
+                self.progress.update(task, advance=self._pending)
+            self._pending = 0
+        self._last = self.clock()
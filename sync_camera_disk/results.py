@@ -0,0 +1,290 @@
+"""Log of every operation result as JSON lines
+
+Each result is appended as it comes in, with its timing, bytes copied, backend
+and digest. Once the log passes max_bytes it is rotated to results.jsonl.1,
+.2 and so on, keeping a fixed number of old logs, so it never grows without
+bound. summarise() reads logs in one pass without keeping lines around, so
+reports stay quick and small even for millions of results.
+
+Several processes can share one log, e.g. apply --shard-index. Lines are
+appended in whole line writes, and rotation happens under a lock on
+results.jsonl.lock, so a log another process has just rotated is reopened
+rather than rotated again.
+"""
+
+import collections
+import concurrent.futures
+import dataclasses
+import fcntl
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, Sequence
+
+from .operation import OperationResult
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# Flush at least this often, in seconds, rather than after every line
+FLUSH_INTERVAL = 1.0
+# Or once this many bytes are waiting
+FLUSH_BYTES = 64 * 1024
+
+
+def rotated_paths(path: Path, backups: int = DEFAULT_BACKUPS) -> list[Path]:
+    """path and its rotated logs which exist, oldest first"""
+    paths = [path.with_name(f"{path.name}.{i}") for i in range(backups, 0, -1)]
+    return [p for p in [*paths, path] if p.is_file()]
+
+
+class ResultLog:
+    """Appends results to a rotating JSON lines file, safe to share between threads
+
+    The file is only created once the first result is recorded.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backups: int = DEFAULT_BACKUPS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._fp: IO[bytes] | None = None
+        # Of the log, including lines not yet written
+        self._size = 0
+        self._pending: list[bytes] = []
+        self._pending_size = 0
+        self._last_flush = 0.0
+
+    def __enter__(self) -> "ResultLog":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fp is not None:
+                self._flush()
+                self._fp.close()
+                self._fp = None
+
+    def _open(self) -> IO[bytes]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Unbuffered so each flush is a single append of whole lines
+        fp = self.path.open("ab", buffering=0)
+        self._size = os.fstat(fp.fileno()).st_size + self._pending_size
+        return fp
+
+    def _rotated_elsewhere(self) -> bool:
+        """Has another process rotated the log since it was opened?"""
+        assert self._fp is not None
+        try:
+            current = self.path.stat().st_ino
+        except FileNotFoundError:
+            return True
+        return current != os.fstat(self._fp.fileno()).st_ino
+
+    def _reopen(self) -> None:
+        assert self._fp is not None
+        self._fp.close()
+        self._fp = self._open()
+
+    def _flush(self) -> None:
+        assert self._fp is not None
+        if self._rotated_elsewhere():
+            self._reopen()
+        if self._pending:
+            self._fp.write(b"".join(self._pending))
+            self._pending.clear()
+            self._pending_size = 0
+        # Picks up lines written by other processes
+        self._size = os.fstat(self._fp.fileno()).st_size
+
+    def _rotate(self) -> None:
+        assert self._fp is not None
+        with self.path.with_name(f"{self.path.name}.lock").open("a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            if self._rotated_elsewhere():
+                self._reopen()
+                return
+            self._fp.close()
+            for i in range(self.backups - 1, 0, -1):
+                older = self.path.with_name(f"{self.path.name}.{i}")
+                if older.exists():
+                    older.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+            if self.backups:
+                self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+            else:
+                self.path.unlink()
+            self._fp = self._open()
+
+    def record(self, result: OperationResult) -> None:
+        now = self.clock()
+        line = (
+            json.dumps(
+                {
+                    "time": now,
+                    "operation": result.operation.operation,
+                    "source": str(result.operation.source),
+                    "destination": str(result.operation.destination),
+                    "success": result.success,
+                    "dry_run": result.dry_run,
+                    "seconds": result.seconds,
+                    "bytes_copied": result.bytes_copied,
+                    "resumed_from": result.resumed_from,
+                    "backend": result.backend,
+                    "digest_algorithm": result.digest_algorithm,
+                    "digest": result.digest,
+                    "exception": result.exception,
+                    "error": result.error,
+                }
+            )
+            + "\n"
+        ).encode()
+        with self._lock:
+            if self._fp is None:
+                self._fp = self._open()
+            elif self._size and self._size + len(line) > self.max_bytes:
+                # Another process may have rotated it already
+                self._flush()
+                if self._size and self._size + len(line) > self.max_bytes:
+                    self._rotate()
+            self._pending.append(line)
+            self._pending_size += len(line)
+            self._size += len(line)
+            if (
+                now - self._last_flush >= FLUSH_INTERVAL
+                or self._pending_size >= FLUSH_BYTES
+            ):
+                self._flush()
+                self._last_flush = now
+
+
+@dataclasses.dataclass(slots=True)
+class Summary:
+    results: int = 0
+    # (operation, outcome) -> count, outcome is success, failure or dry_run
+    outcomes: collections.Counter[tuple[str, str]] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    bytes_copied: int = 0
+    # Sum of the time taken by each operation, more than the elapsed time when
+    # operations run at once
+    seconds: float = 0.0
+    backends: collections.Counter[str] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    # Exception name -> count, and the first error seen for each
+    errors: collections.Counter[str] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    error_examples: dict[str, str] = dataclasses.field(default_factory=dict)
+    first_time: float | None = None
+    last_time: float | None = None
+
+    def add(self, result: dict[str, Any]) -> None:
+        self.results += 1
+        if result["dry_run"]:
+            outcome = "dry_run"
+        elif result["success"]:
+            outcome = "success"
+        else:
+            outcome = "failure"
+        self.outcomes[(result["operation"], outcome)] += 1
+        self.bytes_copied += result["bytes_copied"] or 0
+        self.seconds += result["seconds"] or 0.0
+        if result["backend"] is not None:
+            self.backends[result["backend"]] += 1
+        if not result["success"]:
+            exception = result["exception"] or "unknown"
+            self.errors[exception] += 1
+            self.error_examples.setdefault(exception, result["error"] or "")
+        if self.first_time is None:
+            self.first_time = result["time"]
+        self.last_time = result["time"]
+
+    @property
+    def failures(self) -> int:
+        return sum(
+            count
+            for (_, outcome), count in self.outcomes.items()
+            if outcome == "failure"
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "results": self.results,
+            "failures": self.failures,
+            "outcomes": [
+                {"operation": operation, "outcome": outcome, "count": count}
+                for (operation, outcome), count in sorted(self.outcomes.items())
+            ],
+            "bytes_copied": self.bytes_copied,
+            "seconds": self.seconds,
+            "backends": dict(self.backends),
+            "errors": [
+                {
+                    "exception": exception,
+                    "count": count,
+                    "example": self.error_examples[exception],
+                }
+                for exception, count in self.errors.most_common()
+            ],
+            "first_time": self.first_time,
+            "last_time": self.last_time,
+        }
+
+    def merge(self, other: "Summary") -> None:
+        """Add other, a summary of later results, to this one"""
+        self.results += other.results
+        self.outcomes.update(other.outcomes)
+        self.bytes_copied += other.bytes_copied
+        self.seconds += other.seconds
+        self.backends.update(other.backends)
+        self.errors.update(other.errors)
+        for exception, error in other.error_examples.items():
+            self.error_examples.setdefault(exception, error)
+        if self.first_time is None:
+            self.first_time = other.first_time
+        if other.last_time is not None:
+            self.last_time = other.last_time
+
+
+def summarise_file(path: Path) -> Summary:
+    """Summarise one result log, read one line at a time"""
+    summary = Summary()
+    loads = json.loads
+    with path.open() as fp:
+        for line in fp:
+            if line.strip():
+                summary.add(loads(line))
+    return summary
+
+
+def summarise(paths: Sequence[Path], workers: int | None = None) -> Summary:
+    """Summarise result logs, oldest first
+
+    Decoding JSON takes nearly all the time, so each log is summarised in a
+    separate process and the summaries merged. Rotation keeps each log to a
+    bounded size so this scales with the number of logs.
+    """
+    summary = Summary()
+    if len(paths) <= 1 or workers == 1:
+        summaries: Iterable[Summary] = map(summarise_file, paths)
+        for file_summary in summaries:
+            summary.merge(file_summary)
+        return summary
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_summary in executor.map(summarise_file, paths):
+            summary.merge(file_summary)
+    return summary
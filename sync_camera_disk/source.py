@@ -1,6 +1,22 @@
-import itertools
-from typing import Iterable
+"""Enumerate files on a disk grouped into FileSets
 
+Each SourceType is described by a list of SourceRules. A rule is a set of glob
+style patterns (relative to the volume, "*" matches within a path component and
+"**" matches any number of directories) plus how to group matching files into
+FileSets. The volume is walked once with os.scandir, only descending into
+directories some pattern could match, and every file is checked against every
+rule for the source type.
+
+New cameras should only need a new entry in SOURCE_RULES.
+"""
+
+import collections
+import fnmatch
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Sequence
+
+import pydantic
 import structlog
 
 from .config import SourceType
@@ -10,266 +26,266 @@ from .file import File, FileSet
 LOG: structlog.stdlib.BoundLogger = structlog.get_logger()
 
 
+def group_by_stem(path: Path) -> tuple[str, Path]:
+    """DCIM/100MEDIA/DJI_0027.MP4 -> DJI_0027"""
+    return path.stem, path.parent
+
+
+def group_by_parent(path: Path) -> tuple[str, Path]:
+    """DCIM/PANORAMA/100_0018/DJI_0001.JPG -> 100_0018"""
+    return path.parent.name, path.parent
+
+
+def group_by_top_folder(path: Path) -> tuple[str, Path]:
+    """PyLadies/Video ISO Files/PyLadies CAM 1 01.mp4 -> PyLadies"""
+    top = Path(path.parts[0])
+    return top.stem, top
+
+
+def group_by_gopro_file_number(path: Path) -> tuple[str, Path]:
+    """GFXXYYYY.ext F = Format, XX = chapter/counter/loop, YYYY = file serial"""
+    return path.stem[-4:], path.parent
+
+
+def group_by_sony_clip(path: Path) -> tuple[str, Path]:
+    """M4ROOT/CLIP/C0109M01.XML -> C0109, M4ROOT/CLIP/C0109.MP4 -> C0109"""
+    if path.suffix.lower() == ".xml" and path.stem.lower().endswith("m01"):
+        return path.stem[:-3], path.parent  # drop M01 portion
+    return path.stem, path.parent
+
+
+class SourceRule(pydantic.BaseModel):
+    """Files matching any of patterns are grouped into FileSets by group
+
+    group returns the FileSet stem and prefix for a path relative to the volume.
+    The prefix must be a folder containing the path, the FileSet is complete
+    once that folder has been walked. Files with names matching any of ignore
+    are skipped. If require is set only FileSets with at least one file
+    matching it are kept.
+    """
+
+    patterns: list[str]
+    group: Callable[[Path], tuple[str, Path]] = group_by_stem
+    ignore: list[str] = []
+    require: str | None = None
+
+
+SOURCE_RULES: dict[SourceType, list[SourceRule]] = {
+    SourceType.dji_mini_3_pro: [
+        # /Volumes/DJIMini3Pro/DCIM/100MEDIA/DJI_0027.{MP4,JPG,DNG,SRT}
+        SourceRule(patterns=["DCIM/100MEDIA/DJI_*"]),
+    ],
+    SourceType.sony_a7_iv: [
+        # /Volumes/Untitled 1/DCIM/10030620/A7401412.{ARW,HIF}
+        SourceRule(patterns=["DCIM/**/*.[!.][!.][!.]"]),
+        # /Volumes/Untitled/M4ROOT/CLIP/C0109M01.XML
+        # /Volumes/Untitled/M4ROOT/CLIP/C0109.MP4
+        # /Volumes/Untitled/private/M4ROOT/CLIP/C0109M01.XML
+        # /Volumes/Untitled/private/M4ROOT/CLIP/C0109.MP4
+        SourceRule(
+            patterns=["M4ROOT/CLIP/C*", "private/M4ROOT/CLIP/C*"],
+            group=group_by_sony_clip,
+        ),
+    ],
+    SourceType.insta360_go_2: [
+        # /Volumes/Insta360GO2/DCIM/Camera01/VID_20210320_172249_00_001.mp4
+        # /Volumes/Insta360GO2/DCIM/Camera01/LRV_20210320_172249_01_001.mp4
+        # /Volumes/Insta360GO2/DCIM/Camera01/PRO_VID_20210320_172314_00_002.mp4
+        # /Volumes/Insta360GO2/DCIM/Camera01/PRO_LRV_20210320_172314_01_002.mp4
+        # Probably not needed: /Volumes/Insta360GO2/DCIM/fileinfo_list.list
+        SourceRule(patterns=["DCIM/Camera01/*"]),
+    ],
+    SourceType.dji_osmo_pocket: [
+        # /Volumes/Untitled/DCIM/100MEDIA/DJI_0018.html
+        # /Volumes/Untitled/DCIM/100MEDIA/DJI_0019.JPG
+        # /Volumes/Untitled/DCIM/100MEDIA/DJI_0020.MOV
+        # /Volumes/Untitled/DCIM/100MEDIA/._DJI_0235.MOV
+        # /Volumes/Untitled/DCIM/100MEDIA/DJI_0241.MP4
+        SourceRule(patterns=["DCIM/100MEDIA/DJI_*"]),
+        # /Volumes/Untitled/DCIM/PANORAMA/100_0018
+        # /Volumes/Untitled/DCIM/PANORAMA/100_0018/DJI_0001.JPG
+        # /Volumes/Untitled/DCIM/PANORAMA/100_0018/DJI_0002.JPG
+        SourceRule(patterns=["DCIM/PANORAMA/*/DJI_*"], group=group_by_parent),
+    ],
+    SourceType.insta360_one: [
+        # /Volumes/Untitled/DCIM/Camera01/IMG_20171217_115531_054.insp
+        # /Volumes/Untitled/DCIM/Camera01/._IMG_20171214_180905_018.insp
+        # /Volumes/Untitled/DCIM/Camera01/._VID_20171214_180827_017.insv
+        # /Volumes/Untitled/DCIM/Camera01/._VID_20171214_181119_020.insv
+        # /Volumes/Untitled/DCIM/Camera01/VID_20171222_153701_058.insv
+        SourceRule(patterns=["DCIM/Camera01/*"], ignore=["._*"]),
+    ],
+    SourceType.gopro_10: [
+        # https://community.gopro.com/s/article/GoPro-Camera-File-Naming-Convention?language=en_US
+        # https://community.gopro.com/s/article/What-are-thm-and-lrv-files?language=en_US
+        # /Volumes/Untitled/DCIM/100GOPRO/GX010265.MP4
+        # /Volumes/Untitled/DCIM/100GOPRO/GL010265.LRV
+        # /Volumes/Untitled/DCIM/100GOPRO/GX010265.THM
+        SourceRule(
+            patterns=["DCIM/100GOPRO/G*"],
+            group=group_by_gopro_file_number,
+            ignore=["._*"],
+        ),
+    ],
+    SourceType.fujifilm_x100: [
+        # /Volumes/Untitled//DCIM/100_FUJI/DSCF0384.JPG
+        # /Volumes/Untitled//DCIM/100_FUJI/DSCF0384.RAF
+        SourceRule(patterns=["DCIM/100_FUJI/*"], ignore=["._*"]),
+    ],
+    SourceType.fujifilm_xe5: [
+        # /Volumes/Untitled/ACTIVITY/25083000.LOG
+        # /Volumes/Untitled/ACTIVITY/25083100.LOG
+        # /Volumes/Untitled/DCIM/100_FUJI/DSCF0001.JPG
+        # /Volumes/Untitled/DCIM/100_FUJI/DSCF0008.HIF
+        # /Volumes/Untitled/DCIM/100_FUJI/DSCF0008.RAF
+        # /Volumes/Untitled/FFDB/FFDB_X_E5_5C029362.db
+        # /Volumes/Untitled/UPD/
+        # /Volumes/Untitled/UPD/X-E5/
+        SourceRule(
+            patterns=["DCIM/100_FUJI/*", "ACTIVITY/*.LOG", "FFDB/*.db"],
+            ignore=["._*"],
+        ),
+    ],
+    SourceType.atomos: [
+        # /Volumes/SHOGUNU/SHOGUNU_S001_S001_T001.MOV
+        SourceRule(patterns=["SHOGUNU*"]),
+    ],
+    SourceType.atem_iso: [
+        # /Volumes/ATEM/PyLadies/Video ISO Files/PyLadies CAM 1 01.mp4
+        # /Volumes/ATEM/PyLadies/Video ISO Files/._PyLadies CAM 1 01.mp4
+        # /Volumes/ATEM/PyLadies/Audio Source Files/PyLadies CAM 1 01.wav
+        # /Volumes/ATEM/PyLadies/Audio Source Files/._PyLadies CAM 1 01.wav
+        # /Volumes/ATEM/PyLadies/PyLadies 01.mp4
+        # /Volumes/ATEM/PyLadies/._PyLadies 01.mp4
+        # /Volumes/ATEM/PyLadies/PyLadies.drp
+        # /Volumes/ATEM/PyLadies/._PyLadies.drp
+        # /Volumes/ATEM/._.
+        SourceRule(
+            patterns=[
+                "*/*.mp4",
+                "*/*.drp",
+                "*/Video ISO Files/*.mp4",
+                "*/Video ISO Files/Media Files/*",
+                "*/Audio Source Files/*.wav",
+            ],
+            group=group_by_top_folder,
+            ignore=["._*"],
+            require="*/*.drp",
+        ),
+    ],
+}
+
+
+def _match_parts(
+    path_parts: Sequence[str], pattern_parts: Sequence[str], partial: bool
+) -> bool:
+    """Match path components against pattern components
+
+    With partial, checks whether path is a directory which could contain
+    matches rather than a match itself.
+    """
+    if not pattern_parts:
+        return not path_parts and not partial
+    if not path_parts:
+        return partial
+    head = pattern_parts[0]
+    if head == "**":
+        return _match_parts(path_parts, pattern_parts[1:], partial) or _match_parts(
+            path_parts[1:], pattern_parts, partial
+        )
+    return fnmatch.fnmatchcase(path_parts[0], head) and _match_parts(
+        path_parts[1:], pattern_parts[1:], partial
+    )
+
+
+def path_matches(path: Sequence[str], pattern: str) -> bool:
+    return _match_parts(path, pattern.split("/"), partial=False)
+
+
+def could_contain_matches(directory: Sequence[str], pattern: str) -> bool:
+    return _match_parts(directory, pattern.split("/"), partial=True)
+
+
+def walk_matching(
+    root: Path, patterns: Sequence[str]
+) -> Iterable[tuple[tuple[str, ...], os.DirEntry[str] | None]]:
+    """Walk root once yielding (relative parts, entry) for files matching patterns
+
+    Each directory is listed at most once and only if some pattern could match
+    something inside it. Once everything under a directory has been yielded
+    (relative parts, None) is yielded for it.
+    """
+    pending: list[tuple[Path, tuple[str, ...], bool]] = [(root, (), False)]
+    while pending:
+        directory, parts, done = pending.pop()
+        if done:
+            yield parts, None
+            continue
+        # Children are popped (and finished) before this
+        pending.append((directory, parts, True))
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        for entry in entries:
+            entry_parts = (*parts, entry.name)
+            if entry.is_dir():
+                if any(could_contain_matches(entry_parts, p) for p in patterns):
+                    pending.append((Path(entry.path), entry_parts, False))
+            elif entry.is_file() and any(
+                path_matches(entry_parts, p) for p in patterns
+            ):
+                yield entry_parts, entry
+
+
 def enumerate_source_files(
-    source: DiskMount, source_type: SourceType
+    source: DiskMount,
+    source_type: SourceType,
+    counters: collections.Counter[str] | None = None,
 ) -> Iterable[FileSet]:
-    all_files_by_prefix: dict[str, FileSet] = {}
-    match source_type:
-        case SourceType.dji_mini_3_pro:
-            # /Volumes/DJIMini3Pro/DCIM/100MEDIA/DJI_0027.{MP4,JPG,DNG,SRT}
-            all_files_by_prefix = {}
-            for p in (source.path / "DCIM" / "100MEDIA").glob("DJI_*"):
-                stem = p.stem
-                if stem not in all_files_by_prefix:
-                    all_files_by_prefix[stem] = FileSet(
-                        files=[],
-                        stem=stem,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                all_files_by_prefix[stem].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-        case SourceType.sony_a7_iv:
-            # /Volumes/Untitled 1/DCIM/10030620/A7401412.{ARW,HIF}
-            all_files_by_prefix = {}
-            for p in (source.path / "DCIM").glob("**/*"):
-                if p.exists() and p.is_file() and len(p.suffix) == 4:  # e.g. .ARW
-                    stem = p.stem
-                    if stem not in all_files_by_prefix:
-                        all_files_by_prefix[stem] = FileSet(
-                            files=[],
-                            stem=stem,
-                            prefix=p.parent.relative_to(source.path),
-                            volume_path=source.path,
-                            volume_identifier=source.unique_identifier,
-                        )
-                    all_files_by_prefix[stem].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-
-            # /Volumes/Untitled/M4ROOT/CLIP/C0109M01.XML
-            # /Volumes/Untitled/M4ROOT/CLIP/C0109.MP4
-            # /Volumes/Untitled/private/M4ROOT/CLIP/C0109M01.XML
-            # /Volumes/Untitled/private/M4ROOT/CLIP/C0109.MP4
-            all_files_by_prefix = {}
-            for m4prefix in (source.path, (source.path / "private")):
-                for p in (m4prefix / "M4ROOT" / "CLIP").glob("C*"):
-                    if p.suffix.lower() == ".xml" and p.stem.lower().endswith("m01"):
-                        stem = p.stem[:-3]  # drop M01 portion
-                    else:
-                        stem = p.stem
-                    if stem not in all_files_by_prefix:
-                        all_files_by_prefix[stem] = FileSet(
-                            files=[],
-                            stem=stem,
-                            prefix=p.parent.relative_to(source.path),
-                            volume_path=source.path,
-                            volume_identifier=source.unique_identifier,
+    """Yield FileSets as soon as the folder they're grouped under is walked
+
+    Only the FileSets for folders currently being walked are held in memory.
+    Each File carries the stat taken from its directory entry, counted as
+    source_stat in counters.
+    """
+    if source_type not in SOURCE_RULES:
+        raise NotImplementedError(source_type)
+    rules = SOURCE_RULES[source_type]
+    # per rule, prefix -> stem -> FileSet
+    all_files_by_prefix: list[dict[Path, dict[str, FileSet]]] = [{} for _ in rules]
+    patterns = [pattern for rule in rules for pattern in rule.patterns]
+    for parts, entry in walk_matching(source.path, patterns):
+        if entry is None:
+            finished = Path(*parts)
+            for rule, file_sets_by_prefix in zip(rules, all_files_by_prefix):
+                for file_set in file_sets_by_prefix.pop(finished, {}).values():
+                    if rule.require is None or any(
+                        path_matches(
+                            file.path.relative_to(source.path).parts, rule.require
                         )
-                    all_files_by_prefix[stem].files.append(File(path=p))
-
-            yield from all_files_by_prefix.values()
-        case SourceType.insta360_go_2:
-            # /Volumes/Insta360GO2/DCIM/Camera01/VID_20210320_172249_00_001.mp4
-            # /Volumes/Insta360GO2/DCIM/Camera01/LRV_20210320_172249_01_001.mp4
-            # /Volumes/Insta360GO2/DCIM/Camera01/PRO_VID_20210320_172314_00_002.mp4
-            # /Volumes/Insta360GO2/DCIM/Camera01/PRO_LRV_20210320_172314_01_002.mp4
-            # Probably not needed: /Volumes/Insta360GO2/DCIM/fileinfo_list.list
-            all_files_by_prefix = {}
-            for p in (source.path / "DCIM" / "Camera01").glob("*"):
-                stem = p.stem
-                if stem not in all_files_by_prefix:
-                    all_files_by_prefix[stem] = FileSet(
-                        files=[],
-                        stem=stem,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                all_files_by_prefix[stem].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-        case SourceType.dji_osmo_pocket:
-            # /Volumes/Untitled/DCIM/100MEDIA/DJI_0018.html
-            # /Volumes/Untitled/DCIM/100MEDIA/DJI_0019.JPG
-            # /Volumes/Untitled/DCIM/100MEDIA/DJI_0020.MOV
-            # /Volumes/Untitled/DCIM/100MEDIA/._DJI_0235.MOV
-            # /Volumes/Untitled/DCIM/100MEDIA/DJI_0241.MP4
-            all_files_by_prefix = {}
-            for p in (source.path / "DCIM" / "100MEDIA").glob("DJI_*"):
-                stem = p.stem
-                if stem not in all_files_by_prefix:
-                    all_files_by_prefix[stem] = FileSet(
-                        files=[],
-                        stem=stem,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                all_files_by_prefix[stem].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-
-            # /Volumes/Untitled/DCIM/PANORAMA/100_0018
-            # /Volumes/Untitled/DCIM/PANORAMA/100_0018/DJI_0001.JPG
-            # /Volumes/Untitled/DCIM/PANORAMA/100_0018/DJI_0002.JPG
-            all_files_by_prefix = {}
-            for p in (source.path / "DCIM" / "PANORAMA").glob("*/DJI_*"):
-                stem = p.parent.name
-                if stem not in all_files_by_prefix:
-                    all_files_by_prefix[stem] = FileSet(
-                        files=[],
-                        stem=stem,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                all_files_by_prefix[stem].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-        case SourceType.insta360_one:
-            # /Volumes/Untitled/DCIM/Camera01/IMG_20171217_115531_054.insp
-            # /Volumes/Untitled/DCIM/Camera01/._IMG_20171214_180905_018.insp
-            # /Volumes/Untitled/DCIM/Camera01/._VID_20171214_180827_017.insv
-            # /Volumes/Untitled/DCIM/Camera01/._VID_20171214_181119_020.insv
-            # /Volumes/Untitled/DCIM/Camera01/VID_20171222_153701_058.insv
-            all_files_by_prefix = {}
-            for p in (source.path / "DCIM" / "Camera01").glob("*"):
-                stem = p.stem
-                if stem.startswith("._"):
-                    continue
-                if stem not in all_files_by_prefix:
-                    all_files_by_prefix[stem] = FileSet(
-                        files=[],
-                        stem=stem,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                all_files_by_prefix[stem].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-        case SourceType.gopro_10:
-            # https://community.gopro.com/s/article/GoPro-Camera-File-Naming-Convention?language=en_US
-            # https://community.gopro.com/s/article/What-are-thm-and-lrv-files?language=en_US
-            # /Volumes/Untitled/DCIM/100GOPRO/GX010265.MP4
-            # /Volumes/Untitled/DCIM/100GOPRO/GL010265.LRV
-            # /Volumes/Untitled/DCIM/100GOPRO/GX010265.THM
-            all_files_by_prefix = {}
-            for p in (source.path / "DCIM" / "100GOPRO").glob("G*"):
-                stem = p.stem
-                # GFXXYYYY.ext F = Format, XX = chapter/counter/loop, YYYY = file serial
-                file_number = stem[-4:]
-                if stem.startswith("._"):
-                    continue
-                if file_number not in all_files_by_prefix:
-                    all_files_by_prefix[file_number] = FileSet(
-                        files=[],
-                        stem=file_number,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                all_files_by_prefix[file_number].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-        case SourceType.fujifilm_x100:
-            # /Volumes/Untitled//DCIM/100_FUJI/DSCF0384.JPG
-            # /Volumes/Untitled//DCIM/100_FUJI/DSCF0384.RAF
-            all_files_by_prefix = {}
-            for p in (source.path / "DCIM" / "100_FUJI").glob("*"):
-                stem = p.stem
-                if stem.startswith("._"):
-                    continue
-                if stem not in all_files_by_prefix:
-                    all_files_by_prefix[stem] = FileSet(
-                        files=[],
-                        stem=stem,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                all_files_by_prefix[stem].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-        case SourceType.fujifilm_xe5:
-            # /Volumes/Untitled/ACTIVITY/25083000.LOG
-            # /Volumes/Untitled/ACTIVITY/25083100.LOG
-            # /Volumes/Untitled/DCIM/100_FUJI/DSCF0001.JPG
-            # /Volumes/Untitled/DCIM/100_FUJI/DSCF0008.HIF
-            # /Volumes/Untitled/DCIM/100_FUJI/DSCF0008.RAF
-            # /Volumes/Untitled/FFDB/FFDB_X_E5_5C029362.db
-            # /Volumes/Untitled/UPD/
-            # /Volumes/Untitled/UPD/X-E5/
-            all_files_by_prefix = {}
-            for p in itertools.chain(
-                (source.path / "DCIM" / "100_FUJI").glob("*"),
-                (source.path / "ACTIVITY").glob("*.LOG"),
-                (source.path / "FFDB").glob("*.db"),
-            ):
-                stem = p.stem
-                if stem.startswith("._"):
-                    continue
-                if stem not in all_files_by_prefix:
-                    all_files_by_prefix[stem] = FileSet(
-                        files=[],
-                        stem=stem,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                all_files_by_prefix[stem].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-        case SourceType.atomos:
-            # /Volumes/SHOGUNU/SHOGUNU_S001_S001_T001.MOV
-            all_files_by_prefix = {}
-            for p in (source.path).glob("*"):
-                stem = p.stem
-                if not p.name.startswith("SHOGUNU"):
-                    continue
-                if stem.startswith("."):
-                    continue
-                if stem.startswith("Frame Grab"):
-                    continue
-                if stem.startswith(".FF"):
-                    continue
-                if stem not in all_files_by_prefix:
-                    all_files_by_prefix[stem] = FileSet(
-                        files=[],
-                        stem=stem,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                all_files_by_prefix[stem].files.append(File(path=p))
-            yield from all_files_by_prefix.values()
-        case SourceType.atem_iso:
-            # /Volumes/ATEM/PyLadies/Video ISO Files/PyLadies CAM 1 01.mp4
-            # /Volumes/ATEM/PyLadies/Video ISO Files/._PyLadies CAM 1 01.mp4
-            # /Volumes/ATEM/PyLadies/Audio Source Files/PyLadies CAM 1 01.wav
-            # /Volumes/ATEM/PyLadies/Audio Source Files/._PyLadies CAM 1 01.wav
-            # /Volumes/ATEM/PyLadies/PyLadies 01.mp4
-            # /Volumes/ATEM/PyLadies/._PyLadies 01.mp4
-            # /Volumes/ATEM/PyLadies/PyLadies.drp
-            # /Volumes/ATEM/PyLadies/._PyLadies.drp
-            # /Volumes/ATEM/._.
-            all_files_by_prefix = {}
-            for p in (source.path).glob("*/*.drp"):
-                if p.name.startswith("._"):
-                    continue
-                stem = p.parent.stem
-                if stem not in all_files_by_prefix:
-                    all_files_by_prefix[stem] = FileSet(
-                        files=[],
-                        stem=stem,
-                        prefix=p.parent.relative_to(source.path),
-                        volume_path=source.path,
-                        volume_identifier=source.unique_identifier,
-                    )
-                    for child in itertools.chain(
-                        p.parent.glob("*.mp4"),
-                        p.parent.glob("*.drp"),
-                        p.parent.glob("Video ISO Files/*.mp4"),
-                        p.parent.glob("Video ISO Files/Media Files/*"),
-                        p.parent.glob("Audio Source Files/*.wav"),
+                        for file in file_set.files
                     ):
-                        if child.name.startswith("._"):
-                            continue
-                        all_files_by_prefix[stem].files.append(File(path=child))
-            yield from all_files_by_prefix.values()
-        case _:
-            raise NotImplementedError(source_type)
+                        yield file_set
+            continue
+        for rule, file_sets_by_prefix in zip(rules, all_files_by_prefix):
+            if any(fnmatch.fnmatchcase(entry.name, i) for i in rule.ignore):
+                continue
+            if not any(path_matches(parts, p) for p in rule.patterns):
+                continue
+            stem, prefix = rule.group(Path(*parts))
+            file_sets = file_sets_by_prefix.setdefault(prefix, {})
+            if stem not in file_sets:
+                file_sets[stem] = FileSet(
+                    files=[],
+                    stem=stem,
+                    prefix=prefix,
+                    volume_path=source.path,
+                    volume_identifier=source.unique_identifier,
+                )
+            if counters is not None:
+                counters["source_stat"] += 1
+            file_sets[stem].files.append(
+                File(path=source.path.joinpath(*parts), stat=entry.stat())
+            )
@@ -0,0 +1,589 @@
+"""Runs syncs from disks to their destinations
+
+Every disk is planned in its own thread while a shared OperationExecutor copies
+the files, showing progress in bytes per card and per destination.
+
+Planning and performing can also be split: plan_syncs yields the planned
+operations to be written out as a plan, and apply_plan performs them later.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Generator, Iterable, Sequence
+
+import structlog
+from rich.progress import TaskID
+
+from . import profiling, source
+from .config import IdentityCheck, Sync
+from .copying import DEFAULT_BACKENDS, CopyBackend, copy_file
+from .destination import DatedFolderDestination, DestinationClaims
+from .disks import DiskMount
+from .executor import OperationExecutor
+from .file import File, FileSet
+from .hash_cache import HashCache
+from .hashing import HashAlgorithm
+from .manifest import Manifest
+from .metrics import Metrics
+from .operation import (
+    Operation,
+    OperationResult,
+    OperationType,
+    perform_operation,
+)
+from .pipeline import prefetch
+from .plan import PlannedOperation
+from .progress import ByteProgress, byte_progress
+from .results import ResultLog
+
+LOG: structlog.stdlib.BoundLogger = structlog.get_logger()
+
+# Failures kept to return, the rest are only counted, logged and written to the
+# result log
+MAX_FAILURES = 100
+
+
+def _destination(
+    sync: Sync,
+    hash_cache: HashCache | None,
+    manifest: Manifest | None,
+    digest: HashAlgorithm | None,
+    identity_check: IdentityCheck | None,
+    claims: dict[Path, DestinationClaims],
+) -> DatedFolderDestination:
+    """Destination for a sync, sharing claims with others using the same path"""
+    assert sync.destination.path.is_dir()
+    return DatedFolderDestination(
+        prefix=sync.destination.path,
+        identity_check=identity_check or sync.destination.identity_check,
+        digest_algorithm=digest or HashAlgorithm.blake2b,
+        hash_cache=hash_cache,
+        manifest=manifest,
+        claims=claims.setdefault(sync.destination.path, DestinationClaims()),
+    )
+
+
+def _destination_key(path: Path) -> str:
+    """Destinations on the same filesystem share its writer slots"""
+    return f"dev:{path.stat().st_dev}"
+
+
+def _timed_perform(
+    metrics: Metrics,
+    copy_backends: Sequence[CopyBackend] | None,
+    resume: bool,
+    digest: HashAlgorithm | None,
+) -> Callable[..., OperationResult]:
+    copy = functools.partial(
+        copy_file,
+        backends=copy_backends or DEFAULT_BACKENDS,
+        resume=resume,
+        digest=digest,
+    )
+
+    def perform(operation: Operation, **kwargs: Any) -> OperationResult:
+        """perform_operation, recording its time and bytes copied"""
+        with profiling.phase("execution"):
+            result = perform_operation(operation, copy=copy, **kwargs)
+        if result.seconds is not None:
+            metrics.observe(
+                "operation_seconds", result.seconds, operation=operation.operation
+            )
+        if result.bytes_copied is not None:
+            metrics.observe(
+                "operation_bytes", result.bytes_copied, operation=operation.operation
+            )
+        return result
+
+    return perform
+
+
+def _record_result(
+    result: OperationResult,
+    file_set: FileSet,
+    file: File,
+    counters: collections.Counter[str],
+    failures: list[OperationResult],
+    max_failures: int,
+    results: ResultLog | None,
+    hash_cache: HashCache | None,
+    manifest: Manifest | None,
+    log_debug: bool,
+) -> None:
+    """Count a result and remember what it tells us in the caches"""
+    if results is not None:
+        results.record(result)
+    if log_debug:
+        LOG.debug("operation result", result=result, success=result.success)
+    if not result.success:
+        LOG.error(
+            "perform_operation error",
+            result=result,
+            success=result.success,
+            exception=result.exception,
+            error=result.error,
+        )
+        counters["failure"] += 1
+        if len(failures) < max_failures:
+            failures.append(result)
+    else:
+        counters["success"] += 1
+    if result.backend is not None:
+        counters[f"backend_{result.backend}"] += 1
+    if result.resumed_from:
+        counters["resumed"] += 1
+    if (
+        hash_cache is not None
+        and result.success
+        and result.operation.operation == OperationType.copy
+        and result.digest_algorithm is not None
+        and result.digest is not None
+    ):
+        # Both ends are now known to have this digest
+        for stat in (file.get_stat(counters), result.operation.destination.stat()):
+            hash_cache.put(stat, result.digest_algorithm, "full", result.digest)
+    # Only copies and identical files compared by full digest are recorded,
+    # files found identical by size or sample, or through the manifest itself,
+    # are checked again next time
+    if (
+        manifest is not None
+        and result.success
+        and not result.dry_run
+        and (
+            result.operation.operation == OperationType.copy
+            or (
+                result.operation.operation == OperationType.identical
+                and result.digest is not None
+            )
+        )
+    ):
+        source_stat = file.get_stat(counters)
+        manifest.record(
+            volume_identifier=file_set.volume_identifier,
+            relative_path=result.operation.source.relative_to(file_set.volume_path),
+            size=source_stat.st_size,
+            mtime_ns=source_stat.st_mtime_ns,
+            destination=result.operation.destination,
+            digest_algorithm=result.digest_algorithm,
+            digest=result.digest,
+        )
+    if result.dry_run:
+        counters["dry_run"] += 1
+
+
+def run_syncs(
+    syncs: Iterable[tuple[Sync, DiskMount]],
+    hash_cache: HashCache | None,
+    manifest: Manifest | None,
+    dry_run: bool = True,
+    log_identical_operations: bool = True,
+    workers: int = 4,
+    copy_backends: Sequence[CopyBackend] | None = None,
+    resume: bool = True,
+    digest: HashAlgorithm | None = None,
+    identity_check: IdentityCheck | None = None,
+    stream: bool = True,
+    metrics: Metrics | None = None,
+    results: ResultLog | None = None,
+    max_failures: int = MAX_FAILURES,
+) -> tuple[collections.Counter[str], list[OperationResult]]:
+    """Sync each disk to its destination, returning counters and failures
+
+    Timings for enumerating, planning and performing operations are recorded
+    in metrics if given and every result is written to results if given. Only
+    the first max_failures failures are returned, counters["failure"] counts
+    them all.
+    """
+    syncs = list(syncs)
+    if metrics is None:
+        metrics = Metrics()
+    # Checked once so the per file debug events aren't even built otherwise
+    log_debug = LOG.is_enabled_for(logging.DEBUG)
+    counters: collections.Counter[str] = collections.Counter()
+    failures: list[OperationResult] = []
+    hash_cache_hits = hash_cache.hits if hash_cache is not None else 0
+    hash_cache_misses = hash_cache.misses if hash_cache is not None else 0
+
+    # Made up front as planner threads share them
+    claims = {sync.destination.path: DestinationClaims() for sync, _ in syncs}
+
+    # One bar per destination, shared by the cards syncing to it
+    destination_tasks: dict[Path, TaskID] = {}
+    destination_totals: collections.Counter[Path] = collections.Counter()
+    destination_tasks_lock = threading.Lock()
+
+    def add_destination_total(path: Path, size: int) -> TaskID:
+        with destination_tasks_lock:
+            if path not in destination_tasks:
+                destination_tasks[path] = progress.add_task(f"-> {path}", total=0)
+            destination_totals[path] += size
+            progress.update(destination_tasks[path], total=destination_totals[path])
+            return destination_tasks[path]
+
+    def record_result(
+        tag: tuple[FileSet, File, ByteProgress], result: OperationResult
+    ) -> None:
+        file_set, file, file_progress = tag
+        _record_result(
+            result,
+            file_set,
+            file,
+            counters,
+            failures,
+            max_failures,
+            results,
+            hash_cache,
+            manifest,
+            log_debug,
+        )
+        if dry_run or result.operation.operation != OperationType.copy:
+            # Nothing was copied so count the whole file as done
+            file_progress(file.get_stat().st_size)
+        file_progress.flush()
+
+    def plan_sync(
+        sync: Sync,
+        source_disk: DiskMount,
+        sync_counters: collections.Counter[str],
+    ) -> None:
+        """Plan one disk and submit its operations, run in a thread per disk"""
+        destination = _destination(
+            sync,
+            hash_cache,
+            manifest,
+            digest=digest,
+            identity_check=identity_check,
+            claims=claims,
+        )
+        destination_key = _destination_key(sync.destination.path)
+        # With stream enumeration runs in another thread, so counts separately
+        # and is merged once done
+        enumerate_counters: collections.Counter[str] = collections.Counter()
+        file_sets: Iterable[FileSet] = profiling.profiled(
+            metrics.timed(
+                source.enumerate_source_files(
+                    source=source_disk,
+                    source_type=sync.source.type,
+                    counters=enumerate_counters,
+                ),
+                "phase_seconds",
+                phase="enumerate",
+            ),
+            "enumeration",
+        )
+        if stream:
+            file_sets = prefetch(file_sets)
+            total = 0
+        else:
+            file_sets = list(file_sets)
+            total = sum(
+                file.get_stat(sync_counters).st_size
+                for file_set in file_sets
+                for file in file_set.files
+            )
+        card_task = progress.add_task(f"{source_disk.path}", total=total)
+        destination_task = add_destination_total(sync.destination.path, total)
+        for file_set in file_sets:
+            if log_debug:
+                LOG.debug("file_set", file_set=file_set)
+            if stream:
+                size = sum(
+                    file.get_stat(sync_counters).st_size for file in file_set.files
+                )
+                total += size
+                progress.update(card_task, total=total)
+                add_destination_total(sync.destination.path, size)
+            # Logged as one summary per file set
+            identical: list[Operation] = []
+            # One operation per file, in order
+            for file, operation in zip(
+                file_set.files,
+                profiling.profiled(
+                    metrics.timed(
+                        destination.generate_operations(
+                            file_set=file_set, counters=sync_counters
+                        ),
+                        "phase_seconds",
+                        phase="plan",
+                    ),
+                    "planning",
+                ),
+                strict=True,
+            ):
+                sync_counters[str(operation.operation)] += 1
+                if log_debug:
+                    LOG.debug("operation", operation=operation)
+                if operation.operation == OperationType.identical:
+                    identical.append(operation)
+                else:
+                    LOG.info(
+                        operation.operation,
+                        type=sync.source.type,
+                        source=operation.source,
+                        destination=operation.destination,
+                    )
+                file_progress = ByteProgress(progress, [card_task, destination_task])
+                executor.submit(
+                    (file_set, file, file_progress),
+                    operation,
+                    source=(source_disk.unique_identifier, sync.source.max_readers),
+                    destination=(destination_key, sync.destination.max_writers),
+                    size=file.get_stat(sync_counters).st_size
+                    if operation.operation == OperationType.copy
+                    else 0,
+                    progress=file_progress,
+                )
+            if identical and log_identical_operations:
+                LOG.info(
+                    OperationType.identical,
+                    type=sync.source.type,
+                    source=identical[0].source.parent,
+                    destination=identical[0].destination.parent,
+                    stem=file_set.stem,
+                    files=len(identical),
+                )
+        sync_counters.update(enumerate_counters)
+
+    with (
+        byte_progress() as progress,
+        # All disks are planned at once, the executor shares workers between them
+        concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(len(syncs), 1), thread_name_prefix="sync-camera-disk-plan"
+        ) as planners,
+        OperationExecutor[tuple[FileSet, File, ByteProgress]](
+            max_workers=workers,
+            dry_run=dry_run,
+            perform=_timed_perform(metrics, copy_backends, resume, digest),
+        ) as executor,
+    ):
+        all_sync_counters = [collections.Counter[str]() for _ in syncs]
+        planned = [
+            planners.submit(plan_sync, sync, source_disk, sync_counters)
+            for (sync, source_disk), sync_counters in zip(syncs, all_sync_counters)
+        ]
+        for future in planned:
+            # Stop waiting on results to check whether planning is done
+            future.add_done_callback(lambda _: executor.wake())
+        while not all(future.done() for future in planned) or executor.outstanding:
+            for task, result in executor.completed(timeout=1.0):
+                record_result(task, result)
+        for task, result in executor.wait():
+            record_result(task, result)
+        for future in planned:
+            # Raise any planning errors
+            future.result()
+        for sync_counters in all_sync_counters:
+            counters.update(sync_counters)
+    if hash_cache is not None:
+        counters["hash_cache_hits"] = hash_cache.hits - hash_cache_hits
+        counters["hash_cache_misses"] = hash_cache.misses - hash_cache_misses
+    return counters, failures
+
+
+def plan_syncs(
+    syncs: Iterable[tuple[Sync, DiskMount]],
+    hash_cache: HashCache | None,
+    manifest: Manifest | None,
+    counters: collections.Counter[str],
+    digest: HashAlgorithm | None = None,
+    identity_check: IdentityCheck | None = None,
+    metrics: Metrics | None = None,
+) -> Generator[PlannedOperation, None, None]:
+    """Plan each disk in turn, yielding operations as they are planned"""
+    if metrics is None:
+        metrics = Metrics()
+    claims: dict[Path, DestinationClaims] = {}
+    for sync, source_disk in syncs:
+        destination = _destination(
+            sync,
+            hash_cache,
+            manifest,
+            digest=digest,
+            identity_check=identity_check,
+            claims=claims,
+        )
+        file_sets = profiling.profiled(
+            metrics.timed(
+                source.enumerate_source_files(
+                    source=source_disk, source_type=sync.source.type, counters=counters
+                ),
+                "phase_seconds",
+                phase="enumerate",
+            ),
+            "enumeration",
+        )
+        for file_set in file_sets:
+            for file, operation in zip(
+                file_set.files,
+                profiling.profiled(
+                    metrics.timed(
+                        destination.generate_operations(
+                            file_set=file_set, counters=counters
+                        ),
+                        "phase_seconds",
+                        phase="plan",
+                    ),
+                    "planning",
+                ),
+                strict=True,
+            ):
+                counters[str(operation.operation)] += 1
+                stat = file.get_stat(counters)
+                yield PlannedOperation(
+                    operation=operation,
+                    volume_identifier=file_set.volume_identifier,
+                    volume_path=file_set.volume_path,
+                    size=stat.st_size,
+                    mtime_ns=stat.st_mtime_ns,
+                    max_readers=sync.source.max_readers,
+                    destination_root=sync.destination.path,
+                    max_writers=sync.destination.max_writers,
+                )
+
+
+def apply_plan(
+    planned: Iterable[PlannedOperation],
+    hash_cache: HashCache | None,
+    manifest: Manifest | None,
+    dry_run: bool = True,
+    workers: int = 4,
+    copy_backends: Sequence[CopyBackend] | None = None,
+    resume: bool = True,
+    digest: HashAlgorithm | None = None,
+    metrics: Metrics | None = None,
+    results: ResultLog | None = None,
+    max_failures: int = MAX_FAILURES,
+) -> tuple[collections.Counter[str], list[OperationResult]]:
+    """Perform planned operations, returning counters and failures
+
+    As with run_syncs every result is written to results if given and only the
+    first max_failures failures are returned.
+
+    planned is consumed as operations are submitted, so it can be read lazily
+    from a plan of any size. Sources changed or missing since they were
+    planned are skipped.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    log_debug = LOG.is_enabled_for(logging.DEBUG)
+    counters: collections.Counter[str] = collections.Counter()
+    failures: list[OperationResult] = []
+    hash_cache_hits = hash_cache.hits if hash_cache is not None else 0
+    hash_cache_misses = hash_cache.misses if hash_cache is not None else 0
+    destination_keys: dict[Path, str] = {}
+    # One bar per volume, the totals grow as the plan is read
+    volume_tasks: dict[Path, TaskID] = {}
+    volume_totals: collections.Counter[Path] = collections.Counter()
+
+    def record_result(
+        tag: tuple[FileSet, File, ByteProgress], result: OperationResult
+    ) -> None:
+        file_set, file, file_progress = tag
+        _record_result(
+            result,
+            file_set,
+            file,
+            counters,
+            failures,
+            max_failures,
+            results,
+            hash_cache,
+            manifest,
+            log_debug,
+        )
+        if dry_run or result.operation.operation != OperationType.copy:
+            file_progress(file.get_stat().st_size)
+        file_progress.flush()
+
+    with (
+        byte_progress() as progress,
+        OperationExecutor[tuple[FileSet, File, ByteProgress]](
+            max_workers=workers,
+            dry_run=dry_run,
+            perform=_timed_perform(metrics, copy_backends, resume, digest),
+        ) as executor,
+    ):
+        for planned_operation in planned:
+            operation = planned_operation.operation
+            file = File(path=operation.source)
+            try:
+                stat = file.get_stat(counters)
+            except OSError as e:
+                LOG.warning(
+                    "Missing since planned, skipping", source=operation.source, error=e
+                )
+                counters["missing_since_planned"] += 1
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (
+                planned_operation.size,
+                planned_operation.mtime_ns,
+            ):
+                LOG.warning("Changed since planned, skipping", source=operation.source)
+                counters["changed_since_planned"] += 1
+                continue
+            if operation.operation == OperationType.copy and not dry_run:
+                # e.g. copied by another card, shard or sync since planned
+                try:
+                    operation.destination.lstat()
+                except FileNotFoundError:
+                    pass
+                else:
+                    LOG.warning(
+                        "Destination exists since planned, skipping",
+                        source=operation.source,
+                        destination=operation.destination,
+                    )
+                    counters["destination_exists_since_planned"] += 1
+                    continue
+            counters[str(operation.operation)] += 1
+            file_set = FileSet(
+                files=[file],
+                stem=operation.source.stem,
+                prefix=operation.source.parent.relative_to(
+                    planned_operation.volume_path
+                ),
+                volume_path=planned_operation.volume_path,
+                volume_identifier=planned_operation.volume_identifier,
+            )
+            if planned_operation.destination_root not in destination_keys:
+                destination_keys[planned_operation.destination_root] = _destination_key(
+                    planned_operation.destination_root
+                )
+            volume_path = planned_operation.volume_path
+            if volume_path not in volume_tasks:
+                volume_tasks[volume_path] = progress.add_task(str(volume_path), total=0)
+            volume_totals[volume_path] += stat.st_size
+            progress.update(volume_tasks[volume_path], total=volume_totals[volume_path])
+            if operation.operation != OperationType.identical:
+                LOG.info(
+                    operation.operation,
+                    source=operation.source,
+                    destination=operation.destination,
+                )
+            file_progress = ByteProgress(progress, [volume_tasks[volume_path]])
+            executor.submit(
+                (file_set, file, file_progress),
+                operation,
+                source=(
+                    planned_operation.volume_identifier,
+                    planned_operation.max_readers,
+                ),
+                destination=(
+                    destination_keys[planned_operation.destination_root],
+                    planned_operation.max_writers,
+                ),
+                size=stat.st_size if operation.operation == OperationType.copy else 0,
+                progress=file_progress,
+            )
+            for task, result in executor.completed():
+                record_result(task, result)
+        for task, result in executor.wait():
+            record_result(task, result)
+    if hash_cache is not None:
+        counters["hash_cache_hits"] = hash_cache.hits - hash_cache_hits
+        counters["hash_cache_misses"] = hash_cache.misses - hash_cache_misses
+    return counters, failures
@@ -624,3 +624,76 @@ FUJIFILM_XE5_DISKUTIL_LIST = DiskutilList(
     VolumesFromDisks=[],
     WholeDisks=["disk2"],
 )
+
+
+def make_fake_root(root: Path, files: dict[str, str], symlinks: dict[str, str]) -> Path:
+    """Write a fake procfs/sysfs/dev tree for linux.read_linux_disks"""
+    for name, content in files.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(content)
+    for name, target in symlinks.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).symlink_to(target)
+    return root
+
+
+_USB_SD_READER = (
+    "sys/devices/pci0000:00/0000:00:14.0/usb2/2-1/2-1:1.0/host6/target6:0:0/6:0:0:0"
+)
+_NVME = "sys/devices/pci0000:00/0000:00:1d.0/0000:03:00.0/nvme/nvme0"
+
+# Sony SD card (exFAT, partitioned) in a USB card reader, plus the internal disk
+LINUX_SONY_SD_CARD_FILES = {
+    "proc/self/mountinfo": "\n".join(
+        [
+            "26 1 259:2 / / rw,relatime shared:1 - ext4 /dev/nvme0n1p2 rw",
+            "28 26 259:1 / /boot/efi rw,relatime shared:2 - vfat /dev/nvme0n1p1 rw",
+            "30 26 0:26 / /proc rw,nosuid,nodev,noexec shared:12 - proc proc rw",
+            "512 26 8:17 / /media/mick/Untitled rw,nosuid,nodev,relatime shared:301"
+            " - exfat /dev/sdb1 rw,fmask=0022,dmask=0022,iocharset=utf8",
+            # Bind mount of a folder on the card
+            "530 26 8:17 /DCIM /srv/dcim rw,relatime shared:301 - exfat /dev/sdb1 rw",
+        ]
+    ),
+    f"{_USB_SD_READER}/block/sdb/size": "249737216\n",
+    f"{_USB_SD_READER}/block/sdb/removable": "1\n",
+    f"{_USB_SD_READER}/block/sdb/dev": "8:16\n",
+    f"{_USB_SD_READER}/block/sdb/sdb1/size": "249704448\n",
+    f"{_USB_SD_READER}/block/sdb/sdb1/partition": "1\n",
+    f"{_USB_SD_READER}/block/sdb/sdb1/dev": "8:17\n",
+    f"{_NVME}/nvme0n1/size": "1000215216\n",
+    f"{_NVME}/nvme0n1/removable": "0\n",
+    f"{_NVME}/nvme0n1/dev": "259:0\n",
+    f"{_NVME}/nvme0n1/nvme0n1p1/size": "1048576\n",
+    f"{_NVME}/nvme0n1/nvme0n1p1/partition": "1\n",
+    f"{_NVME}/nvme0n1/nvme0n1p1/dev": "259:1\n",
+    f"{_NVME}/nvme0n1/nvme0n1p2/size": "999164559\n",
+    f"{_NVME}/nvme0n1/nvme0n1p2/partition": "2\n",
+    f"{_NVME}/nvme0n1/nvme0n1p2/dev": "259:2\n",
+}
+
+LINUX_SONY_SD_CARD_SYMLINKS = {
+    "sys/block/sdb": f"../../{_USB_SD_READER}/block/sdb",
+    "sys/block/nvme0n1": f"../../{_NVME}/nvme0n1",
+    "dev/disk/by-uuid/0E23-9BC6": "../../sdb1",
+    "dev/disk/by-uuid/4a7c36f2-5f3e-4b5e-a1d2-3c0e6e7f8a91": "../../nvme0n1p2",
+    "dev/disk/by-uuid/A1B2-C3D4": "../../nvme0n1p1",
+}
+
+_MMC_READER = "sys/devices/pci0000:00/0000:00:1c.0/0000:02:00.0/rtsx_pci_sdmmc.0/mmc_host/mmc0/mmc0:aaaa"
+
+# GoPro SD card (FAT32, not partitioned) in a built in card reader, no UUID
+LINUX_GOPRO_10_SD_CARD_FILES = {
+    "proc/self/mountinfo": (
+        "612 26 179:0 / /media/mick/GOPRO\\040CARD rw,nosuid,nodev,relatime"
+        " shared:340 - vfat /dev/mmcblk0 rw,fmask=0022,dmask=0022\n"
+    ),
+    f"{_MMC_READER}/block/mmcblk0/size": "124735488\n",
+    f"{_MMC_READER}/block/mmcblk0/removable": "0\n",
+    f"{_MMC_READER}/block/mmcblk0/dev": "179:0\n",
+}
+
+LINUX_GOPRO_10_SD_CARD_SYMLINKS = {
+    "sys/block/mmcblk0": f"../../{_MMC_READER}/block/mmcblk0",
+    "dev/disk/by-label/GOPRO\\x20CARD": "../../mmcblk0",
+}
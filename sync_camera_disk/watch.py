@@ -0,0 +1,87 @@
+"""Notice disks being mounted and unmounted
+
+On Linux the kernel flags /proc/self/mountinfo with POLLPRI whenever the mount
+table changes, so we sleep in poll() until something happens. On macOS /Volumes
+is listed every interval, which is much cheaper than running diskutil; that
+only happens once something has changed.
+"""
+
+import os
+import select
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Generator
+
+MOUNTINFO_PATH = Path("/proc/self/mountinfo")
+VOLUMES_PATH = Path("/Volumes")
+
+
+def _no_retry() -> bool:
+    return False
+
+
+def watch(
+    read: Callable[[], object],
+    wait: Callable[[], None],
+    retry: Callable[[], bool] = _no_retry,
+) -> Generator[None, None, None]:
+    """Yield straight away and then each time read returns something different
+
+    wait is called between reads. While retry returns True every read yields,
+    changed or not, so failed work is tried again each wait.
+    """
+    previous = None
+    while True:
+        current = read()
+        if current != previous or retry():
+            previous = current
+            yield
+        wait()
+
+
+def watch_mountinfo(
+    path: Path = MOUNTINFO_PATH,
+    interval: float = 2.0,
+    retry: Callable[[], bool] = _no_retry,
+) -> Generator[None, None, None]:
+    with path.open("rb", buffering=0) as fp:
+        poller = select.poll()
+        poller.register(fp, select.POLLPRI | select.POLLERR)
+
+        def read() -> bytes:
+            # Reading also clears the change flag, otherwise poll returns at once
+            fp.seek(0)
+            return fp.read() or b""
+
+        def wait() -> None:
+            poller.poll(interval * 1000)
+
+        yield from watch(read, wait, retry)
+
+
+def watch_volumes(
+    path: Path = VOLUMES_PATH,
+    interval: float = 2.0,
+    retry: Callable[[], bool] = _no_retry,
+) -> Generator[None, None, None]:
+    yield from watch(
+        lambda: sorted(os.listdir(path)), lambda: time.sleep(interval), retry
+    )
+
+
+def watch_mounts(
+    interval: float = 2.0, retry: Callable[[], bool] = _no_retry
+) -> Generator[None, None, None]:
+    """Yield straight away and then each time a disk is mounted or unmounted
+
+    Checks at least every interval seconds, and yields at each check while retry
+    returns True.
+    """
+    match sys.platform:
+        case "linux":
+            yield from watch_mountinfo(interval=interval, retry=retry)
+        case "darwin":
+            yield from watch_volumes(interval=interval, retry=retry)
+        case _:
+            raise NotImplementedError(sys.platform)
@@ -0,0 +1,84 @@
+import os
+import unittest.mock
+from pathlib import Path
+
+import pydantic_yaml
+import pytest
+
+from sync_camera_disk import config, config_cache
+from sync_camera_disk.disks import DiskMount
+
+
+def write_config(path: Path, identifier: str) -> config.Sync:
+    sync = config.Sync(
+        source=config.Source(identifier=identifier, type=config.SourceType.gopro_10),
+        destination=config.Destination(path=path.parent),
+    )
+    path.write_text(pydantic_yaml.to_yaml_str(config.Config(syncs=[sync])))
+    return sync
+
+
+@pytest.fixture
+def config_path(tmp_path: Path) -> Path:
+    path = tmp_path / "config.yaml"
+    write_config(path, "abc")
+    return path
+
+
+def test_load_config_uses_cache(config_path: Path, tmp_path: Path) -> None:
+    cache_dir = tmp_path / "cache"
+    first = config_cache.load_config(config_path, cache_dir)
+    assert config_cache.cache_file_path(cache_dir, config_path).is_file()
+
+    with unittest.mock.patch("pydantic_yaml.parse_yaml_file_as") as mock_parse:
+        cached = config_cache.load_config(config_path, cache_dir)
+    mock_parse.assert_not_called()
+    assert cached.config == first.config
+    disk = DiskMount(path=Path("/Volumes/Untitled"), unique_identifier="abc")
+    assert cached.index.lookup(disk) == [0]
+
+
+def test_load_config_changed(config_path: Path, tmp_path: Path) -> None:
+    cache_dir = tmp_path / "cache"
+    config_cache.load_config(config_path, cache_dir)
+    stat = config_path.stat()
+    sync = write_config(config_path, "def")
+    # Make sure the mtime moves even on coarse filesystems
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    compiled = config_cache.load_config(config_path, cache_dir)
+    assert compiled.config.syncs == [sync]
+
+
+def test_load_config_models_changed(config_path: Path, tmp_path: Path) -> None:
+    cache_dir = tmp_path / "cache"
+    config_cache.load_config(config_path, cache_dir)
+
+    with (
+        unittest.mock.patch.object(config_cache, "schema_hash", return_value="changed"),
+        unittest.mock.patch(
+            "pydantic_yaml.parse_yaml_file_as", wraps=pydantic_yaml.parse_yaml_file_as
+        ) as mock_parse,
+    ):
+        compiled = config_cache.load_config(config_path, cache_dir)
+    mock_parse.assert_called_once()
+    assert len(compiled.config.syncs) == 1
+
+
+def test_load_config_unreadable_cache(config_path: Path, tmp_path: Path) -> None:
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    config_cache.cache_file_path(cache_dir, config_path).write_bytes(b"nonsense")
+
+    compiled = config_cache.load_config(config_path, cache_dir)
+    assert len(compiled.config.syncs) == 1
+    # Replaced with a good cache
+    with unittest.mock.patch("pydantic_yaml.parse_yaml_file_as") as mock_parse:
+        config_cache.load_config(config_path, cache_dir)
+    mock_parse.assert_not_called()
+
+
+def test_load_config_no_cache(config_path: Path, tmp_path: Path) -> None:
+    compiled = config_cache.load_config(config_path, None)
+    assert len(compiled.config.syncs) == 1
+    assert list(tmp_path.iterdir()) == [config_path]
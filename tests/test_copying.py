@@ -0,0 +1,275 @@
+import errno
+import fcntl
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from sync_camera_disk import copying, hashing, operation
+
+
+@pytest.fixture
+def source_file(tmp_path: Path) -> Path:
+    path = tmp_path / "source" / "C0109.MP4"
+    path.parent.mkdir()
+    # A bit over one stream buffer to exercise the loops
+    path.write_bytes(os.urandom(copying.STREAM_BUFFER_SIZE + 1234))
+    os.utime(path, (1_600_000_000, 1_600_000_000))
+    return path
+
+
+@pytest.mark.parametrize(
+    "backend",
+    [
+        copying.CopyBackend.copy_file_range,
+        copying.CopyBackend.sendfile,
+        copying.CopyBackend.stream,
+    ],
+)
+def test_copy_file_backend(
+    source_file: Path, tmp_path: Path, backend: copying.CopyBackend
+) -> None:
+    destination = tmp_path / "C0109.MP4"
+    result = copying.copy_file(
+        source_file, destination, backends=[backend, copying.CopyBackend.stream]
+    )
+    assert destination.read_bytes() == source_file.read_bytes()
+    assert result.bytes_copied == source_file.stat().st_size
+    assert destination.stat().st_mtime == source_file.stat().st_mtime
+
+
+def test_copy_file_default_backends(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    result = copying.copy_file(source_file, destination)
+    assert result.backend in copying.DEFAULT_BACKENDS
+    assert destination.read_bytes() == source_file.read_bytes()
+
+
+def test_copy_file_falls_back(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    with mock.patch(
+        "sync_camera_disk.copying.os.copy_file_range",
+        side_effect=OSError(errno.EXDEV, "cross device"),
+        create=True,
+    ):
+        result = copying.copy_file(
+            source_file,
+            destination,
+            backends=[copying.CopyBackend.copy_file_range, copying.CopyBackend.stream],
+        )
+    assert result.backend == copying.CopyBackend.stream
+    assert destination.read_bytes() == source_file.read_bytes()
+
+
+def test_copy_file_real_errors_propagate(source_file: Path, tmp_path: Path) -> None:
+    with mock.patch(
+        "sync_camera_disk.copying.os.readv",
+        side_effect=OSError(errno.EIO, "card pulled"),
+    ):
+        with pytest.raises(OSError, match="card pulled"):
+            copying.copy_file(
+                source_file,
+                tmp_path / "C0109.MP4",
+                backends=[copying.CopyBackend.stream],
+            )
+
+
+def test_copy_file_no_usable_backend(source_file: Path, tmp_path: Path) -> None:
+    with mock.patch.dict(
+        copying.BACKENDS,
+        {copying.CopyBackend.stream: mock.Mock(side_effect=copying.UnsupportedBackend)},
+    ):
+        with pytest.raises(OSError, match="No usable copy backend"):
+            copying.copy_file(
+                source_file,
+                tmp_path / "C0109.MP4",
+                backends=[copying.CopyBackend.stream],
+            )
+
+
+def test_perform_operation_reports_backend(source_file: Path, tmp_path: Path) -> None:
+    copy_operation = operation.Operation(
+        operation=operation.OperationType.copy,
+        source=source_file,
+        destination=tmp_path / "destination" / "2024-09-16" / "C0109.MP4",
+    )
+    result = operation.perform_operation(copy_operation, dry_run=False)
+    assert result.success
+    assert result.backend in copying.DEFAULT_BACKENDS
+    assert result.bytes_copied == source_file.stat().st_size
+    assert copy_operation.destination.read_bytes() == source_file.read_bytes()
+
+
+def test_copy_file_leaves_no_partial(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    copying.copy_file(source_file, destination)
+    assert destination.is_file()
+    assert not copying.partial_path(destination).exists()
+
+
+def test_copy_file_interrupted_keeps_partial(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    with mock.patch(
+        "sync_camera_disk.copying.os.write",
+        side_effect=OSError(errno.EIO, "card pulled"),
+    ):
+        with pytest.raises(OSError):
+            copying.copy_file(
+                source_file, destination, backends=[copying.CopyBackend.stream]
+            )
+    assert not destination.exists()
+    assert copying.partial_path(destination).exists()
+
+
+def test_copy_file_short_copy_keeps_partial(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    with mock.patch(
+        "sync_camera_disk.copying.copy_fds",
+        return_value=copying.CopyResult(copying.CopyBackend.stream, 0),
+    ):
+        with pytest.raises(OSError, match="Copied 0 of"):
+            copying.copy_file(source_file, destination)
+    assert not destination.exists()
+    assert copying.partial_path(destination).exists()
+
+
+def test_copy_file_missing_source(tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    fds = len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+    with pytest.raises(FileNotFoundError):
+        copying.copy_file(tmp_path / "missing.MP4", destination)
+    assert not copying.partial_path(destination).exists()
+    if fds is not None:
+        assert len(os.listdir("/proc/self/fd")) == fds
+
+
+@pytest.mark.parametrize("hard_links", [True, False])
+def test_copy_file_never_replaces(
+    source_file: Path, tmp_path: Path, hard_links: bool
+) -> None:
+    destination = tmp_path / "C0109.MP4"
+    destination.write_bytes(b"another copy")
+    with mock.patch(
+        "sync_camera_disk.copying.os.link",
+        side_effect=None if hard_links else OSError(errno.EPERM, "No links"),
+        wraps=os.link,
+    ):
+        with pytest.raises(FileExistsError):
+            copying.copy_file(source_file, destination)
+    assert destination.read_bytes() == b"another copy"
+    assert copying.partial_path(destination).exists()
+
+
+def test_copy_file_without_hard_links(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    with mock.patch(
+        "sync_camera_disk.copying.os.link",
+        side_effect=OSError(errno.EPERM, "No links"),
+    ):
+        copying.copy_file(source_file, destination)
+    assert destination.read_bytes() == source_file.read_bytes()
+    assert destination.stat().st_mtime == source_file.stat().st_mtime
+    assert not copying.partial_path(destination).exists()
+
+
+def test_copy_file_resumes_partial(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    data = source_file.read_bytes()
+    copying.partial_path(destination).write_bytes(data[:5000])
+
+    result = copying.copy_file(source_file, destination)
+
+    assert result.resumed_from == 5000
+    assert result.bytes_copied == len(data) - 5000
+    assert destination.read_bytes() == data
+    assert not copying.partial_path(destination).exists()
+
+
+def test_copy_file_restarts_mismatched_partial(
+    source_file: Path, tmp_path: Path
+) -> None:
+    destination = tmp_path / "C0109.MP4"
+    data = source_file.read_bytes()
+    copying.partial_path(destination).write_bytes(b"x" * 5000)
+
+    result = copying.copy_file(source_file, destination)
+
+    assert result.resumed_from == 0
+    assert result.bytes_copied == len(data)
+    assert destination.read_bytes() == data
+
+
+def test_copy_file_no_resume(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    data = source_file.read_bytes()
+    copying.partial_path(destination).write_bytes(data[:5000])
+
+    result = copying.copy_file(source_file, destination, resume=False)
+
+    assert result.resumed_from == 0
+    assert destination.read_bytes() == data
+
+
+def test_copy_file_digest(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    result = copying.copy_file(
+        source_file, destination, digest=hashing.HashAlgorithm.blake2b
+    )
+    assert result.backend == copying.CopyBackend.stream
+    assert result.digest_algorithm == hashing.HashAlgorithm.blake2b
+    assert result.digest == hashing.hash_file(source_file)
+
+
+def test_copy_file_digest_resumed(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    copying.partial_path(destination).write_bytes(source_file.read_bytes()[:5000])
+    result = copying.copy_file(
+        source_file, destination, digest=hashing.HashAlgorithm.blake2b
+    )
+    assert result.resumed_from == 5000
+    assert result.digest == hashing.hash_file(source_file)
+
+
+@pytest.mark.parametrize(
+    "backend",
+    [
+        copying.CopyBackend.copy_file_range,
+        copying.CopyBackend.sendfile,
+        copying.CopyBackend.stream,
+    ],
+)
+def test_copy_file_progress(
+    source_file: Path, tmp_path: Path, backend: copying.CopyBackend
+) -> None:
+    reported: list[int] = []
+    copying.copy_file(
+        source_file,
+        tmp_path / "C0109.MP4",
+        backends=[backend, copying.CopyBackend.stream],
+        progress=reported.append,
+    )
+    assert sum(reported) == source_file.stat().st_size
+
+
+def test_copy_file_progress_resumed(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    copying.partial_path(destination).write_bytes(source_file.read_bytes()[:5000])
+    reported: list[int] = []
+
+    copying.copy_file(source_file, destination, progress=reported.append)
+
+    assert reported[0] == 5000
+    assert sum(reported) == source_file.stat().st_size
+
+
+def test_copy_file_partial_in_use(source_file: Path, tmp_path: Path) -> None:
+    destination = tmp_path / "C0109.MP4"
+    partial = copying.partial_path(destination)
+    with partial.open("wb") as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX)
+        other.write(b"another copy")
+        with pytest.raises(FileExistsError):
+            copying.copy_file(source_file, destination)
+    assert partial.read_bytes() == b"another copy"
+    assert not destination.exists()
@@ -1,9 +1,15 @@
+import collections
 import datetime
+import os
 import shutil
+import unittest.mock
 from pathlib import Path
 
 from sync_camera_disk import destination
+from sync_camera_disk.config import IdentityCheck
 from sync_camera_disk.file import File, FileSet
+from sync_camera_disk.hash_cache import HashCache
+from sync_camera_disk.hashing import HashAlgorithm, hash_file
 from sync_camera_disk.operation import Operation, OperationType
 
 
@@ -26,6 +32,71 @@ def test_is_file_identical(tmp_path: Path) -> None:
     assert destination.is_file_identical(foo, bar)
 
 
+def test_is_file_identical_tiers(tmp_path: Path) -> None:
+    sample_size = 16
+    original = tmp_path / "original" / "C0109.MP4"
+    original.parent.mkdir()
+    original.write_bytes(b"a" * 100)
+    # Differs in the middle, outside the sampled head and tail
+    middle = tmp_path / "middle" / "C0109.MP4"
+    middle.parent.mkdir()
+    middle.write_bytes(b"a" * 50 + b"b" + b"a" * 49)
+    # Differs in the tail
+    tail = tmp_path / "tail" / "C0109.MP4"
+    tail.parent.mkdir()
+    tail.write_bytes(b"a" * 99 + b"b")
+    copy = tmp_path / "copy" / "C0109.MP4"
+    copy.parent.mkdir()
+    shutil.copy2(original, copy)
+
+    counters: collections.Counter[str] = collections.Counter()
+
+    def check(a: Path, b: Path, check: IdentityCheck) -> bool:
+        return destination.is_file_identical(
+            a, b, check=check, counters=counters, sample_size=sample_size
+        )
+
+    assert check(original, middle, IdentityCheck.size)
+    assert check(original, middle, IdentityCheck.sample)
+    assert not check(original, middle, IdentityCheck.full)
+    assert not check(original, tail, IdentityCheck.sample)
+    assert not check(original, tail, IdentityCheck.full)
+    assert check(original, copy, IdentityCheck.full)
+
+    assert counters == {
+        "identity_size_identical": 1,
+        "identity_sample_identical": 1,
+        "identity_sample_different": 2,
+        "identity_full_different": 1,
+        "identity_full_identical": 1,
+    }
+
+
+def test_is_file_identical_small_full(tmp_path: Path) -> None:
+    original = tmp_path / "original" / "GX010001.THM"
+    original.parent.mkdir()
+    original.write_bytes(b"thumbnail")
+    copy = tmp_path / "copy" / "GX010001.THM"
+    copy.parent.mkdir()
+    shutil.copy2(original, copy)
+
+    counters: collections.Counter[str] = collections.Counter()
+    found_digests: dict[Path, str] = {}
+    assert destination.is_file_identical(
+        original,
+        copy,
+        check=IdentityCheck.full,
+        counters=counters,
+        found_digests=found_digests,
+    )
+    # Hashed once in full rather than sampled, so the digest is known
+    assert counters == {"identity_full_identical": 1}
+    assert found_digests == {
+        original: hash_file(original, HashAlgorithm.blake2b),
+        copy: hash_file(copy, HashAlgorithm.blake2b),
+    }
+
+
 def test_dated_folder_destination(tmp_path: Path) -> None:
     dest = destination.DatedFolderDestination(prefix=tmp_path / "destination")
 
@@ -72,30 +143,27 @@ def test_dated_folder_destination(tmp_path: Path) -> None:
         )
     )
 
-    assert [o.dict() for o in operations] == [
-        o.dict()
-        for o in (
-            Operation(
-                operation=OperationType.copy,
-                source=file1.path,
-                destination=tmp_path / "destination" / date / "abc.mp4",
-            ),
-            Operation(
-                operation=OperationType.copy,
-                source=file2.path,
-                destination=tmp_path / "destination" / date / "abc.srt",
-            ),
-            Operation(
-                operation=OperationType.unknown,
-                source=file3.path,
-                destination=tmp_path / "destination" / date / "abc.txt",
-            ),
-            Operation(
-                operation=OperationType.identical,
-                source=file4.path,
-                destination=tmp_path / "destination" / date / "abc.text",
-            ),
-        )
+    assert operations == [
+        Operation(
+            operation=OperationType.copy,
+            source=file1.path,
+            destination=tmp_path / "destination" / date / "abc.mp4",
+        ),
+        Operation(
+            operation=OperationType.copy,
+            source=file2.path,
+            destination=tmp_path / "destination" / date / "abc.srt",
+        ),
+        Operation(
+            operation=OperationType.unknown,
+            source=file3.path,
+            destination=tmp_path / "destination" / date / "abc.txt",
+        ),
+        Operation(
+            operation=OperationType.identical,
+            source=file4.path,
+            destination=tmp_path / "destination" / date / "abc.text",
+        ),
     ]
 
 
@@ -120,10 +188,111 @@ def test_nested_folder_operation(tmp_path: Path) -> None:
         )
     )
 
-    assert [o.dict() for o in operations] == [
+    assert operations == [
         Operation(
             operation=OperationType.copy,
             source=file1.path,
             destination=tmp_path / "destination" / date / "project/Video Files/abc.mp4",
-        ).dict(),
+        ),
     ]
+
+
+def test_destination_index(tmp_path: Path) -> None:
+    folder = tmp_path / "2024-09-16"
+    (folder / "PyLadies" / "Video ISO Files").mkdir(parents=True)
+    (folder / "PyLadies" / "PyLadies.drp").write_text("ham")
+    (folder / "PyLadies" / "Video ISO Files" / "PyLadies CAM 1 01.mp4").touch()
+
+    index = destination.DestinationIndex()
+    drp = index.lookup(folder, Path("PyLadies/PyLadies.drp"))
+    assert drp is not None and drp.st_size == 3
+    assert index.lookup(folder, Path("PyLadies/Video ISO Files/PyLadies CAM 1 01.mp4"))
+    assert index.lookup(folder, Path("PyLadies/missing.mp4")) is None
+    assert index.lookup(folder, Path("PyLadies")) is None
+    assert index.folders_scanned == 1
+
+    assert index.lookup(tmp_path / "2024-09-17", Path("abc.mp4")) is None
+    assert index.folders_scanned == 2
+
+
+def test_dated_folder_destination_scans_once(tmp_path: Path) -> None:
+    dest = destination.DatedFolderDestination(prefix=tmp_path / "destination")
+    files = []
+    for name in ("abc.mp4", "abc.srt", "abc.txt"):
+        file = File(path=tmp_path / "source" / name)
+        file.path.parent.mkdir(parents=True, exist_ok=True)
+        file.path.touch()
+        files.append(file)
+    file_set = FileSet(
+        files=files,
+        stem="abc",
+        prefix=Path(""),
+        volume_path=tmp_path / "source",
+        volume_identifier="abc",
+    )
+    with unittest.mock.patch(
+        "sync_camera_disk.destination.os.scandir", wraps=os.scandir
+    ) as mock_scandir:
+        operations = list(dest.generate_operations(file_set=file_set))
+    assert [o.operation for o in operations] == [OperationType.copy] * 3
+    assert mock_scandir.call_count == 1
+
+
+def test_dated_folder_destination_claims(tmp_path: Path) -> None:
+    """Cards planned at the same time only copy one file to each path"""
+    claims = destination.DestinationClaims()
+    counters: collections.Counter[str] = collections.Counter()
+    operations: list[Operation] = []
+    for card in ("card1", "card2"):
+        file = File(path=tmp_path / card / "DCIM/100GOPRO/GX010001.MP4")
+        file.path.parent.mkdir(parents=True)
+        file.path.write_text(card)
+        os.utime(file.path, (1_726_000_000, 1_726_000_000))
+        dest = destination.DatedFolderDestination(
+            prefix=tmp_path / "destination", claims=claims
+        )
+        operations.extend(
+            dest.generate_operations(
+                file_set=FileSet(
+                    files=[file],
+                    stem="0001",
+                    prefix=Path("DCIM/100GOPRO"),
+                    volume_path=tmp_path / card,
+                    volume_identifier=card,
+                ),
+                counters=counters,
+            )
+        )
+    assert [o.operation for o in operations] == [
+        OperationType.copy,
+        OperationType.unknown,
+    ]
+    assert operations[0].destination == operations[1].destination
+    assert counters["destination_claimed"] == 1
+
+
+def test_is_file_identical_cache_uses_known_stats(tmp_path: Path) -> None:
+    original = tmp_path / "original" / "C0109.MP4"
+    original.parent.mkdir()
+    original.write_bytes(b"a" * 100)
+    copy = tmp_path / "copy" / "C0109.MP4"
+    copy.parent.mkdir()
+    shutil.copy2(original, copy)
+    stat_a, stat_b = original.stat(), copy.stat()
+
+    with (
+        HashCache(tmp_path / "cache.sqlite") as cache,
+        unittest.mock.patch.object(
+            Path, "stat", side_effect=AssertionError("stat called")
+        ),
+    ):
+        for check in (IdentityCheck.sample, IdentityCheck.full):
+            assert destination.is_file_identical(
+                original,
+                copy,
+                check=check,
+                sample_size=16,
+                cache=cache,
+                stat_a=stat_a,
+                stat_b=stat_b,
+            )
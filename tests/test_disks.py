@@ -5,7 +5,7 @@ from unittest.mock import patch
 
 import pytest
 
-from sync_camera_disk import disks, macos
+from sync_camera_disk import disks, linux, macos
 from sync_camera_disk.testing.examples import (
     ATEM_EXTREME_ISO_SDI_DISKUTIL_LIST,
     ATEM_EXTREME_ISO_SDI_PLIST_OUTPUT,
@@ -25,8 +25,13 @@ from sync_camera_disk.testing.examples import (
     GOPRO_10_PLIST_OUTPUT,
     INSTA360_GO_2_DISKUTIL_LIST,
     INSTA360_GO_2_PLIST_OUTPUT,
+    LINUX_GOPRO_10_SD_CARD_FILES,
+    LINUX_GOPRO_10_SD_CARD_SYMLINKS,
+    LINUX_SONY_SD_CARD_FILES,
+    LINUX_SONY_SD_CARD_SYMLINKS,
     SONY_SD_CARD_PLIST_OUTPUT,
     SONY_SD_DISKUTIL_LIST,
+    make_fake_root,
 )
 
 
@@ -234,3 +239,55 @@ def test_mac_disks_to_disk_mounts(
     ) as diskutil_list_physical_external_disks:
         diskutil_list_physical_external_disks.return_value = plist
         assert list(disks.list_disks()) == expected
+
+
+@pytest.mark.parametrize(
+    "files, symlinks, expected",
+    [
+        (
+            LINUX_SONY_SD_CARD_FILES,
+            LINUX_SONY_SD_CARD_SYMLINKS,
+            [
+                disks.DiskMount(
+                    path=Path("/media/mick/Untitled"),
+                    unique_identifier="0e23-9bc6",
+                    disk_size=127865454592,
+                    volume_size=127848677376,
+                    volume_name=None,
+                    volume_file_system="exfat",
+                ),
+            ],
+        ),
+        (
+            LINUX_GOPRO_10_SD_CARD_FILES,
+            LINUX_GOPRO_10_SD_CARD_SYMLINKS,
+            [
+                disks.DiskMount(
+                    path=Path("/media/mick/GOPRO CARD"),
+                    unique_identifier="vfat-63864569856-63864569856",
+                    disk_size=63864569856,
+                    volume_size=63864569856,
+                    volume_name="GOPRO CARD",
+                    volume_file_system="vfat",
+                ),
+            ],
+        ),
+    ],
+    ids=["sony", "gopro_10"],
+)
+def test_linux_disks_to_disk_mounts(
+    files: dict[str, str],
+    symlinks: dict[str, str],
+    expected: list[disks.DiskMount],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    linux_disks = linux.read_linux_disks(make_fake_root(tmp_path, files, symlinks))
+    assert list(disks.linux_disks_to_disk_mounts(linux_disks)) == expected
+
+    monkeypatch.setattr(sys, "platform", "linux")
+
+    assert list(disks.list_disks(linux_disks.json().encode())) == expected
+    with patch("sync_camera_disk.disks.linux.read_linux_disks") as read_linux_disks:
+        read_linux_disks.return_value = linux_disks
+        assert list(disks.list_disks()) == expected
@@ -0,0 +1,189 @@
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from sync_camera_disk import executor, operation
+
+
+def make_operation(
+    name: str, operation_type: operation.OperationType = operation.OperationType.copy
+) -> operation.Operation:
+    return operation.Operation(
+        operation=operation_type,
+        source=Path("/source") / name,
+        destination=Path("/destination") / name,
+    )
+
+
+class ConcurrencyTracker:
+    """Fake perform_operation which records the most operations seen at once"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(
+        self, op: operation.Operation, dry_run: bool, **kwargs: Any
+    ) -> operation.OperationResult:
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        with self.lock:
+            self.running -= 1
+        return operation.OperationResult(
+            operation=op,
+            success=True,
+            exception=None,
+            error=None,
+            dry_run=dry_run,
+        )
+
+
+def test_executor_returns_all_results_with_tags() -> None:
+    tracker = ConcurrencyTracker()
+    with executor.OperationExecutor[int](
+        max_workers=4, max_pending=2, dry_run=False, perform=tracker
+    ) as pool:
+        results: list[tuple[int, operation.OperationResult]] = []
+        for i in range(10):
+            pool.submit(
+                i,
+                make_operation(f"file{i}"),
+                source=(f"card{i % 2}", 4),
+                destination=("nas", 4),
+            )
+            results.extend(pool.completed())
+        results.extend(pool.wait())
+
+    assert sorted(tag for tag, _ in results) == list(range(10))
+    for tag, result in results:
+        assert result.success
+        assert result.operation.source == Path(f"/source/file{tag}")
+
+
+def test_executor_respects_source_limit() -> None:
+    tracker = ConcurrencyTracker()
+    with executor.OperationExecutor[None](
+        max_workers=8, dry_run=False, perform=tracker
+    ) as pool:
+        for i in range(8):
+            pool.submit(
+                None,
+                make_operation(f"file{i}"),
+                source=("card", 1),
+                destination=("nas", 8),
+            )
+        results = list(pool.wait())
+    assert len(results) == 8
+    assert tracker.max_running == 1
+
+
+def test_executor_respects_destination_limit() -> None:
+    tracker = ConcurrencyTracker()
+    with executor.OperationExecutor[None](
+        max_workers=8, dry_run=False, perform=tracker
+    ) as pool:
+        for i in range(8):
+            pool.submit(
+                None,
+                make_operation(f"file{i}", operation.OperationType.copy_stat),
+                source=(f"card{i}", 8),
+                destination=("nas", 2),
+            )
+        results = list(pool.wait())
+    assert len(results) == 8
+    assert tracker.max_running <= 2
+
+
+def test_executor_identical_operations_skip_limits() -> None:
+    tracker = ConcurrencyTracker()
+    with executor.OperationExecutor[None](
+        max_workers=4, dry_run=False, perform=tracker
+    ) as pool:
+        for i in range(8):
+            pool.submit(
+                None,
+                make_operation(f"file{i}", operation.OperationType.identical),
+                source=("card", 1),
+                destination=("nas", 1),
+            )
+        results = list(pool.wait())
+    assert len(results) == 8
+    assert tracker.max_running > 1
+
+
+class OrderTracker:
+    """Fake perform_operation which records the order operations start in"""
+
+    def __init__(self) -> None:
+        self.started: list[str] = []
+
+    def __call__(
+        self, op: operation.Operation, dry_run: bool, **kwargs: Any
+    ) -> operation.OperationResult:
+        self.started.append(op.source.name)
+        time.sleep(0.02)
+        return operation.OperationResult(operation=op, success=True, dry_run=dry_run)
+
+
+def test_executor_busy_source_does_not_block_others() -> None:
+    tracker = OrderTracker()
+    with executor.OperationExecutor[None](
+        max_workers=2, dry_run=False, perform=tracker
+    ) as pool:
+        for i in range(3):
+            pool.submit(
+                None, make_operation(f"a{i}"), source=("a", 1), destination=("nas", 4)
+            )
+        for i in range(3):
+            pool.submit(
+                None, make_operation(f"b{i}"), source=("b", 2), destination=("nas", 4)
+            )
+        list(pool.wait())
+    # a only gets one reader, so b gets the other worker straight away
+    assert tracker.started[:2] == ["a0", "b0"]
+
+
+def test_executor_shares_bytes_between_sources() -> None:
+    tracker = OrderTracker()
+    with executor.OperationExecutor[None](
+        max_workers=1, dry_run=False, perform=tracker
+    ) as pool:
+        for i in range(3):
+            pool.submit(
+                None,
+                make_operation(f"clip{i}"),
+                source=("video", 4),
+                destination=("nas", 4),
+                size=1000,
+            )
+        for i in range(3):
+            pool.submit(
+                None,
+                make_operation(f"photo{i}"),
+                source=("photos", 4),
+                destination=("nas", 4),
+                size=10,
+            )
+        list(pool.wait())
+    assert tracker.started == ["clip0", "photo0", "photo1", "photo2", "clip1", "clip2"]
+
+
+def test_executor_completed_waits_until_woken() -> None:
+    with executor.OperationExecutor[int](max_workers=1) as pool:
+        # Nothing outstanding, still waits for the timeout rather than spinning
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        assert list(pool.completed(timeout=0.2)) == []
+        assert time.perf_counter() - start >= 0.2
+        assert time.process_time() - cpu_start < 0.1
+
+        timer = threading.Timer(0.05, pool.wake)
+        timer.start()
+        start = time.perf_counter()
+        assert list(pool.completed(timeout=10)) == []
+        assert time.perf_counter() - start < 5
+        timer.join()
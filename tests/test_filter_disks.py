@@ -1,7 +1,16 @@
 from pathlib import Path
 
+import pytest
+
 from sync_camera_disk import filter_disks
-from sync_camera_disk.config import Config, Destination, Source, SourceType, Sync
+from sync_camera_disk.config import (
+    Config,
+    Destination,
+    MatchType,
+    Source,
+    SourceType,
+    Sync,
+)
 from sync_camera_disk.disks import DiskMount
 
 
@@ -96,3 +105,40 @@ def test_filter_disks_to_syncs() -> None:
         (example_sync, example_disk_mount),
         (example_identifier_match_sync, example_identifier_match_disk_mount),
     ]
+
+
+def test_filter_disks_to_syncs_match_on() -> None:
+    identifier_sync = Sync(
+        destination=Destination(path="/tmp/identifier"),
+        source=Source(
+            identifier="example",
+            type=SourceType.gopro_10,
+            match_on=[MatchType.identifier],
+        ),
+    )
+    size_sync = Sync(
+        destination=Destination(path="/tmp/size"),
+        source=Source(
+            identifier=None,
+            type=SourceType.atomos,
+            disk_size=1234,
+            match_on=[MatchType.disk_size],
+        ),
+    )
+    config = Config(syncs=[size_sync, identifier_sync])
+    index = filter_disks.SyncIndex(config)
+    example = DiskMount(path=Path("/Volumes/A"), unique_identifier="example")
+    sized = DiskMount(path=Path("/Volumes/B"), unique_identifier="b", disk_size=1234)
+    both = DiskMount(
+        path=Path("/Volumes/C"), unique_identifier="example", disk_size=1234
+    )
+
+    assert index.lookup(example) == [1]
+    assert index.lookup(both) == [0, 1]
+    assert list(
+        filter_disks.filter_disks_to_syncs(config, [example, sized], index=index)
+    ) == [(size_sync, sized), (identifier_sync, example)]
+
+    # Two disks matching the same sync is ambiguous
+    with pytest.raises(AssertionError):
+        list(filter_disks.filter_disks_to_syncs(config, [example, both], index=index))
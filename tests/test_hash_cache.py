@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+from unittest import mock
+
+from sync_camera_disk import destination, hash_cache
+from sync_camera_disk.config import IdentityCheck
+from sync_camera_disk.hashing import HashAlgorithm
+
+
+def test_hash_cache_get_put(tmp_path: Path) -> None:
+    path = tmp_path / "C0109.MP4"
+    path.write_text("ham")
+    with hash_cache.HashCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get(path.stat(), HashAlgorithm.blake2b, "full") is None
+        cache.put(path.stat(), HashAlgorithm.blake2b, "full", "abc")
+        assert cache.get(path.stat(), HashAlgorithm.blake2b, "full") == "abc"
+        assert cache.get(path.stat(), HashAlgorithm.xxh3_128, "full") is None
+        assert cache.get(path.stat(), HashAlgorithm.blake2b, "sample:16") is None
+        assert (cache.hits, cache.misses) == (1, 3)
+
+    # Persisted
+    with hash_cache.HashCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get(path.stat(), HashAlgorithm.blake2b, "full") == "abc"
+
+        # Modified files miss
+        path.write_text("jam")
+        os.utime(path, ns=(1, 1))
+        assert cache.get(path.stat(), HashAlgorithm.blake2b, "full") is None
+
+
+def test_hash_cache_get_or_compute(tmp_path: Path) -> None:
+    path = tmp_path / "C0109.MP4"
+    path.write_text("ham")
+    compute = mock.Mock(return_value="abc")
+    with hash_cache.HashCache(tmp_path / "cache.sqlite") as cache:
+        for _ in range(3):
+            assert (
+                cache.get_or_compute(path, HashAlgorithm.blake2b, "full", compute)
+                == "abc"
+            )
+    compute.assert_called_once_with()
+
+
+def test_hash_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"C010{i}.MP4"
+        path.write_text("ham")
+        paths.append(path)
+    with hash_cache.HashCache(tmp_path / "cache.sqlite", max_entries=2) as cache:
+        for path in paths:
+            cache.put(path.stat(), HashAlgorithm.blake2b, "full", path.name)
+        # Touch the oldest so it survives
+        cache.get(paths[0].stat(), HashAlgorithm.blake2b, "full")
+
+    with hash_cache.HashCache(tmp_path / "cache.sqlite", max_entries=2) as cache:
+        found = [
+            cache.get(path.stat(), HashAlgorithm.blake2b, "full") for path in paths
+        ]
+    assert found == ["C0100.MP4", None, None, "C0103.MP4"]
+
+
+def test_is_file_identical_uses_cache(tmp_path: Path) -> None:
+    a = tmp_path / "a" / "C0109.MP4"
+    b = tmp_path / "b" / "C0109.MP4"
+    a.parent.mkdir()
+    b.parent.mkdir()
+    a.write_bytes(b"a" * 100)
+    b.write_bytes(b"a" * 100)
+    with hash_cache.HashCache(tmp_path / "cache.sqlite") as cache:
+        for _ in range(2):
+            assert destination.is_file_identical(
+                a, b, check=IdentityCheck.full, sample_size=16, cache=cache
+            )
+        # sample and full digests for both files, then all hits the second time
+        assert (cache.hits, cache.misses) == (4, 4)
@@ -0,0 +1,31 @@
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from sync_camera_disk import hashing
+
+
+def test_hash_file_blake2b(tmp_path: Path) -> None:
+    path = tmp_path / "A7401412.ARW"
+    path.write_bytes(b"ham" * 100_000)
+    assert hashing.hash_file(path) == hashlib.blake2b(b"ham" * 100_000).hexdigest()
+
+
+def test_hash_fd_range(tmp_path: Path) -> None:
+    path = tmp_path / "A7401412.ARW"
+    path.write_bytes(b"0123456789")
+    hasher = hashing.new_hasher(hashing.HashAlgorithm.blake2b)
+    with path.open("rb") as fp:
+        hashing.hash_fd(fp.fileno(), hasher, start=2, length=5)
+    assert hasher.hexdigest() == hashlib.blake2b(b"23456").hexdigest()
+
+
+def test_hash_file_xxh3_128(tmp_path: Path) -> None:
+    xxhash = pytest.importorskip("xxhash")
+    path = tmp_path / "A7401412.ARW"
+    path.write_bytes(b"ham")
+    assert (
+        hashing.hash_file(path, hashing.HashAlgorithm.xxh3_128)
+        == xxhash.xxh3_128(b"ham").hexdigest()
+    )
@@ -0,0 +1,89 @@
+from pathlib import Path
+
+from sync_camera_disk import linux
+from sync_camera_disk.testing.examples import (
+    LINUX_GOPRO_10_SD_CARD_FILES,
+    LINUX_GOPRO_10_SD_CARD_SYMLINKS,
+    LINUX_SONY_SD_CARD_FILES,
+    LINUX_SONY_SD_CARD_SYMLINKS,
+    make_fake_root,
+)
+
+
+def test_parse_mountinfo() -> None:
+    assert linux.parse_mountinfo(
+        "\n".join(
+            [
+                "26 1 259:2 / / rw,relatime shared:1 - ext4 /dev/nvme0n1p2 rw",
+                "612 26 179:0 / /media/GOPRO\\040CARD rw shared:340 - vfat"
+                " /dev/mmcblk0 rw",
+                "530 26 8:17 /DCIM /srv/dcim rw shared:301 - exfat /dev/sdb1 rw",
+                "",
+            ]
+        )
+    ) == [
+        linux.Mount(device="259:2", mount_point=Path("/"), file_system="ext4"),
+        linux.Mount(
+            device="179:0",
+            mount_point=Path("/media/GOPRO CARD"),
+            file_system="vfat",
+        ),
+    ]
+
+
+def test_read_linux_disks(tmp_path: Path) -> None:
+    root = make_fake_root(
+        tmp_path, LINUX_SONY_SD_CARD_FILES, LINUX_SONY_SD_CARD_SYMLINKS
+    )
+    linux_disks = linux.read_linux_disks(root)
+    assert linux_disks.block_devices == [
+        linux.BlockDevice(
+            name="nvme0n1p1",
+            device="259:1",
+            size=536870912,
+            disk="nvme0n1",
+            disk_size=512110190592,
+            external=False,
+        ),
+        linux.BlockDevice(
+            name="nvme0n1p2",
+            device="259:2",
+            size=511572254208,
+            disk="nvme0n1",
+            disk_size=512110190592,
+            external=False,
+        ),
+        linux.BlockDevice(
+            name="sdb1",
+            device="8:17",
+            size=127848677376,
+            disk="sdb",
+            disk_size=127865454592,
+            external=True,
+        ),
+    ]
+    assert linux_disks.uuids == {
+        "sdb1": "0E23-9BC6",
+        "nvme0n1p1": "A1B2-C3D4",
+        "nvme0n1p2": "4a7c36f2-5f3e-4b5e-a1d2-3c0e6e7f8a91",
+    }
+    assert linux_disks.labels == {}
+
+
+def test_read_linux_disks_unpartitioned(tmp_path: Path) -> None:
+    root = make_fake_root(
+        tmp_path, LINUX_GOPRO_10_SD_CARD_FILES, LINUX_GOPRO_10_SD_CARD_SYMLINKS
+    )
+    linux_disks = linux.read_linux_disks(root)
+    assert linux_disks.block_devices == [
+        linux.BlockDevice(
+            name="mmcblk0",
+            device="179:0",
+            size=63864569856,
+            disk="mmcblk0",
+            disk_size=63864569856,
+            external=True,
+        ),
+    ]
+    assert linux_disks.uuids == {}
+    assert linux_disks.labels == {"mmcblk0": "GOPRO CARD"}
@@ -0,0 +1,66 @@
+import logging
+from typing import Generator
+
+import pytest
+import structlog
+
+from sync_camera_disk import logs
+
+
+@pytest.fixture(autouse=True)
+def reset_logging() -> Generator[None, None, None]:
+    yield
+    logs._stop_log_renderer()
+    structlog.reset_defaults()
+
+
+@pytest.mark.parametrize("buffered", [True, False])
+def test_configure_logging(capsys: pytest.CaptureFixture[str], buffered: bool) -> None:
+    logs.configure_logging(logging.INFO, buffered=buffered)
+    log = structlog.get_logger()
+    log.info("hello", name="world")
+    log.debug("hidden")
+    logs._stop_log_renderer()
+
+    out = capsys.readouterr().out
+    assert "hello" in out
+    assert "world" in out
+    assert "hidden" not in out
+
+
+def test_buffered_logging_json(capsys: pytest.CaptureFixture[str]) -> None:
+    logs.configure_logging(logging.INFO, use_json=True)
+    log = structlog.get_logger()
+    for i in range(100):
+        log.info("event", i=i)
+    logs._stop_log_renderer()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 100
+    assert lines[-1].startswith('{"i": 99, "event": "event", "level": "info"')
+
+
+def test_buffered_logging_exception(capsys: pytest.CaptureFixture[str]) -> None:
+    logs.configure_logging(logging.INFO)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        structlog.get_logger().exception("failed")
+    logs._stop_log_renderer()
+
+    out = capsys.readouterr().out
+    assert "failed" in out
+    assert "ValueError" in out
+    assert "boom" in out
+
+
+def test_buffered_logging_render_error(capsys: pytest.CaptureFixture[str]) -> None:
+    def renderer(logger: object, name: str, event_dict: object) -> str:
+        raise RuntimeError("broken")
+
+    log_renderer = logs.LogRenderer([renderer])
+    log_renderer.start()
+    log_renderer.logger_factory().info(event="first")
+    log_renderer.stop()
+
+    assert "Couldn't render log event {'event': 'first'}" in capsys.readouterr().out
@@ -1,12 +1,18 @@
+import collections
 import json
+import subprocess
 import sys
+import threading
 import unittest.mock
 from pathlib import Path
 
 import pydantic_yaml
 import pytest
+import typer.testing
 
-from sync_camera_disk import config, main
+from sync_camera_disk import config, main, plan, watch
+from sync_camera_disk.disks import DiskMount
+from sync_camera_disk.operation import Operation, OperationType
 
 
 def test_diskutil_list_physical_external_disks(
@@ -38,5 +44,222 @@ def test_sync_smoketest(capsys: pytest.CaptureFixture[str], tmp_path: Path) -> N
     with config_path.open("w") as fp:
         fp.write(pydantic_yaml.to_yaml_str(config.Config(syncs=[])))
 
-    main.sync(config_path=config_path, dry_run=True)
+    main.sync(
+        config_path=config_path,
+        dry_run=True,
+        hash_cache_path=tmp_path / "hashes.sqlite",
+        manifest_path=tmp_path / "manifest.sqlite",
+        config_cache_path=tmp_path / "config-cache",
+        results_path=tmp_path / "results.jsonl",
+    )
     assert "config=Config(syncs=[])" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "command", ["list-disks", "show-syncs", "sync", "apply", "watch", "report"]
+)
+def test_command_help(command: str) -> None:
+    result = typer.testing.CliRunner().invoke(main.app, [command, "--help"])
+    assert result.exit_code == 0, result.output
+
+
+def test_watch(tmp_path: Path) -> None:
+    config_path = tmp_path / "config.yaml"
+    sync = config.Sync(
+        source=config.Source(identifier="abc", type=config.SourceType.gopro_10),
+        destination=config.Destination(path=tmp_path),
+    )
+    with config_path.open("w") as fp:
+        fp.write(pydantic_yaml.to_yaml_str(config.Config(syncs=[sync])))
+    card = DiskMount(path=Path("/Volumes/Untitled"), unique_identifier="abc")
+    other = DiskMount(path=Path("/Volumes/Other"), unique_identifier="def")
+
+    with (
+        unittest.mock.patch(
+            "sync_camera_disk.watch.watch_mounts", return_value=iter(range(4))
+        ),
+        unittest.mock.patch(
+            "sync_camera_disk.main.sync_camera_disk.disks.list_disks",
+            side_effect=[[card], [card, other], [other], [card, other]],
+        ),
+        unittest.mock.patch(
+            "sync_camera_disk.syncing.run_syncs",
+            return_value=(collections.Counter(), []),
+        ) as mock_run_syncs,
+    ):
+        main.watch(
+            config_path=config_path,
+            hash_cache_path=tmp_path / "hashes.sqlite",
+            manifest_path=tmp_path / "manifest.sqlite",
+            config_cache_path=tmp_path / "config-cache",
+            results_path=tmp_path / "results.jsonl",
+        )
+    # Synced when first seen and again after being removed and reinserted
+    assert [call.args[0] for call in mock_run_syncs.call_args_list] == [
+        [(sync, card)],
+        [(sync, card)],
+    ]
+
+
+def test_watch_retries_failed_sync(tmp_path: Path) -> None:
+    config_path = tmp_path / "config.yaml"
+    sync = config.Sync(
+        source=config.Source(identifier="abc", type=config.SourceType.gopro_10),
+        destination=config.Destination(path=tmp_path),
+    )
+    with config_path.open("w") as fp:
+        fp.write(pydantic_yaml.to_yaml_str(config.Config(syncs=[sync])))
+    card = DiskMount(path=Path("/Volumes/Untitled"), unique_identifier="abc")
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text("26 1 259:2 / / rw - ext4 /dev/nvme0n1p2 rw\n")
+
+    class Stop(Exception):
+        pass
+
+    def synced(
+        *args: object, **kwargs: object
+    ) -> tuple[collections.Counter[str], list[object]]:
+        # Change the mounts so the watcher yields once more and the test can stop
+        with mountinfo.open("a") as fp:
+            fp.write("512 26 8:17 / /media/other rw - exfat /dev/sdb1 rw\n")
+        return collections.Counter(), []
+
+    errors: list[BaseException] = []
+
+    def run() -> None:
+        try:
+            main.watch(
+                config_path=config_path,
+                hash_cache_path=tmp_path / "hashes.sqlite",
+                manifest_path=tmp_path / "manifest.sqlite",
+                config_cache_path=tmp_path / "config-cache",
+                results_path=tmp_path / "results.jsonl",
+            )
+        except BaseException as e:
+            errors.append(e)
+
+    with (
+        # Nothing changes in mountinfo until the sync succeeds, only the retry
+        # makes the real watcher yield again
+        unittest.mock.patch(
+            "sync_camera_disk.watch.watch_mounts",
+            side_effect=lambda interval, retry: watch.watch_mountinfo(
+                mountinfo, interval=0.01, retry=retry
+            ),
+        ),
+        unittest.mock.patch(
+            "sync_camera_disk.main.sync_camera_disk.disks.list_disks",
+            side_effect=[[card], [card], Stop()],
+        ),
+        unittest.mock.patch(
+            "sync_camera_disk.syncing.run_syncs",
+            side_effect=[OSError("NAS offline"), synced],
+        ) as mock_run_syncs,
+    ):
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert [type(e) for e in errors] == [Stop]
+    # Retried at the next check, then left alone once synced
+    assert [call.args[0] for call in mock_run_syncs.call_args_list] == [
+        [(sync, card)],
+        [(sync, card)],
+    ]
+
+
+# Modules only some commands need, which shouldn't slow down the rest
+DEFERRED_MODULES = [
+    "pydantic_yaml",
+    "ruamel.yaml",
+    "rich.progress",
+    "sqlite3",
+    "sync_camera_disk.syncing",
+    "sync_camera_disk.executor",
+    "sync_camera_disk.destination",
+    "sync_camera_disk.hash_cache",
+    "sync_camera_disk.manifest",
+    "sync_camera_disk.results",
+]
+
+
+def test_import_budget() -> None:
+    # A fresh interpreter so modules imported by other tests don't count
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, sync_camera_disk.main; print(' '.join(sys.modules))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    imported = set(result.stdout.split())
+    assert [module for module in DEFERRED_MODULES if module in imported] == []
+
+
+def test_apply(tmp_path: Path) -> None:
+    source = tmp_path / "card" / "DCIM" / "100GOPRO" / "GX010001.MP4"
+    source.parent.mkdir(parents=True)
+    source.write_text("clip")
+    (tmp_path / "nas").mkdir()
+    destination = tmp_path / "nas" / "2024-09-16" / "DCIM" / "100GOPRO" / source.name
+    planned = plan.PlannedOperation(
+        operation=Operation(
+            operation=OperationType.copy, source=source, destination=destination
+        ),
+        volume_identifier="card",
+        volume_path=tmp_path / "card",
+        size=source.stat().st_size,
+        mtime_ns=source.stat().st_mtime_ns,
+        max_readers=2,
+        destination_root=tmp_path / "nas",
+        max_writers=4,
+    )
+    plan_path = tmp_path / "plan.jsonl"
+    with plan_path.open("w") as fp:
+        plan.write_plan([planned], fp)
+
+    results_path = tmp_path / "results.jsonl"
+    args = [
+        "apply",
+        str(plan_path),
+        "--no-hash-cache",
+        "--no-manifest",
+        "--results-path",
+        str(results_path),
+    ]
+    runner = typer.testing.CliRunner()
+    result = runner.invoke(main.app, [*args, "--shard-index", "1"])
+    assert result.exit_code == 2, result.output
+
+    result = runner.invoke(main.app, [*args, "--no-dry-run"])
+    assert result.exit_code == 0, result.output
+    assert destination.read_text() == "clip"
+
+    result = runner.invoke(
+        main.app, ["report", "--results-path", str(results_path), "--json"]
+    )
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["outcomes"] == [
+        {"operation": "copy", "outcome": "success", "count": 1}
+    ]
+
+
+def test_profile(tmp_path: Path) -> None:
+    result = typer.testing.CliRunner().invoke(
+        main.app,
+        [
+            "--profile",
+            "--profile-path",
+            str(tmp_path / "profiles"),
+            "report",
+            "--results-path",
+            str(tmp_path / "results.jsonl"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    # One folder per run, written once the command finishes
+    [profile] = (tmp_path / "profiles").iterdir()
+    assert profile.is_dir()
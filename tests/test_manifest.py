@@ -0,0 +1,61 @@
+import datetime
+import unittest.mock
+from pathlib import Path
+
+from sync_camera_disk import destination, manifest
+from sync_camera_disk.file import File, FileSet
+from sync_camera_disk.operation import OperationType
+
+
+def test_manifest_record(tmp_path: Path) -> None:
+    relative_path = Path("M4ROOT/CLIP/C0109.MP4")
+    destination_path = Path("/nas/2024-09-16/M4ROOT/CLIP/C0109.MP4")
+    with manifest.Manifest(tmp_path / "manifest.sqlite") as m:
+        assert not m.is_imported("abc", relative_path, 123, 456, destination_path)
+        m.record("abc", relative_path, 123, 456, destination_path)
+        assert m.is_imported("abc", relative_path, 123, 456, destination_path)
+
+    with manifest.Manifest(tmp_path / "manifest.sqlite") as m:
+        assert m.is_imported("abc", relative_path, 123, 456, destination_path)
+        # Different disk, size, mtime or destination
+        assert not m.is_imported("def", relative_path, 123, 456, destination_path)
+        assert not m.is_imported("abc", relative_path, 124, 456, destination_path)
+        assert not m.is_imported("abc", relative_path, 123, 457, destination_path)
+        assert not m.is_imported("abc", relative_path, 123, 456, Path("/elsewhere"))
+
+
+def test_dated_folder_destination_skips_imported(tmp_path: Path) -> None:
+    source = tmp_path / "source"
+    imported = File(path=source / "M4ROOT/CLIP/C0109.MP4")
+    imported.path.parent.mkdir(parents=True)
+    imported.path.write_text("ham")
+    date = datetime.date.today().isoformat()
+
+    with manifest.Manifest(tmp_path / "manifest.sqlite") as m:
+        stat = imported.path.stat()
+        m.record(
+            "abc",
+            Path("M4ROOT/CLIP/C0109.MP4"),
+            stat.st_size,
+            stat.st_mtime_ns,
+            tmp_path / "destination" / date / "M4ROOT/CLIP/C0109.MP4",
+        )
+        dest = destination.DatedFolderDestination(
+            prefix=tmp_path / "destination", manifest=m
+        )
+        with unittest.mock.patch(
+            "sync_camera_disk.destination.os.scandir"
+        ) as mock_scandir:
+            operations = list(
+                dest.generate_operations(
+                    FileSet(
+                        files=[imported],
+                        stem="C0109",
+                        prefix=Path("M4ROOT/CLIP"),
+                        volume_path=source,
+                        volume_identifier="abc",
+                    )
+                )
+            )
+        mock_scandir.assert_not_called()
+    assert [o.operation for o in operations] == [OperationType.identical]
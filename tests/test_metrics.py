@@ -0,0 +1,77 @@
+import json
+from pathlib import Path
+
+from sync_camera_disk import metrics
+
+
+def test_histogram_buckets() -> None:
+    m = metrics.Metrics()
+    for value in (0.0005, 0.001, 0.2, 1000):
+        m.observe("phase_seconds", value, phase="plan")
+
+    [result] = m.to_json()["sync_camera_disk_phase_seconds"]
+    assert result["labels"] == {"phase": "plan"}
+    assert result["count"] == 4
+    assert result["sum"] == 0.0005 + 0.001 + 0.2 + 1000
+    # Values equal to a bound count in its bucket
+    assert result["buckets"]["0.001"] == 2
+    assert result["buckets"]["0.1"] == 2
+    assert result["buckets"]["0.5"] == 3
+    assert result["buckets"]["300.0"] == 3
+    assert result["buckets"]["+Inf"] == 4
+
+
+def test_timed() -> None:
+    m = metrics.Metrics()
+    assert list(m.timed(iter("abc"), "phase_seconds", phase="enumerate")) == [
+        "a",
+        "b",
+        "c",
+    ]
+    assert m.to_json()["sync_camera_disk_phase_seconds"][0]["count"] == 3
+
+
+def test_to_prometheus() -> None:
+    m = metrics.Metrics()
+    m.observe("operation_bytes", 2048, operation="copy")
+    m.observe("operation_seconds", 0.02, operation="copy")
+    m.observe("operation_seconds", 0.02, operation='we"ird')
+
+    text = m.to_prometheus()
+    lines = text.splitlines()
+    assert lines[:2] == [
+        "# HELP sync_camera_disk_operation_bytes Bytes copied by each operation",
+        "# TYPE sync_camera_disk_operation_bytes histogram",
+    ]
+    assert (
+        'sync_camera_disk_operation_bytes_bucket{operation="copy",le="1024.0"} 0'
+        in lines
+    )
+    assert (
+        'sync_camera_disk_operation_bytes_bucket{operation="copy",le="4096.0"} 1'
+        in lines
+    )
+    assert (
+        'sync_camera_disk_operation_bytes_bucket{operation="copy",le="+Inf"} 1' in lines
+    )
+    assert 'sync_camera_disk_operation_bytes_sum{operation="copy"} 2048.0' in lines
+    assert 'sync_camera_disk_operation_seconds_count{operation="copy"} 1' in lines
+    assert 'sync_camera_disk_operation_seconds_count{operation="we\\"ird"} 1' in lines
+    # One HELP and TYPE per metric, not per set of labels
+    assert text.count("# TYPE") == 2
+    assert text.endswith("\n")
+
+
+def test_write_metrics(tmp_path: Path) -> None:
+    m = metrics.Metrics()
+    with m.time("phase_seconds", phase="list_disks"):
+        pass
+
+    metrics.write_metrics(m, tmp_path / "metrics.json", tmp_path / "sync.prom")
+
+    assert json.loads((tmp_path / "metrics.json").read_text()) == m.to_json()
+    assert (tmp_path / "sync.prom").read_text() == m.to_prometheus()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "metrics.json",
+        "sync.prom",
+    ]
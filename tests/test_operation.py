@@ -70,9 +70,10 @@ EXAMPLE_UNKNOWN_OPERATION = operation.Operation(
                 success=False,
                 exception="NotImplementedError",
                 error=(
-                    "operation=<OperationType.unknown: 'unknown'> "
-                    "source=PosixPath('/source/foo') "
-                    "destination=PosixPath('/destination/bar')"
+                    "Operation(operation=<OperationType.unknown: 'unknown'>, "
+                    "source=PosixPath('/source/foo'), "
+                    "destination=PosixPath('/destination/bar'), "
+                    "digest_algorithm=None, digest=None)"
                 ),
                 dry_run=False,
             ),
@@ -135,3 +136,11 @@ def test_copy_recursively() -> None:
             "/Volumes/Cameras/ATEM SDI Extreme ISO/2024-09-16/PyLadies/Video ISO Files/PyLadies CAM 1 01.mp4"
         ),
     )
+
+
+def test_operation_is_slotted() -> None:
+    # Created for every file on a card, so no per instance __dict__
+    assert not hasattr(EXAMPLE_COPY_OPERATION, "__dict__")
+    assert not hasattr(
+        operation.perform_operation(EXAMPLE_IDENTICAL_OPERATION), "__dict__"
+    )
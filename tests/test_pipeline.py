@@ -0,0 +1,41 @@
+import threading
+from typing import Iterator
+
+import pytest
+
+from sync_camera_disk import pipeline
+
+
+def test_prefetch() -> None:
+    assert list(pipeline.prefetch(range(100), maxsize=2)) == list(range(100))
+
+
+def test_prefetch_raises() -> None:
+    def items() -> Iterator[int]:
+        yield 1
+        raise ValueError("ham")
+
+    prefetched = pipeline.prefetch(items())
+    assert next(prefetched) == 1
+    with pytest.raises(ValueError, match="ham"):
+        next(prefetched)
+
+
+def test_prefetch_stops_producer() -> None:
+    produced = []
+    finished = threading.Event()
+
+    def items() -> Iterator[int]:
+        try:
+            for i in range(1000):
+                produced.append(i)
+                yield i
+        finally:
+            finished.set()
+
+    prefetched = pipeline.prefetch(items(), maxsize=2)
+    assert next(prefetched) == 0
+    prefetched.close()
+    assert finished.wait(timeout=5)
+    # Never more than maxsize ahead of the consumer
+    assert len(produced) < 10
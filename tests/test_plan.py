@@ -0,0 +1,77 @@
+import io
+from pathlib import Path
+
+from sync_camera_disk import plan
+from sync_camera_disk.hashing import HashAlgorithm
+from sync_camera_disk.operation import Operation, OperationType
+
+
+def planned(
+    name: str, operation: OperationType = OperationType.copy, volume: str = "abc"
+) -> plan.PlannedOperation:
+    return plan.PlannedOperation(
+        operation=Operation(
+            operation=operation,
+            source=Path(f"/Volumes/{volume}/DCIM/100GOPRO/{name}"),
+            destination=Path(f"/nas/2024-09-16/DCIM/100GOPRO/{name}"),
+        ),
+        volume_identifier=volume,
+        volume_path=Path(f"/Volumes/{volume}"),
+        size=1234,
+        mtime_ns=1_600_000_000_000_000_000,
+        max_readers=2,
+        destination_root=Path("/nas"),
+        max_writers=4,
+    )
+
+
+def test_round_trip() -> None:
+    planned_operations = [
+        planned("GX010001.MP4"),
+        planned("GX010001.THM", OperationType.identical),
+    ]
+    planned_operations[1].operation.digest_algorithm = HashAlgorithm.blake2b
+    planned_operations[1].operation.digest = "abc123"
+    fp = io.StringIO()
+    assert plan.write_plan(planned_operations, fp) == 2
+    assert len(fp.getvalue().splitlines()) == 2
+
+    fp.seek(0)
+    assert list(plan.read_plan(fp)) == planned_operations
+
+
+def test_read_plan_filters() -> None:
+    planned_operations = [
+        planned("GX010001.MP4"),
+        planned("GX010001.THM", OperationType.identical),
+        planned("GX010002.MP4", volume="def"),
+    ]
+    fp = io.StringIO()
+    plan.write_plan(planned_operations, fp)
+
+    fp.seek(0)
+    assert list(plan.read_plan(fp, operations=[OperationType.copy])) == [
+        planned_operations[0],
+        planned_operations[2],
+    ]
+    fp.seek(0)
+    assert list(plan.read_plan(fp, volume_identifiers=["def"])) == [
+        planned_operations[2]
+    ]
+
+
+def test_read_plan_shards() -> None:
+    planned_operations = [planned(f"GX01{i:04}.MP4") for i in range(100)]
+    fp = io.StringIO()
+    plan.write_plan(planned_operations, fp)
+
+    shards = []
+    for index in range(3):
+        fp.seek(0)
+        shards.append(list(plan.read_plan(fp, shard=(index, 3))))
+    # Every operation is in exactly one shard
+    assert (
+        sorted((p for shard in shards for p in shard), key=lambda p: p.operation.source)
+        == planned_operations
+    )
+    assert all(shards)
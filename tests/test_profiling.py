@@ -0,0 +1,83 @@
+import pstats
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from sync_camera_disk import profiling
+
+
+@pytest.fixture(autouse=True)
+def stop_profiling() -> Iterator[None]:
+    yield
+    profiling.stop()
+
+
+def enumerate_files(count: int) -> Iterator[int]:
+    for i in range(count):
+        time.sleep(0.005)
+        yield i
+
+
+def plan_file(i: int) -> int:
+    time.sleep(0.005)
+    return i * 2
+
+
+def sync_card() -> None:
+    for i in profiling.profiled(enumerate_files(5), "enumeration"):
+        with profiling.phase("planning"):
+            plan_file(i)
+
+
+def test_not_profiling() -> None:
+    items = [1, 2, 3]
+    assert profiling.profiled(items, "enumeration") is items
+    with profiling.phase("discovery"):
+        pass
+
+
+def test_profile_phases(tmp_path: Path) -> None:
+    profiler = profiling.start(tmp_path / "profile")
+    profiler.sample_interval = 0.001
+    with profiling.phase("discovery"):
+        time.sleep(0.01)
+    threads = [threading.Thread(target=sync_card) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    profiling.stop()
+
+    files = {path.name for path in (tmp_path / "profile").iterdir()}
+    for phase in ("discovery", "enumeration", "planning"):
+        assert f"{phase}.pstats" in files
+        assert f"{phase}.collapsed" in files
+
+    stats = pstats.Stats(str(tmp_path / "profile" / "planning.pstats"))
+    functions = stats.get_stats_profile().func_profiles
+    assert "plan_file" in functions
+    assert "enumerate_files" not in functions
+
+    collapsed = (tmp_path / "profile" / "enumeration.collapsed").read_text()
+    stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+    assert "enumerate_files (" in stack
+    assert "plan_file (" not in stack
+    assert int(count) > 0
+
+
+def test_profile_memory(tmp_path: Path) -> None:
+    profiling.start(tmp_path / "profile", memory=True)
+    with profiling.phase("enumeration"):
+        kept = [str(i) for i in range(10_000)]
+    profiling.stop()
+    assert kept
+
+    snapshot = tracemalloc.Snapshot.load(
+        str(tmp_path / "profile" / "enumeration.tracemalloc")
+    )
+    assert snapshot.statistics("filename")
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,32 @@
+from sync_camera_disk.progress import ByteProgress, byte_progress
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_byte_progress_batches_updates() -> None:
+    progress = byte_progress()
+    card = progress.add_task("card", total=1000)
+    destination = progress.add_task("destination", total=1000)
+    clock = FakeClock()
+    file_progress = ByteProgress(progress, [card, destination], 0.25, clock)
+
+    file_progress(100)
+    file_progress(100)
+    assert progress.tasks[card].completed == 0
+
+    clock.now = 0.3
+    file_progress(100)
+    assert progress.tasks[card].completed == 300
+    assert progress.tasks[destination].completed == 300
+
+    file_progress(50)
+    assert progress.tasks[card].completed == 300
+    file_progress.flush()
+    assert progress.tasks[card].completed == 350
+    assert progress.tasks[destination].completed == 350
@@ -0,0 +1,133 @@
+import itertools
+import json
+from pathlib import Path
+
+from sync_camera_disk import results
+from sync_camera_disk.copying import CopyBackend
+from sync_camera_disk.operation import Operation, OperationResult, OperationType
+
+
+def result(
+    name: str,
+    operation: OperationType = OperationType.copy,
+    error: Exception | None = None,
+    bytes_copied: int | None = 1000,
+) -> OperationResult:
+    return OperationResult(
+        operation=Operation(
+            operation=operation,
+            source=Path(f"/Volumes/abc/DCIM/100GOPRO/{name}"),
+            destination=Path(f"/nas/2024-09-16/DCIM/100GOPRO/{name}"),
+        ),
+        success=error is None,
+        dry_run=False,
+        exception=type(error).__name__ if error is not None else None,
+        error=str(error) if error is not None else None,
+        bytes_copied=bytes_copied if error is None else None,
+        backend=CopyBackend.sendfile if error is None else None,
+        seconds=0.5,
+    )
+
+
+def test_result_log(tmp_path: Path) -> None:
+    path = tmp_path / "logs" / "results.jsonl"
+    with results.ResultLog(path, clock=itertools.count().__next__) as result_log:
+        assert not path.exists()
+        result_log.record(result("GX010001.MP4"))
+        result_log.record(result("GX010002.MP4", error=OSError("No space")))
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["time"] for line in lines] == [0, 1]
+    assert lines[0]["source"] == "/Volumes/abc/DCIM/100GOPRO/GX010001.MP4"
+    assert lines[0]["bytes_copied"] == 1000
+    assert lines[0]["backend"] == "sendfile"
+    assert lines[0]["seconds"] == 0.5
+    assert lines[1]["success"] is False
+    assert lines[1]["exception"] == "OSError"
+
+
+def test_result_log_rotates(tmp_path: Path) -> None:
+    path = tmp_path / "results.jsonl"
+    with results.ResultLog(tmp_path / "one.jsonl", clock=lambda: 0) as result_log:
+        result_log.record(result("GX010000.MP4"))
+    line_size = (tmp_path / "one.jsonl").stat().st_size
+    # Two lines per log
+    with results.ResultLog(
+        path, max_bytes=line_size * 2, backups=2, clock=lambda: 0
+    ) as result_log:
+        for i in range(7):
+            result_log.record(result(f"GX01000{i}.MP4"))
+
+    assert results.rotated_paths(path, backups=2) == [
+        tmp_path / "results.jsonl.2",
+        tmp_path / "results.jsonl.1",
+        path,
+    ]
+    # Older logs than backups are dropped
+    sources = [
+        json.loads(line)["source"].rsplit("/", 1)[1]
+        for log_path in results.rotated_paths(path, backups=2)
+        for line in log_path.read_text().splitlines()
+    ]
+    assert sources == [f"GX01000{i}.MP4" for i in range(2, 7)]
+
+
+def test_result_log_shared_between_processes(tmp_path: Path) -> None:
+    with results.ResultLog(tmp_path / "one.jsonl", clock=lambda: 0) as result_log:
+        result_log.record(result("GX010000.MP4"))
+    line_size = (tmp_path / "one.jsonl").stat().st_size
+    path = tmp_path / "results.jsonl"
+    # Flush every line
+    clock = itertools.count(step=results.FLUSH_INTERVAL).__next__
+    # e.g. apply shards, each with its own log on the same path
+    logs = [
+        results.ResultLog(path, max_bytes=line_size * 4, backups=2, clock=clock)
+        for _ in range(2)
+    ]
+    for i in range(24):
+        logs[i % 2].record(result(f"GX0100{i:02}.MP4"))
+    for result_log in logs:
+        result_log.close()
+
+    # Rotated once per four lines, not by each log on its own
+    assert [
+        [
+            json.loads(line)["source"].rsplit("/", 1)[1]
+            for line in log_path.read_text().splitlines()
+        ]
+        for log_path in results.rotated_paths(path, backups=2)
+    ] == [[f"GX0100{i:02}.MP4" for i in range(j, j + 4)] for j in (12, 16, 20)]
+
+
+def test_summarise(tmp_path: Path) -> None:
+    older = tmp_path / "results.jsonl.1"
+    newer = tmp_path / "results.jsonl"
+    with results.ResultLog(older, clock=lambda: 10.0) as result_log:
+        result_log.record(result("GX010001.MP4"))
+        result_log.record(result("GX010002.MP4", error=OSError("No space")))
+    with results.ResultLog(newer, clock=lambda: 20.0) as result_log:
+        result_log.record(result("GX010001.THM", OperationType.identical, None, None))
+        result_log.record(result("GX010003.MP4", error=OSError("Gone")))
+        result_log.record(result("GX010004.MP4", error=ValueError("Bad")))
+
+    expected = {
+        "results": 5,
+        "failures": 3,
+        "outcomes": [
+            {"operation": "copy", "outcome": "failure", "count": 3},
+            {"operation": "copy", "outcome": "success", "count": 1},
+            {"operation": "identical", "outcome": "success", "count": 1},
+        ],
+        "bytes_copied": 1000,
+        "seconds": 2.5,
+        "backends": {"sendfile": 2},
+        "errors": [
+            {"exception": "OSError", "count": 2, "example": "No space"},
+            {"exception": "ValueError", "count": 1, "example": "Bad"},
+        ],
+        "first_time": 10.0,
+        "last_time": 20.0,
+    }
+    for workers in (1, 2):
+        summary = results.summarise([older, newer], workers=workers)
+        assert summary.to_json() == expected
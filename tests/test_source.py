@@ -1,13 +1,18 @@
+import collections
+import datetime
+import os
 import tempfile
+import unittest.mock
 from pathlib import Path
 from typing import Generator
 
 import pytest
 
-from sync_camera_disk import source
+from sync_camera_disk import destination, source
 from sync_camera_disk.config import SourceType
 from sync_camera_disk.disks import DiskMount
 from sync_camera_disk.file import File, FileSet
+from sync_camera_disk.operation import OperationType
 
 
 @pytest.fixture
@@ -653,3 +658,137 @@ def test_enumerate_source_files_fujifilm_xe5(disk_mount: DiskMount) -> None:
             volume_path=disk_mount.path,
         ),
     ]
+
+
+@pytest.mark.parametrize(
+    "path, pattern, matches, could_contain",
+    [
+        ("DCIM/100MEDIA/DJI_0123.MP4", "DCIM/100MEDIA/DJI_*", True, False),
+        ("DCIM/100MEDIA", "DCIM/100MEDIA/DJI_*", False, True),
+        ("DCIM/PANORAMA", "DCIM/100MEDIA/DJI_*", False, False),
+        ("DCIM/10030620/A7401412.ARW", "DCIM/**/*.[!.][!.][!.]", True, True),
+        ("DCIM/A7401412.ARW", "DCIM/**/*.[!.][!.][!.]", True, True),
+        ("DCIM/10030620/A7401412.XMLX", "DCIM/**/*.[!.][!.][!.]", False, True),
+        ("DCIM/a/b/c", "DCIM/**/*.[!.][!.][!.]", False, True),
+        ("PyLadies/Video ISO Files", "*/Video ISO Files/*.mp4", False, True),
+        ("SHOGUNU_S001_S001_T001.MOV", "SHOGUNU*", True, False),
+        ("Frame Grab", "SHOGUNU*", False, False),
+    ],
+)
+def test_path_matches(
+    path: str, pattern: str, matches: bool, could_contain: bool
+) -> None:
+    parts = path.split("/")
+    assert source.path_matches(parts, pattern) == matches
+    assert source.could_contain_matches(parts, pattern) == could_contain
+
+
+def test_enumerate_source_files_lists_directories_once(disk_mount: DiskMount) -> None:
+    dcim = disk_mount.path / "DCIM" / "10030620"
+    dcim.mkdir(parents=True)
+    (dcim / "A7401412.HIF").touch()
+    for m4prefix in (disk_mount.path, disk_mount.path / "private"):
+        clip = m4prefix / "M4ROOT" / "CLIP"
+        clip.mkdir(parents=True)
+        (clip / "C0109M01.XML").touch()
+    # Never looked at
+    (disk_mount.path / "AVF_INFO").mkdir()
+    (disk_mount.path / "AVF_INFO" / "AVIN0001.BNP").touch()
+
+    with unittest.mock.patch(
+        "sync_camera_disk.source.os.scandir", wraps=os.scandir
+    ) as mock_scandir:
+        file_sets = list(
+            source.enumerate_source_files(
+                source=disk_mount, source_type=SourceType.sony_a7_iv
+            )
+        )
+    # C0109 under M4ROOT and private/M4ROOT are in different folders
+    assert len(file_sets) == 3
+    listed = sorted(
+        str(Path(call.args[0]).relative_to(disk_mount.path))
+        for call in mock_scandir.call_args_list
+    )
+    assert listed == [
+        ".",
+        "DCIM",
+        "DCIM/10030620",
+        "M4ROOT",
+        "M4ROOT/CLIP",
+        "private",
+        "private/M4ROOT",
+        "private/M4ROOT/CLIP",
+    ]
+
+
+def test_enumerate_source_files_unknown(disk_mount: DiskMount) -> None:
+    with pytest.raises(NotImplementedError):
+        list(
+            source.enumerate_source_files(
+                source=disk_mount, source_type=SourceType.unknown
+            )
+        )
+
+
+def test_enumerate_source_files_streams(disk_mount: DiskMount) -> None:
+    for folder in ("100MEDIA", "101MEDIA"):
+        media = disk_mount.path / "DCIM" / folder
+        media.mkdir(parents=True)
+        (media / "DJI_0001.MP4").touch()
+        (media / "DJI_0001.SRT").touch()
+
+    file_sets = iter(
+        source.enumerate_source_files(
+            source=disk_mount, source_type=SourceType.sony_a7_iv
+        )
+    )
+    with unittest.mock.patch(
+        "sync_camera_disk.source.os.scandir", wraps=os.scandir
+    ) as mock_scandir:
+        # The first folder's FileSet is complete before the second is walked
+        first = next(file_sets)
+    listed = {Path(call.args[0]).name for call in mock_scandir.call_args_list}
+    assert len(listed & {"100MEDIA", "101MEDIA"}) == 1
+    assert len(first.files) == 2
+    second = next(file_sets)
+    assert len(second.files) == 2
+    assert {first.prefix, second.prefix} == {
+        Path("DCIM/100MEDIA"),
+        Path("DCIM/101MEDIA"),
+    }
+    assert list(file_sets) == []
+
+
+def test_enumerate_source_files_stats_once(
+    disk_mount: DiskMount, tmp_path: Path
+) -> None:
+    media = disk_mount.path / "DCIM" / "100MEDIA"
+    media.mkdir(parents=True)
+    (media / "DJI_0001.MP4").write_text("ham")
+    (media / "DJI_0001.SRT").write_text("jam")
+    dest = destination.DatedFolderDestination(prefix=tmp_path)
+    existing = (
+        dest.get_destination_folder(datetime.datetime.now())
+        / "DCIM/100MEDIA/DJI_0001.MP4"
+    )
+    existing.parent.mkdir(parents=True)
+    existing.write_text("ham")
+
+    counters: collections.Counter[str] = collections.Counter()
+    file_sets = list(
+        source.enumerate_source_files(
+            source=disk_mount, source_type=SourceType.dji_mini_3_pro, counters=counters
+        )
+    )
+    assert all(file.stat is not None for file in file_sets[0].files)
+    operations = [
+        operation
+        for file_set in file_sets
+        for operation in dest.generate_operations(file_set, counters=counters)
+    ]
+    assert sorted(o.operation for o in operations) == [
+        OperationType.copy,
+        OperationType.identical,
+    ]
+    assert counters["source_stat"] == 2
+    assert counters["source_stat_extra"] == 0
@@ -0,0 +1,226 @@
+import collections
+import os
+from pathlib import Path
+
+import structlog
+
+from sync_camera_disk import config, manifest, metrics, syncing
+from sync_camera_disk.disks import DiskMount
+
+
+def test_run_syncs_multiple_disks(tmp_path: Path) -> None:
+    syncs = []
+    for name in ("card1", "card2"):
+        media = tmp_path / name / "DCIM" / "100GOPRO"
+        media.mkdir(parents=True)
+        for i in range(3):
+            (media / f"GX01000{i}.MP4").write_text(f"{name} {i}")
+        (tmp_path / f"{name}-nas").mkdir()
+        syncs.append(
+            (
+                config.Sync(
+                    source=config.Source(
+                        identifier=name, type=config.SourceType.gopro_10
+                    ),
+                    destination=config.Destination(path=tmp_path / f"{name}-nas"),
+                ),
+                DiskMount(path=tmp_path / name, unique_identifier=name),
+            )
+        )
+
+    sync_metrics = metrics.Metrics()
+    counters, failures = syncing.run_syncs(
+        syncs, hash_cache=None, manifest=None, dry_run=False, metrics=sync_metrics
+    )
+    assert failures == []
+    assert counters["copy"] == 6
+    assert counters["success"] == 6
+    for name in ("card1", "card2"):
+        copied = sorted((tmp_path / f"{name}-nas").glob("*/DCIM/100GOPRO/*.MP4"))
+        assert [path.read_text() for path in copied] == [
+            f"{name} {i}" for i in range(3)
+        ]
+    recorded = sync_metrics.to_json()
+    [copies] = recorded["sync_camera_disk_operation_bytes"]
+    assert copies["labels"] == {"operation": "copy"}
+    assert copies["count"] == 6
+    assert copies["sum"] == sum(len(f"card{c} {i}") for c in (1, 2) for i in range(3))
+    phases = {
+        result["labels"]["phase"]: result["count"]
+        for result in recorded["sync_camera_disk_phase_seconds"]
+    }
+    assert phases == {"enumerate": 6, "plan": 6}
+
+
+def test_run_syncs_summarises_identical(tmp_path: Path) -> None:
+    media = tmp_path / "card" / "DCIM" / "100GOPRO"
+    media.mkdir(parents=True)
+    for suffix in ("MP4", "THM", "LRV"):
+        (media / f"GX010001.{suffix}").write_text(suffix)
+    (tmp_path / "nas").mkdir()
+    syncs = [
+        (
+            config.Sync(
+                source=config.Source(
+                    identifier="card", type=config.SourceType.gopro_10
+                ),
+                destination=config.Destination(path=tmp_path / "nas"),
+            ),
+            DiskMount(path=tmp_path / "card", unique_identifier="card"),
+        )
+    ]
+    syncing.run_syncs(syncs, hash_cache=None, manifest=None, dry_run=False)
+
+    with structlog.testing.capture_logs() as logs:
+        counters, _ = syncing.run_syncs(
+            syncs, hash_cache=None, manifest=None, dry_run=False
+        )
+    assert counters["identical"] == 3
+    [summary] = [log for log in logs if log["event"] == "identical"]
+    assert summary["files"] == 3
+    assert summary["source"] == media
+    assert summary["stem"] == "0001"
+
+
+def test_run_syncs_manifest_records_verified_files(tmp_path: Path) -> None:
+    media = tmp_path / "card" / "DCIM" / "100GOPRO"
+    media.mkdir(parents=True)
+    source = media / "GX010001.MP4"
+    # Small enough to be sampled whole, still recorded with its full digest
+    source.write_text("clip")
+    (tmp_path / "nas").mkdir()
+    disk = DiskMount(path=tmp_path / "card", unique_identifier="card")
+
+    def run(identity_check: config.IdentityCheck, m: manifest.Manifest) -> None:
+        sync = config.Sync(
+            source=config.Source(identifier="card", type=config.SourceType.gopro_10),
+            destination=config.Destination(
+                path=tmp_path / "nas", identity_check=identity_check
+            ),
+        )
+        syncing.run_syncs([(sync, disk)], hash_cache=None, manifest=m, dry_run=False)
+
+    def imported(m: manifest.Manifest) -> bool:
+        stat = source.stat()
+        return m.is_imported(
+            "card",
+            Path("DCIM/100GOPRO/GX010001.MP4"),
+            stat.st_size,
+            stat.st_mtime_ns,
+            destination_path,
+        )
+
+    # Copied without a manifest, then found identical
+    syncing.run_syncs(
+        [
+            (
+                config.Sync(
+                    source=config.Source(
+                        identifier="card", type=config.SourceType.gopro_10
+                    ),
+                    destination=config.Destination(path=tmp_path / "nas"),
+                ),
+                disk,
+            )
+        ],
+        hash_cache=None,
+        manifest=None,
+        dry_run=False,
+    )
+    [destination_path] = (tmp_path / "nas").glob("*/DCIM/100GOPRO/GX010001.MP4")
+    with manifest.Manifest(tmp_path / "manifest.sqlite") as m:
+        run(config.IdentityCheck.size, m)
+        assert not imported(m)
+        run(config.IdentityCheck.full, m)
+        assert imported(m)
+
+
+def test_plan_and_apply(tmp_path: Path) -> None:
+    media = tmp_path / "card" / "DCIM" / "100GOPRO"
+    media.mkdir(parents=True)
+    for i in range(4):
+        (media / f"GX01000{i}.MP4").write_text(f"clip {i}")
+    (tmp_path / "nas").mkdir()
+    syncs = [
+        (
+            config.Sync(
+                source=config.Source(
+                    identifier="card", type=config.SourceType.gopro_10
+                ),
+                destination=config.Destination(path=tmp_path / "nas"),
+            ),
+            DiskMount(path=tmp_path / "card", unique_identifier="card"),
+        )
+    ]
+    counters: collections.Counter[str] = collections.Counter()
+    planned = list(
+        syncing.plan_syncs(syncs, hash_cache=None, manifest=None, counters=counters)
+    )
+    assert counters["copy"] == 4
+    # Planning doesn't copy anything
+    assert list((tmp_path / "nas").iterdir()) == []
+
+    # Missing or changed after planning so skipped
+    (media / "GX010000.MP4").unlink()
+    (media / "GX010002.MP4").write_text("changed clip 2")
+    # Copied by something else after planning, left alone
+    [elsewhere] = [
+        p.operation.destination
+        for p in planned
+        if p.operation.destination.name == "GX010003.MP4"
+    ]
+    elsewhere.parent.mkdir(parents=True)
+    elsewhere.write_text("copied elsewhere")
+    counters, failures = syncing.apply_plan(
+        iter(planned), hash_cache=None, manifest=None, dry_run=False
+    )
+    assert failures == []
+    assert counters["success"] == 1
+    assert counters["missing_since_planned"] == 1
+    assert counters["changed_since_planned"] == 1
+    assert counters["destination_exists_since_planned"] == 1
+    copied = sorted((tmp_path / "nas").glob("*/DCIM/100GOPRO/*.MP4"))
+    assert [path.read_text() for path in copied] == ["clip 1", "copied elsewhere"]
+
+
+def test_run_syncs_colliding_cards(tmp_path: Path) -> None:
+    # Two cards with the same file, same day, synced to one destination
+    (tmp_path / "nas").mkdir()
+    syncs = []
+    contents = {"card1": b"card1" * 100_000, "card2": b"card2" * 200_000}
+    for name, content in contents.items():
+        media = tmp_path / name / "DCIM" / "100GOPRO"
+        media.mkdir(parents=True)
+        clip = media / "GX010001.MP4"
+        clip.write_bytes(content)
+        os.utime(clip, (1_726_000_000, 1_726_000_000))
+        syncs.append(
+            (
+                config.Sync(
+                    source=config.Source(
+                        identifier=name, type=config.SourceType.gopro_10
+                    ),
+                    destination=config.Destination(path=tmp_path / "nas"),
+                ),
+                DiskMount(path=tmp_path / name, unique_identifier=name),
+            )
+        )
+
+    counters, failures = syncing.run_syncs(
+        syncs, hash_cache=None, manifest=None, dry_run=False
+    )
+    # Unknown operations are reported as failures to look at. Whether the
+    # second card lost the claim or found the first card's finished copy
+    # depends on timing.
+    assert [failure.operation.operation for failure in failures] == ["unknown"]
+    assert counters["copy"] == 1
+    assert counters["success"] == 1
+    [copied] = (tmp_path / "nas").glob("*/DCIM/100GOPRO/GX010001.MP4")
+    assert copied.read_bytes() in contents.values()
+
+    counters = collections.Counter()
+    planned = list(
+        syncing.plan_syncs(syncs, hash_cache=None, manifest=None, counters=counters)
+    )
+    # One now matches the destination, the other differs
+    assert sorted(p.operation.operation for p in planned) == ["identical", "unknown"]
@@ -0,0 +1,48 @@
+from pathlib import Path
+from unittest import mock
+
+from sync_camera_disk import watch
+
+
+def test_watch() -> None:
+    read = mock.Mock(side_effect=["a", "a", "b", "b", "a"])
+    wait = mock.Mock()
+    changes = watch.watch(read, wait)
+    for _ in range(3):
+        next(changes)
+    # Initial state, then each change
+    assert read.call_count == 5
+    assert wait.call_count == 4
+
+
+def test_watch_retry() -> None:
+    read = mock.Mock(return_value="a")
+    wait = mock.Mock()
+    retry = mock.Mock(side_effect=[True, False])
+    changes = watch.watch(read, wait, retry)
+    next(changes)
+    # Unchanged, but yields again while retrying
+    next(changes)
+    assert read.call_count == 2
+    assert wait.call_count == 1
+
+
+def test_watch_volumes(tmp_path: Path) -> None:
+    with mock.patch("sync_camera_disk.watch.time.sleep") as mock_sleep:
+        changes = watch.watch_volumes(tmp_path, interval=5)
+        next(changes)
+        mock_sleep.side_effect = lambda _: (tmp_path / "Untitled").mkdir()
+        next(changes)
+    mock_sleep.assert_called_once_with(5)
+
+
+def test_watch_mountinfo(tmp_path: Path) -> None:
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text("26 1 259:2 / / rw - ext4 /dev/nvme0n1p2 rw\n")
+    changes = watch.watch_mountinfo(mountinfo, interval=0.01)
+    next(changes)
+    with mountinfo.open("a") as fp:
+        fp.write("512 26 8:17 / /media/card rw - exfat /dev/sdb1 rw\n")
+    # Regular files never signal a change, so this relies on the interval
+    next(changes)
+    changes.close()